@@ -0,0 +1,97 @@
+"""partition_outbox
+
+Revision ID: 01df9e5a3353
+Revises: 585022fae949
+Create Date: 2026-10-18 15:47:09.381552
+
+"""
+from datetime import datetime, time, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '01df9e5a3353'
+down_revision: Union[str, Sequence[str], None] = '585022fae949'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Daily partitions created up front; the worker's retention job keeps
+# creating them ahead from here on.
+PREMAKE_DAYS = 7
+
+
+def upgrade() -> None:
+    # Existing rows are not copied: the old table becomes the partition for
+    # everything before tomorrow (UTC), and daily partitions start there.
+    boundary = datetime.combine(datetime.now(timezone.utc).date() + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+    op.execute("ALTER TABLE outbox RENAME TO outbox_history")
+    # The partitioned table's key must include the partition column.
+    op.execute("ALTER TABLE outbox_history DROP CONSTRAINT outbox_pkey")
+    op.execute("ALTER TABLE outbox_history ADD CONSTRAINT outbox_history_pkey PRIMARY KEY (id, created_at)")
+    op.execute("ALTER INDEX ix_outbox_tenant_created RENAME TO outbox_history_tenant_created_idx")
+    # Covered by ix_outbox_tenant_created.
+    op.drop_index("ix_outbox_tenant_id", table_name="outbox_history")
+
+    op.execute(
+        """
+        CREATE TABLE outbox (
+            id uuid NOT NULL,
+            tenant_id uuid NOT NULL,
+            event_type varchar(128) NOT NULL,
+            payload json NOT NULL,
+            created_at timestamptz NOT NULL,
+            CONSTRAINT outbox_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.create_index("ix_outbox_tenant_created", "outbox", ["tenant_id", "created_at"])
+
+    # A validated CHECK lets ATTACH skip its own full-table scan.
+    op.execute(
+        f"ALTER TABLE outbox_history ADD CONSTRAINT outbox_history_range "
+        f"CHECK (created_at < '{boundary.isoformat()}')"
+    )
+    op.execute(
+        f"ALTER TABLE outbox ATTACH PARTITION outbox_history "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+    )
+    op.execute("ALTER TABLE outbox_history DROP CONSTRAINT outbox_history_range")
+
+    op.execute("CREATE TABLE outbox_default PARTITION OF outbox DEFAULT")
+    for offset in range(PREMAKE_DAYS + 1):
+        start = boundary + timedelta(days=offset)
+        end = start + timedelta(days=1)
+        op.execute(
+            f"CREATE TABLE outbox_p{start:%Y%m%d} PARTITION OF outbox "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    # Retention deletes deliveries by age before dropping a partition.
+    op.create_index("ix_outbox_deliveries_created", "outbox_deliveries", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_deliveries_created", table_name="outbox_deliveries")
+
+    op.create_table(
+        "outbox_flat",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("tenant_id", sa.Uuid(), nullable=False),
+        sa.Column("event_type", sa.String(length=128), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO outbox_flat (id, tenant_id, event_type, payload, created_at) "
+        "SELECT id, tenant_id, event_type, payload, created_at FROM outbox"
+    )
+    # Drops every partition with it.
+    op.execute("DROP TABLE outbox")
+    op.execute("ALTER TABLE outbox_flat RENAME TO outbox")
+    op.create_primary_key("outbox_pkey", "outbox", ["id"])
+    op.create_index(op.f("ix_outbox_tenant_id"), "outbox", ["tenant_id"], unique=False)
+    op.create_index("ix_outbox_tenant_created", "outbox", ["tenant_id", "created_at"], unique=False)
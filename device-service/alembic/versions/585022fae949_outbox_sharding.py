@@ -0,0 +1,52 @@
+"""outbox_sharding
+
+Revision ID: 585022fae949
+Revises: 58b5337dd577
+Create Date: 2026-10-18 14:22:31.604219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '585022fae949'
+down_revision: Union[str, Sequence[str], None] = '58b5337dd577'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 64 tenant-hash partitions; must match OUTBOX_PARTITIONS in device-worker.
+    op.add_column(
+        "outbox_deliveries",
+        sa.Column(
+            "partition",
+            sa.SmallInteger(),
+            sa.Computed("(hashtext(tenant_id::text) & 63)::smallint", persisted=True),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_outbox_deliveries_pending_partition",
+        "outbox_deliveries",
+        ["consumer", "partition", "next_attempt_at", "created_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+    op.create_table(
+        "outbox_workers",
+        sa.Column("consumer", sa.String(length=64), nullable=False),
+        sa.Column("worker_id", sa.String(length=128), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("consumer", "worker_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("outbox_workers")
+    op.drop_index("ix_outbox_deliveries_pending_partition", table_name="outbox_deliveries")
+    op.drop_column("outbox_deliveries", "partition")
@@ -0,0 +1,118 @@
+"""outbox_consumers
+
+Revision ID: 58b5337dd577
+Revises: b8fb38fb4297
+Create Date: 2026-10-18 13:05:52.418337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58b5337dd577'
+down_revision: Union[str, Sequence[str], None] = 'b8fb38fb4297'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSUMERS = ("projection", "notification")
+
+
+def upgrade() -> None:
+    consumers = op.create_table(
+        "outbox_consumers",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(consumers, [{"name": name} for name in CONSUMERS])
+
+    op.create_table(
+        "outbox_deliveries",
+        sa.Column("outbox_id", sa.Uuid(), nullable=False),
+        sa.Column("consumer", sa.String(length=64), nullable=False),
+        sa.Column("tenant_id", sa.Uuid(), nullable=False),
+        sa.Column("event_type", sa.String(length=128), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.String(length=512), nullable=True),
+        sa.Column("claimed_by", sa.String(length=128), nullable=True),
+        sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("outbox_id", "consumer"),
+    )
+    op.create_index(
+        "ix_outbox_deliveries_pending",
+        "outbox_deliveries",
+        ["consumer", "next_attempt_at", "created_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+    # Events still pending under the single-consumer worker are owed to every
+    # consumer; their retry state carries over. Leases are dropped.
+    op.execute(
+        """
+        INSERT INTO outbox_deliveries
+            (outbox_id, consumer, tenant_id, event_type, payload, created_at,
+             attempts, last_error, next_attempt_at)
+        SELECT o.id, c.name, o.tenant_id, o.event_type, o.payload, o.created_at,
+               o.attempts, o.last_error, o.next_attempt_at
+        FROM outbox o
+        CROSS JOIN outbox_consumers c
+        WHERE o.processed_at IS NULL
+        """
+    )
+
+    # The outbox is now an append-only event log; queue state lives per delivery.
+    op.drop_index("ix_outbox_pending", table_name="outbox")
+    for column in ("next_attempt_at", "lease_until", "claimed_by", "last_error", "attempts", "processed_at"):
+        op.drop_column("outbox", column)
+
+
+def downgrade() -> None:
+    op.add_column("outbox", sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("outbox", sa.Column("attempts", sa.Integer(), nullable=True))
+    op.add_column("outbox", sa.Column("last_error", sa.String(length=512), nullable=True))
+    op.add_column("outbox", sa.Column("claimed_by", sa.String(length=128), nullable=True))
+    op.add_column("outbox", sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True))
+    op.add_column(
+        "outbox",
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    # An event counts as processed once no consumer still owes it; the worst
+    # retry state among its deliveries is kept.
+    op.execute(
+        """
+        UPDATE outbox o
+        SET processed_at = CASE WHEN d.pending = 0 THEN d.done_at END,
+            attempts = d.attempts,
+            last_error = d.last_error,
+            next_attempt_at = d.next_attempt_at
+        FROM (
+            SELECT outbox_id,
+                   count(*) FILTER (WHERE processed_at IS NULL) AS pending,
+                   max(processed_at) AS done_at,
+                   max(attempts) AS attempts,
+                   max(last_error) AS last_error,
+                   max(next_attempt_at) AS next_attempt_at
+            FROM outbox_deliveries
+            GROUP BY outbox_id
+        ) d
+        WHERE d.outbox_id = o.id
+        """
+    )
+    op.execute("UPDATE outbox SET processed_at = created_at WHERE processed_at IS NULL AND attempts IS NULL")
+    op.execute("UPDATE outbox SET attempts = 0 WHERE attempts IS NULL")
+    op.create_index(
+        "ix_outbox_pending",
+        "outbox",
+        ["next_attempt_at", "created_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+    op.drop_index("ix_outbox_deliveries_pending", table_name="outbox_deliveries")
+    op.drop_table("outbox_deliveries")
+    op.drop_table("outbox_consumers")
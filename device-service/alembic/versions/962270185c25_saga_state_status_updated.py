@@ -0,0 +1,27 @@
+"""saga_state_status_updated
+
+Revision ID: 962270185c25
+Revises: 5f57e23b8598
+Create Date: 2026-10-18 19:03:41.207415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '962270185c25'
+down_revision: Union[str, Sequence[str], None] = '5f57e23b8598'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The saga recovery sweeper looks for active sagas by status, oldest
+    # updated_at first.
+    op.create_index("ix_saga_state_status_updated", "saga_state", ["status", "updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_saga_state_status_updated", table_name="saga_state")
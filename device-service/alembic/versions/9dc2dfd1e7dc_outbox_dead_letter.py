@@ -0,0 +1,85 @@
+"""outbox_dead_letter
+
+Revision ID: 9dc2dfd1e7dc
+Revises: 01df9e5a3353
+Create Date: 2026-10-18 16:58:44.120937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9dc2dfd1e7dc'
+down_revision: Union[str, Sequence[str], None] = '01df9e5a3353'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox_deliveries",
+        sa.Column("errors", postgresql.JSONB(), nullable=False, server_default=sa.text("'[]'::jsonb")),
+    )
+
+    op.create_table(
+        "outbox_dead_letter",
+        sa.Column("outbox_id", sa.Uuid(), nullable=False),
+        sa.Column("consumer", sa.String(length=64), nullable=False),
+        sa.Column("tenant_id", sa.Uuid(), nullable=False),
+        sa.Column("event_type", sa.String(length=128), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(length=512), nullable=True),
+        sa.Column("errors", postgresql.JSONB(), nullable=False),
+        sa.Column("dead_lettered_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("outbox_id", "consumer"),
+    )
+    op.create_index("ix_outbox_dead_letter_type_created", "outbox_dead_letter", ["event_type", "created_at"])
+    op.create_index("ix_outbox_dead_letter_tenant_created", "outbox_dead_letter", ["tenant_id", "created_at"])
+
+    # Dead-lettering used to set processed_at and next_attempt_at to the same
+    # instant with an error recorded; a successful delivery is completed after
+    # its last scheduled attempt. Only the final error survives.
+    op.execute(
+        """
+        WITH moved AS (
+            DELETE FROM outbox_deliveries
+            WHERE processed_at IS NOT NULL
+              AND last_error IS NOT NULL
+              AND processed_at = next_attempt_at
+            RETURNING outbox_id, consumer, tenant_id, event_type, payload, created_at,
+                      attempts, last_error, processed_at
+        )
+        INSERT INTO outbox_dead_letter
+            (outbox_id, consumer, tenant_id, event_type, payload, created_at,
+             attempts, last_error, errors, dead_lettered_at)
+        SELECT outbox_id, consumer, tenant_id, event_type, payload, created_at,
+               attempts, last_error,
+               jsonb_build_array(jsonb_build_object('attempt', attempts, 'error', last_error, 'at', processed_at)),
+               processed_at
+        FROM moved
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        INSERT INTO outbox_deliveries
+            (outbox_id, consumer, tenant_id, event_type, payload, created_at,
+             processed_at, attempts, last_error, next_attempt_at)
+        SELECT outbox_id, consumer, tenant_id, event_type, payload, created_at,
+               dead_lettered_at, attempts, last_error, dead_lettered_at
+        FROM outbox_dead_letter
+        ON CONFLICT (outbox_id, consumer) DO NOTHING
+        """
+    )
+    op.drop_index("ix_outbox_dead_letter_tenant_created", table_name="outbox_dead_letter")
+    op.drop_index("ix_outbox_dead_letter_type_created", table_name="outbox_dead_letter")
+    op.drop_table("outbox_dead_letter")
+    op.drop_column("outbox_deliveries", "errors")
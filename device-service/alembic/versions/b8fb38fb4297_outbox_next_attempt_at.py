@@ -0,0 +1,42 @@
+"""outbox_next_attempt_at
+
+Revision ID: b8fb38fb4297
+Revises: bd8d4b90f5c4
+Create Date: 2026-10-18 10:41:07.238119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8fb38fb4297'
+down_revision: Union[str, Sequence[str], None] = 'bd8d4b90f5c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1. Add nullable, 2. backfill from created_at, 3. NOT NULL with a now() default
+    op.add_column("outbox", sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE outbox SET next_attempt_at = created_at WHERE next_attempt_at IS NULL")
+    op.alter_column("outbox", "next_attempt_at", nullable=False, server_default=sa.text("now()"))
+
+    # Only pending rows are indexed, so the claim scan does not grow with the
+    # number of processed rows. Built concurrently to avoid blocking inserts.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_outbox_pending",
+            "outbox",
+            ["next_attempt_at", "created_at"],
+            postgresql_where=sa.text("processed_at IS NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_outbox_pending", table_name="outbox", postgresql_concurrently=True)
+    op.drop_column("outbox", "next_attempt_at")
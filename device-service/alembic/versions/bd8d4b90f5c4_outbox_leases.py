@@ -0,0 +1,30 @@
+"""outbox_leases
+
+Revision ID: bd8d4b90f5c4
+Revises: 9cee86796653
+Create Date: 2026-10-18 09:12:40.512803
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bd8d4b90f5c4'
+down_revision: Union[str, Sequence[str], None] = '9cee86796653'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Workers claim rows by stamping these instead of holding FOR UPDATE locks
+    # across external calls. An expired lease_until makes the row claimable again.
+    op.add_column("outbox", sa.Column("claimed_by", sa.String(length=128), nullable=True))
+    op.add_column("outbox", sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("outbox", "lease_until")
+    op.drop_column("outbox", "claimed_by")
@@ -0,0 +1,33 @@
+"""outbox_deliveries_device_order
+
+Revision ID: c4e1f2a9b7d3
+Revises: 962270185c25
+Create Date: 2026-10-18 21:12:07.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1f2a9b7d3'
+down_revision: Union[str, Sequence[str], None] = '962270185c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The claim holds back a delivery while an earlier one for the same
+    # device is still pending; this index serves that lookup.
+    op.create_index(
+        "ix_outbox_deliveries_pending_device",
+        "outbox_deliveries",
+        ["consumer", "tenant_id", sa.text("(payload->>'device_id')"), "created_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_deliveries_pending_device", table_name="outbox_deliveries")
@@ -7,6 +7,11 @@ from uuid import UUID
 class RequestContext:
     tenant_id: UUID
     user_id: UUID
+    # Who started the request: "user", or "system" for the worker's own
+    # follow-up actions (e.g. saga compensation), which carry the id of the
+    # event that caused them.
+    origin: str = "user"
+    causation_id: UUID | None = None
 
 
 class BaseAppException(Exception):
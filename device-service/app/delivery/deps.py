@@ -1,6 +1,7 @@
 from fastapi import Header
 
 from app.contracts import RequestContext
+from app.outbox.events import ORIGIN_USER, ORIGINS
 from app.settings import settings
 from infra.security.jwt import AuthError, require_uuid
 
@@ -9,12 +10,18 @@ def get_request_context(
     x_tenant_id: str | None = Header(default=None, alias="x-tenant-id"),
     x_user_id: str | None = Header(default=None, alias="x-user-id"),
     x_internal_token: str | None = Header(default=None, alias="x-internal-token"),
+    x_origin: str | None = Header(default=None, alias="x-origin"),
+    x_causation_id: str | None = Header(default=None, alias="x-causation-id"),
 ) -> RequestContext:
     if not x_internal_token or x_internal_token != settings.device_service_token:
         raise AuthError("Invalid internal token")
     if not x_tenant_id or not x_user_id:
         raise AuthError("Missing internal identity headers")
+    if x_origin and x_origin not in ORIGINS:
+        raise AuthError("Invalid origin")
     return RequestContext(
         tenant_id=require_uuid(x_tenant_id, "tenant_id"),
         user_id=require_uuid(x_user_id, "user_id"),
+        origin=x_origin or ORIGIN_USER,
+        causation_id=require_uuid(x_causation_id, "causation_id") if x_causation_id else None,
     )
\ No newline at end of file
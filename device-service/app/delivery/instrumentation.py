@@ -0,0 +1,75 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from infra.db.instrumentation import track_request
+from infra.observability.metrics import REGISTRY, Counter, Histogram
+
+http_requests = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code.",
+    labelnames=("method", "route", "status"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the full response.",
+    labelnames=("method", "route"),
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries",
+    "Database statements executed per request.",
+    labelnames=("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Total database time per request.",
+    labelnames=("method", "route"),
+)
+
+
+class RequestMetricsMiddleware:
+    """Records latency, status and DB usage per route template.
+
+    Routes are labelled by their template (``/api/v1/devices/{device_id}``),
+    never the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with track_request() as db:
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                elapsed = time.perf_counter() - started
+                route = getattr(scope.get("route"), "path", "unmatched")
+                method = scope["method"]
+                http_requests.inc(method=method, route=route, status=str(status))
+                http_request_duration.observe(elapsed, method=method, route=route)
+                http_request_db_queries.observe(db.queries, method=method, route=route)
+                http_request_db_duration.observe(db.seconds, method=method, route=route)
+
+
+def install_instrumentation(app: FastAPI) -> None:
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def _metrics():
+        return PlainTextResponse(REGISTRY.exposition(), media_type="text/plain; version=0.0.4")
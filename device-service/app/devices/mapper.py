@@ -10,4 +10,17 @@ def to_device_view(device: Device) -> DeviceView:
         created_at=device.created_at,
         updated_at=device.updated_at,
         version=device.version,
-    )
\ No newline at end of file
+    )
+
+
+def to_device_snapshot(device: Device) -> dict:
+    """Full device state carried in outbox payloads (JSON-serialisable)."""
+    return {
+        "id": str(device.id),
+        "tenant_id": str(device.tenant_id),
+        "mac_address": device.mac_address,
+        "status": device.status.value,
+        "created_at": device.created_at.isoformat(),
+        "updated_at": device.updated_at.isoformat(),
+        "version": device.version,
+    }
\ No newline at end of file
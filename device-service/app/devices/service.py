@@ -1,3 +1,4 @@
+from dataclasses import replace
 from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
@@ -11,7 +12,7 @@ from app.contracts import (
     NotFoundError,
 )
 from app.devices.dto import ChangeDeviceStatusCommand, CreateDeviceCommand, DeviceView, ListDevicesQuery
-from app.devices.mapper import to_device_view
+from app.devices.mapper import to_device_snapshot, to_device_view
 from app.devices.repository import DeviceRepository
 from app.domain.devices import Device, DeviceStatus, normalize_mac
 from app.outbox.events import OutboxEvent
@@ -44,7 +45,12 @@ class DevicesApplicationService:
                 id=uuid4(),
                 tenant_id=ctx.tenant_id,
                 event_type="device.created",
-                payload={"device_id": str(device.id), "user_id": str(ctx.user_id)},
+                payload={
+                    "device_id": str(device.id),
+                    "user_id": str(ctx.user_id),
+                    **_origin(ctx),
+                    "device": to_device_snapshot(device),
+                },
                 created_at=datetime.now(timezone.utc),
             )
         )
@@ -87,6 +93,8 @@ class DevicesApplicationService:
             if not still_exists:
                 raise NotFoundError("Device not found")
             raise ConflictError("Device was updated by another request")
+        # The repository bumped the stored version on a successful update.
+        snapshot = replace(retired, version=cmd.expected_version + 1)
         await self._outbox.add(
             OutboxEvent(
                 id=uuid4(),
@@ -95,7 +103,9 @@ class DevicesApplicationService:
                 payload={
                     "device_id": str(device.id),
                     "user_id": str(ctx.user_id),
+                    **_origin(ctx),
                     "reason": cmd.reason,
+                    "device": to_device_snapshot(snapshot),
                 },
                 created_at=datetime.now(timezone.utc),
             )
@@ -116,6 +126,8 @@ class DevicesApplicationService:
             if not still_exists:
                 raise NotFoundError("Device not found")
             raise ConflictError("Device was updated by another request")
+        # The repository bumped the stored version on a successful update.
+        snapshot = replace(active, version=cmd.expected_version + 1)
         await self._outbox.add(
             OutboxEvent(
                 id=uuid4(),
@@ -124,9 +136,19 @@ class DevicesApplicationService:
                 payload={
                     "device_id": str(device.id),
                     "user_id": str(ctx.user_id),
+                    **_origin(ctx),
                     "reason": cmd.reason,
+                    "device": to_device_snapshot(snapshot),
                 },
                 created_at=datetime.now(timezone.utc),
             )
         )
-        return DataResponse(data=to_device_view(active))
\ No newline at end of file
+        return DataResponse(data=to_device_view(active))
+
+
+def _origin(ctx: RequestContext) -> dict:
+    """Origin marker for event payloads: user actions vs. the system's own follow-ups."""
+    marker = {"origin": ctx.origin}
+    if ctx.causation_id is not None:
+        marker["causation_id"] = str(ctx.causation_id)
+    return marker
@@ -4,11 +4,13 @@ from sqlalchemy import text
 
 from app.delivery.devices import router as devices_router
 from app.delivery.errors import install_error_handlers
+from app.delivery.instrumentation import install_instrumentation
 from infra.db.session import engine
 
 app = FastAPI(title="Device Service (Python)")
 
 install_error_handlers(app)
+install_instrumentation(app)
 app.include_router(devices_router)
 
 
@@ -2,6 +2,10 @@ from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
 
+ORIGIN_USER = "user"
+ORIGIN_SYSTEM = "system"
+ORIGINS = (ORIGIN_USER, ORIGIN_SYSTEM)
+
 
 @dataclass(frozen=True)
 class OutboxEvent:
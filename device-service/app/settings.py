@@ -13,6 +13,10 @@ class Settings(BaseSettings):
 
     device_service_token: str = "dev-shared-secret"
 
+    outbox_notify_channel: str = "outbox_events"
+
+    # Statements slower than this are logged with their SQL
+    slow_query_threshold_ms: float = 200.0
 
 
 settings = Settings()
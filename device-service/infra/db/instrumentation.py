@@ -0,0 +1,89 @@
+"""Query and pool timing via SQLAlchemy events.
+
+Every statement is timed with ``before/after_cursor_execute``. Totals are
+recorded globally and added to the current request's ``DbStats``, which the
+request middleware opens with ``track_request``. Statements slower than
+``SLOW_QUERY_THRESHOLD_MS`` are logged with their SQL.
+
+Pool checkout wait is measured by ``TimedQueuePool``, which times
+``_do_get``: waiting for a free connection and, below the pool size, opening
+a new one.
+"""
+
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from infra.observability.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Duration of a single database statement.",
+)
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+
+@dataclass
+class DbStats:
+    queries: int = 0
+    seconds: float = 0.0
+
+
+_request_stats: ContextVar[DbStats | None] = ContextVar("db_request_stats", default=None)
+
+
+@contextmanager
+def track_request() -> Iterator[DbStats]:
+    """Collect query count and DB time for statements run inside the block."""
+    stats = DbStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine, slow_query_threshold_ms: float) -> None:
+    """Attach the timing hooks to *engine* (``AsyncEngine.sync_engine`` for async engines)."""
+    threshold = slow_query_threshold_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        db_query_duration.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+        if elapsed >= threshold:
+            logger.warning("Slow query (%.0f ms): %s", elapsed * 1000, " ".join(statement.split()))
@@ -1,7 +1,8 @@
 from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
-from sqlalchemy import DateTime, String, UniqueConstraint, Index, Integer, JSON
+from sqlalchemy import Computed, DateTime, String, UniqueConstraint, Index, Integer, JSON, SmallInteger, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.domain.devices import DeviceStatus
@@ -30,15 +31,107 @@ class DeviceModel(Base):
 
 
 class OutboxModel(Base):
+    # Range-partitioned by day on created_at; partitions are created and
+    # dropped by the worker's retention job.
     __tablename__ = "outbox"
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    tenant_id: Mapped[UUID] = mapped_column(index=True)
+    tenant_id: Mapped[UUID]
     event_type: Mapped[str] = mapped_column(String(128))
     payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc)
+    )
+
+    __table_args__ = (
+        Index("ix_outbox_tenant_created", "tenant_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class OutboxConsumerModel(Base):
+    __tablename__ = "outbox_consumers"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+
+
+class OutboxDeliveryModel(Base):
+    # One row per (event, consumer). Carries a copy of the event so consumers
+    # never read ``outbox`` itself.
+    __tablename__ = "outbox_deliveries"
+
+    outbox_id: Mapped[UUID] = mapped_column(primary_key=True)
+    consumer: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tenant_id: Mapped[UUID]
+    event_type: Mapped[str] = mapped_column(String(128))
+    payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     processed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     attempts: Mapped[int] = mapped_column(Integer, default=0)
-    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
\ No newline at end of file
+    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    # One {"attempt", "error", "at"} entry per failed attempt.
+    errors: Mapped[list] = mapped_column(JSONB, default=list, server_default=text("'[]'::jsonb"))
+    claimed_by: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    # Tenant-hash shard (64 partitions) used by sharded workers.
+    partition: Mapped[int] = mapped_column(
+        SmallInteger, Computed("(hashtext(tenant_id::text) & 63)::smallint", persisted=True)
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_deliveries_pending",
+            "consumer",
+            "next_attempt_at",
+            "created_at",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+        Index(
+            "ix_outbox_deliveries_pending_partition",
+            "consumer",
+            "partition",
+            "next_attempt_at",
+            "created_at",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+        Index("ix_outbox_deliveries_created", "created_at"),
+    )
+
+
+class OutboxDeadLetterModel(Base):
+    # Deliveries that ran out of attempts, with their full error history;
+    # `worker replay` moves them back into outbox_deliveries.
+    __tablename__ = "outbox_dead_letter"
+
+    outbox_id: Mapped[UUID] = mapped_column(primary_key=True)
+    consumer: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tenant_id: Mapped[UUID]
+    event_type: Mapped[str] = mapped_column(String(128))
+    payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    attempts: Mapped[int] = mapped_column(Integer)
+    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    errors: Mapped[list] = mapped_column(JSONB)
+    dead_lettered_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_outbox_dead_letter_type_created", "event_type", "created_at"),
+        Index("ix_outbox_dead_letter_tenant_created", "tenant_id", "created_at"),
+    )
+
+
+class OutboxWorkerModel(Base):
+    # Sharded-worker membership; rows without a recent heartbeat are expired
+    # by the remaining workers.
+    __tablename__ = "outbox_workers"
+
+    consumer: Mapped[str] = mapped_column(String(64), primary_key=True)
+    worker_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
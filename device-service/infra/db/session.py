@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from app.settings import settings
+from infra.db.instrumentation import TimedQueuePool, instrument_engine
 
 engine = create_async_engine(
     settings.database_url,
@@ -14,7 +15,9 @@ engine = create_async_engine(
     pool_size=5,
     max_overflow=10,
     pool_timeout=30,
+    poolclass=TimedQueuePool,
 )
+instrument_engine(engine.sync_engine, settings.slow_query_threshold_ms)
 SessionMaker = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -0,0 +1,130 @@
+"""Minimal in-process metrics in the Prometheus text format.
+
+The service runs as a single process, so counters and histograms live in a
+module-level ``REGISTRY`` and ``/metrics`` renders it directly.
+"""
+
+import math
+import threading
+from collections.abc import Iterable, Sequence
+
+
+class _Metric:
+    TYPE = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def lines(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [_line(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus sum and count."""
+
+    TYPE = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [bucket counts..., sum, count]
+        self._observations: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._observations.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels: str) -> float:
+        counts = self._observations.get(self._key(labels))
+        return counts[-1] if counts else 0.0
+
+    def sum(self, **labels: str) -> float:
+        counts = self._observations.get(self._key(labels))
+        return counts[-2] if counts else 0.0
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._observations.items()]
+        out = []
+        for key, counts in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                out.append(_line(f"{self.name}_bucket", {**labels, "le": le}, count))
+            out.append(_line(f"{self.name}_sum", labels, counts[-2]))
+            out.append(_line(f"{self.name}_count", labels, counts[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} already registered")
+        self._metrics[metric.name] = metric
+
+    def exposition(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+
+def _line(name: str, labels: dict[str, str], value: float) -> str:
+    rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    number = str(int(value)) if value.is_integer() else repr(value)
+    return f"{name}{{{rendered}}} {number}" if rendered else f"{name} {number}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
@@ -1,7 +1,9 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.outbox.events import OutboxEvent
 from app.outbox.repository import OutboxRepository
+from app.settings import settings
 from infra.db.models import OutboxModel
 
 
@@ -19,4 +21,25 @@ class SqlAlchemyOutboxRepository(OutboxRepository):
                 created_at=event.created_at,
             )
         )
-        await self._session.flush()
\ No newline at end of file
+        await self._session.flush()
+        # Fan out one delivery per registered consumer; each consumer tracks
+        # its own progress and retries. Matching on created_at too prunes the
+        # lookup to the event's partition.
+        await self._session.execute(
+            text(
+                """
+                INSERT INTO outbox_deliveries
+                    (outbox_id, consumer, tenant_id, event_type, payload, created_at, next_attempt_at, attempts)
+                SELECT o.id, c.name, o.tenant_id, o.event_type, o.payload, o.created_at, o.created_at, 0
+                FROM outbox o
+                CROSS JOIN outbox_consumers c
+                WHERE o.id = :id AND o.created_at = :created_at
+                """
+            ),
+            {"id": event.id, "created_at": event.created_at},
+        )
+        # NOTIFY is transactional: listeners only hear about the row once it commits.
+        await self._session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": settings.outbox_notify_channel, "payload": event.event_type},
+        )
@@ -0,0 +1,67 @@
+"""Request instrumentation tests — in-memory SQLite, no Postgres."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.delivery.instrumentation import (
+    http_request_db_queries,
+    http_requests,
+    install_instrumentation,
+)
+from infra.db.instrumentation import instrument_engine
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, slow_query_threshold_ms=0)
+
+    app = FastAPI()
+    install_instrumentation(app)
+
+    @app.get("/items/{item_id}")
+    def _item(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT :id"), {"id": item_id})
+        return {"id": item_id}
+
+    return TestClient(app)
+
+
+class TestRequestMetrics:
+    def test_requests_are_labelled_by_route_template(self, client):
+        before = http_requests.value(method="GET", route="/items/{item_id}", status="200")
+
+        client.get("/items/1")
+        client.get("/items/2")
+
+        assert http_requests.value(method="GET", route="/items/{item_id}", status="200") == before + 2
+
+    def test_db_queries_are_counted_per_request(self, client):
+        before = http_request_db_queries.sum(method="GET", route="/items/{item_id}")
+
+        client.get("/items/1")
+
+        assert http_request_db_queries.sum(method="GET", route="/items/{item_id}") == before + 2
+
+    def test_slow_queries_are_logged(self, client, caplog):
+        client.get("/items/1")
+
+        assert "Slow query" in caplog.text
+
+    def test_unmatched_paths_share_one_label(self, client):
+        client.get("/nope/123")
+
+        assert http_requests.value(method="GET", route="unmatched", status="404") >= 1
+
+    def test_metrics_endpoint_renders_prometheus_text(self, client):
+        client.get("/items/1")
+
+        res = client.get("/metrics")
+
+        assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE http_request_duration_seconds histogram" in res.text
+        assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"}' in res.text
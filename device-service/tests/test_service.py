@@ -72,6 +72,19 @@ class TestCreateDevice:
         assert event.event_type == "device.created"
         assert event.tenant_id == TENANT
 
+    @pytest.mark.asyncio
+    async def test_create_event_carries_device_snapshot(self):
+        svc, repo, outbox = _make_service()
+        repo.exists_by_mac.return_value = False
+
+        result = await svc.create(CTX, CreateDeviceCommand(mac_address="AA:BB:CC:DD:EE:FF"))
+
+        snapshot = outbox.add.call_args[0][0].payload["device"]
+        assert snapshot["id"] == str(result.data.id)
+        assert snapshot["mac_address"] == "aa:bb:cc:dd:ee:ff"
+        assert snapshot["status"] == "active"
+        assert snapshot["version"] == 1
+
 
 # ── get ───────────────────────────────────────────────────────────
 
@@ -164,6 +177,32 @@ class TestRetireDevice:
         assert event.event_type == "device.retired"
         assert event.payload["reason"] == "No longer needed"
 
+    @pytest.mark.asyncio
+    async def test_retire_snapshot_has_bumped_version(self):
+        svc, repo, outbox = _make_service()
+        device = _device(version=3)
+        repo.get_by_id.return_value = device
+        repo.update.return_value = True
+
+        await svc.retire(CTX, device.id, ChangeDeviceStatusCommand(reason="EOL", expected_version=3))
+
+        snapshot = outbox.add.call_args[0][0].payload["device"]
+        assert snapshot["status"] == "retired"
+        assert snapshot["version"] == 4
+
+    @pytest.mark.asyncio
+    async def test_events_are_marked_as_user_originated(self):
+        svc, repo, outbox = _make_service()
+        device = _device()
+        repo.get_by_id.return_value = device
+        repo.update.return_value = True
+
+        await svc.retire(CTX, device.id, ChangeDeviceStatusCommand(reason="EOL", expected_version=1))
+
+        payload = outbox.add.call_args[0][0].payload
+        assert payload["origin"] == "user"
+        assert "causation_id" not in payload
+
 
 # ── activate ──────────────────────────────────────────────────────
 
@@ -181,3 +220,18 @@ class TestActivateDevice:
 
         assert result.data.status == DeviceStatus.ACTIVE
         outbox.add.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_system_activation_carries_its_cause(self):
+        svc, repo, outbox = _make_service()
+        device = _device(status=DeviceStatus.RETIRED)
+        repo.get_by_id.return_value = device
+        repo.update.return_value = True
+        cause = uuid4()
+        ctx = RequestContext(tenant_id=TENANT, user_id=USER, origin="system", causation_id=cause)
+
+        await svc.activate(ctx, device.id, ChangeDeviceStatusCommand(reason="Compensation", expected_version=1))
+
+        payload = outbox.add.call_args[0][0].payload
+        assert payload["origin"] == "system"
+        assert payload["causation_id"] == str(cause)
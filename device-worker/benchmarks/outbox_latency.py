@@ -0,0 +1,158 @@
+"""Outbox latency benchmark — insert → processed_at, poll vs LISTEN mode.
+
+Latency is measured per event as the time until its slowest consumer
+delivery is processed.
+
+Runs the real ``poll_loop`` in-process against the database in DATABASE_URL,
+once with LISTEN/NOTIFY disabled and once enabled. Synthetic ``benchmark.ping``
+events carry no user/device ids, so the handlers return immediately and the
+measured latency is pure pickup delay.
+
+Usage (from device-worker/, with a migrated database):
+
+    uv run python benchmarks/outbox_latency.py --events 50 --spacing 0.2
+
+Do not run against a database a live worker is consuming from.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+import worker.main as worker_main
+from worker.settings import settings
+
+EVENT_TYPE = "benchmark.ping"
+
+
+async def _insert_event(engine: AsyncEngine, notify: bool) -> None:
+    event_id = uuid4()
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                """
+                INSERT INTO outbox (id, tenant_id, event_type, payload, created_at)
+                VALUES (:id, :tenant_id, :event_type, :payload, :now)
+                """
+            ),
+            {
+                "id": event_id,
+                "tenant_id": uuid4(),
+                "event_type": EVENT_TYPE,
+                "payload": json.dumps({}),
+                "now": datetime.now(timezone.utc),
+            },
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO outbox_deliveries
+                    (outbox_id, consumer, tenant_id, event_type, payload, created_at, next_attempt_at, attempts)
+                SELECT o.id, c.name, o.tenant_id, o.event_type, o.payload, o.created_at, o.created_at, 0
+                FROM outbox o
+                CROSS JOIN outbox_consumers c
+                WHERE o.id = :id
+                """
+            ),
+            {"id": event_id},
+        )
+        if notify:
+            await conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": settings.outbox_notify_channel, "payload": EVENT_TYPE},
+            )
+
+
+async def _collect_latencies(engine: AsyncEngine, expected: int, timeout: float) -> list[float]:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        async with engine.connect() as conn:
+            rows = (
+                await conn.execute(
+                    text(
+                        """
+                        SELECT EXTRACT(EPOCH FROM max(processed_at) - min(created_at)) AS latency
+                        FROM outbox_deliveries
+                        WHERE event_type = :event_type
+                        GROUP BY outbox_id
+                        HAVING count(*) FILTER (WHERE processed_at IS NULL) = 0
+                        """
+                    ),
+                    {"event_type": EVENT_TYPE},
+                )
+            ).fetchall()
+        if len(rows) >= expected or asyncio.get_running_loop().time() > deadline:
+            return [float(r.latency) for r in rows]
+        await asyncio.sleep(0.5)
+
+
+async def _cleanup(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM outbox_deliveries WHERE event_type = :t"), {"t": EVENT_TYPE})
+        await conn.execute(text("DELETE FROM outbox WHERE event_type = :t"), {"t": EVENT_TYPE})
+
+
+async def run_mode(engine: AsyncEngine, listen: bool, events: int, spacing: float) -> list[float]:
+    await _cleanup(engine)
+
+    worker_main._shutdown_requested = False
+    worker_main.listener.enabled = listen
+    settings.outbox_listen_enabled = listen
+    loop_task = asyncio.create_task(worker_main.poll_loop())
+    await asyncio.sleep(1.0)  # let the loop reach its first idle wait
+
+    for _ in range(events):
+        await _insert_event(engine, notify=listen)
+        await asyncio.sleep(random.uniform(0, 2 * spacing))
+
+    wait_budget = max(settings.poll_interval_seconds, settings.fallback_poll_interval_seconds) * 2
+    latencies = await _collect_latencies(engine, events, timeout=wait_budget)
+
+    worker_main._shutdown_requested = True
+    worker_main.listener.wake()
+    await loop_task
+    await _cleanup(engine)
+    return latencies
+
+
+def _report(label: str, latencies: list[float], expected: int) -> None:
+    if not latencies:
+        print(f"{label:>8}: no events processed")
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:>8}: n={len(ordered)}/{expected}  "
+        f"p50={statistics.median(ordered) * 1000:8.1f}ms  "
+        f"p95={p95 * 1000:8.1f}ms  "
+        f"max={ordered[-1] * 1000:8.1f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--spacing", type=float, default=0.2, help="mean seconds between inserts")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.database_url, pool_pre_ping=True)
+    try:
+        poll = await run_mode(engine, listen=False, events=args.events, spacing=args.spacing)
+        listen = await run_mode(engine, listen=True, events=args.events, spacing=args.spacing)
+    finally:
+        await engine.dispose()
+
+    print(f"insert → processed_at latency ({args.events} events)")
+    _report("poll", poll, args.events)
+    _report("listen", listen, args.events)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""Adaptive batch sizing and drain-rate tests — pure logic, no I/O."""
+
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from worker.batching import AdaptiveBatchSizer, DrainRateMeter
+from worker.dispatcher import EventResult, Outcome
+from worker.outbox import OutboxRow
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _results(n: int, outcome: Outcome = Outcome.PROCESSED, duration: float = 0.1) -> list[EventResult]:
+    return [
+        EventResult(
+            row=OutboxRow(id=uuid4(), tenant_id=uuid4(), event_type="device.created", payload={}, created_at=NOW),
+            outcome=outcome,
+            attempts=0,
+            duration=duration,
+        )
+        for _ in range(n)
+    ]
+
+
+class TestAdaptiveBatchSizer:
+    def test_grows_while_batches_are_full(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80)
+        assert sizer.observe(10, _results(10)) == 20
+        assert sizer.observe(20, _results(20)) == 40
+        assert sizer.observe(40, _results(40)) == 80
+        assert sizer.observe(80, _results(80)) == 80
+
+    def test_partial_batch_keeps_size(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80)
+        sizer.observe(10, _results(10))
+        assert sizer.observe(20, _results(5)) == 20
+
+    def test_shrinks_on_latency(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80, latency_threshold=1.0)
+        sizer.size = 80
+        assert sizer.observe(80, _results(80, duration=1.5)) == 40
+
+    def test_shrinks_on_error_rate_but_not_below_min(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80, error_rate_threshold=0.2)
+        sizer.size = 20
+        failing = _results(5, Outcome.RETRY) + _results(15)
+        assert sizer.observe(20, failing) == 10
+        assert sizer.observe(10, _results(10, Outcome.RETRY)) == 10
+
+    def test_held_back_events_are_not_failures(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80, error_rate_threshold=0.2)
+        sizer.size = 20
+        # one failing device with four events queued behind it
+        batch = _results(1, Outcome.RETRY) + _results(4, Outcome.SKIPPED, duration=0.0) + _results(15)
+        assert sizer.observe(20, batch) == 40
+
+    def test_full_claim_grows_after_coalescing(self):
+        sizer = AdaptiveBatchSizer(min_size=10, max_size=80)
+        # ten rows claimed, merged into four leads
+        assert sizer.observe(10, _results(4), claimed=10) == 20
+
+
+class TestDrainRateMeter:
+    def test_rate_over_window(self):
+        meter = DrainRateMeter(window=10.0)
+        meter._started = 0.0
+        meter.record(50, now=5.0)
+        meter.record(50, now=10.0)
+        assert meter.rate(now=10.0) == 10.0
+        # The first sample falls out of the window.
+        assert meter.rate(now=15.5) == 5.0
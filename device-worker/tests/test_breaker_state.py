@@ -0,0 +1,134 @@
+"""Shared circuit breaker tests — replicas share an in-memory stand-in for the table."""
+
+import asyncio
+
+import pytest
+
+from worker.breaker_state import SharedState
+from worker.circuit_breaker import CircuitBreaker, CircuitOpenError, State
+
+
+class _Row:
+    def __init__(self) -> None:
+        self.state: str | None = None
+        self.generation = 0
+        self.probe_owner: str | None = None
+
+
+class _FakeShared:
+    """Mirrors PostgresBreakerState against one shared ``_Row``."""
+
+    sync_interval = 0.0
+
+    def __init__(self, row: _Row, owner: str) -> None:
+        self.row = row
+        self.owner = owner
+
+    async def load(self) -> SharedState | None:
+        if self.row.state is None:
+            return None
+        return SharedState(self.row.state, self.row.generation, 0.0)
+
+    async def publish(self, state: str) -> int | None:
+        if self.row.state == state and self.row.probe_owner != self.owner:
+            return None
+        self.row.state, self.row.probe_owner = state, None
+        self.row.generation += 1
+        return self.row.generation
+
+    async def acquire_probe(self, recovery_timeout: float) -> bool:
+        if self.row.state != "open":
+            return True
+        if self.row.probe_owner in (None, self.owner):
+            self.row.probe_owner = self.owner
+            return True
+        return False
+
+
+async def _fail():
+    raise RuntimeError("boom")
+
+
+async def _ok():
+    return "ok"
+
+
+def _replicas(row: _Row, count: int = 2, recovery_timeout: float = 999) -> list[CircuitBreaker]:
+    return [
+        CircuitBreaker(
+            failure_threshold=2,
+            recovery_timeout=recovery_timeout,
+            name="resend",
+            shared_state=_FakeShared(row, f"w{i}"),
+        )
+        for i in range(count)
+    ]
+
+
+class TestSharedBreaker:
+    @pytest.mark.asyncio
+    async def test_one_replica_tripping_opens_all(self):
+        row = _Row()
+        a, b = _replicas(row)
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await a.call(_fail)
+
+        assert row.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await b.call(_ok)
+        assert b.state == State.OPEN
+
+    @pytest.mark.asyncio
+    async def test_only_the_lease_holder_probes(self):
+        row = _Row()
+        a, b = _replicas(row, recovery_timeout=0)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await a.call(_fail)
+
+        row.probe_owner = "w0"  # replica a is probing
+        with pytest.raises(CircuitOpenError, match="another replica"):
+            await b.call(_ok)
+
+        assert await a.call(_ok) == "ok"
+        assert row.state == "closed"
+        assert await b.call(_ok) == "ok"
+        assert b.state == State.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_unreachable_backend_falls_back_to_local_state(self):
+        row = _Row()
+        (breaker,) = _replicas(row, count=1)
+
+        async def _down(*_args):
+            raise ConnectionError("db down")
+
+        breaker.shared_state.load = _down
+        breaker.shared_state.publish = _down
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await breaker.call(_fail)
+        assert breaker.state == State.OPEN
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_lease_request_frees_the_slot(self):
+        row = _Row()
+        (breaker,) = _replicas(row, count=1, recovery_timeout=0)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await breaker.call(_fail)
+
+        async def _stuck(_recovery_timeout):
+            await asyncio.Event().wait()
+
+        breaker.shared_state.acquire_probe = _stuck
+        call = asyncio.create_task(breaker.call(_ok))
+        await asyncio.sleep(0)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+        assert breaker._probes_in_flight == 0
@@ -0,0 +1,183 @@
+"""Outbox consumer tests — mocked engine and outbox queries, no I/O."""
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from worker import outbox
+from worker.consumer import NOTIFICATION, PROJECTION, OutboxConsumer
+from worker.listener import OutboxListener
+from worker.notifications import coalesce
+from worker.outbox import OutboxRow
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mock_engine(conn):
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+def _row() -> OutboxRow:
+    return OutboxRow(
+        id=uuid4(),
+        tenant_id=uuid4(),
+        event_type="device.created",
+        payload={"device_id": str(uuid4()), "user_id": "u1"},
+        created_at=NOW,
+    )
+
+
+def _mock_outbox(rows: list[OutboxRow]) -> MagicMock:
+    queries = MagicMock()
+    queries.claim_batch = AsyncMock(return_value=rows)
+    queries.mark_processed = AsyncMock(return_value=True)
+    queries.mark_failed = AsyncMock(return_value=True)
+    queries.dead_letter = AsyncMock(return_value=True)
+    queries.release = AsyncMock(return_value=True)
+    queries.backlog = AsyncMock(return_value=(0, None))
+    return queries
+
+
+def _listener() -> OutboxListener:
+    return OutboxListener("postgresql://unused", "outbox_events", enabled=False)
+
+
+class TestOutboxConsumer:
+    def test_batch_max_is_capped_by_the_dependency_rate(self, monkeypatch):
+        from worker.settings import settings
+
+        monkeypatch.setattr(settings, "outbox_lease_seconds", 120.0)
+        consumer = OutboxConsumer(NOTIFICATION, MagicMock(), _listener(), handler=AsyncMock(), call_rate=2.0)
+
+        assert consumer.sizer.max_size == 240
+
+    @pytest.mark.asyncio
+    async def test_batch_handler_failures_are_retried_per_event(self):
+        ok, bad = _row(), _row()
+        boom = RuntimeError("projection failed")
+        batch_handler = AsyncMock(return_value={bad.id: boom})
+        consumer = OutboxConsumer(PROJECTION, _mock_engine(AsyncMock()), _listener(), batch_handler=batch_handler)
+
+        with patch("worker.consumer.outbox", _mock_outbox([ok, bad])) as queries:
+            batch_size, claimed, processed = await consumer.run_once()
+
+        assert (claimed, processed) == (2, 1)
+        assert queries.claim_batch.await_args.args[1] == PROJECTION
+        processed_call = queries.mark_processed.await_args.args
+        assert processed_call[1:3] == (PROJECTION, ok.id)
+        failed_call = queries.mark_failed.await_args
+        assert failed_call.args[1:3] == (PROJECTION, bad.id)
+        assert failed_call.args[5] == "projection failed"
+
+    @pytest.mark.asyncio
+    async def test_handler_failure_does_not_touch_other_consumers(self):
+        row = _row()
+        handler = AsyncMock(side_effect=RuntimeError("resend down"))
+        consumer = OutboxConsumer(NOTIFICATION, _mock_engine(AsyncMock()), _listener(), handler=handler)
+
+        with patch("worker.consumer.outbox", _mock_outbox([row])) as queries:
+            await consumer.run_once()
+
+        handler.assert_awaited_once_with(row)
+        queries.mark_processed.assert_not_awaited()
+        assert queries.mark_failed.await_args.args[1] == NOTIFICATION
+
+    @pytest.mark.asyncio
+    async def test_coalesced_events_share_their_lead_outcome(self):
+        created = _row()
+        activated = OutboxRow(
+            id=uuid4(),
+            tenant_id=created.tenant_id,
+            event_type="device.activated",
+            payload=dict(created.payload),
+            created_at=NOW,
+        )
+        handler = AsyncMock()
+        consumer = OutboxConsumer(
+            NOTIFICATION, _mock_engine(AsyncMock()), _listener(), handler=handler, coalescer=coalesce,
+        )
+
+        with patch("worker.consumer.outbox", _mock_outbox([created, activated])) as queries:
+            _, claimed, processed = await consumer.run_once()
+
+        assert (claimed, processed) == (2, 2)
+        handler.assert_awaited_once()
+        assert handler.await_args.args[0].payload["coalesced"] == ["device.created", "device.activated"]
+        assert {c.args[2] for c in queries.mark_processed.await_args_list} == {created.id, activated.id}
+
+    @pytest.mark.asyncio
+    async def test_absorbed_events_count_their_own_attempts(self):
+        created = _row()
+        activated = OutboxRow(
+            id=uuid4(),
+            tenant_id=created.tenant_id,
+            event_type="device.activated",
+            payload=dict(created.payload),
+            created_at=NOW,
+            attempts=4,
+        )
+        handler = AsyncMock(side_effect=RuntimeError("resend down"))
+        consumer = OutboxConsumer(
+            NOTIFICATION, _mock_engine(AsyncMock()), _listener(), handler=handler, coalescer=coalesce,
+        )
+        consumer.dispatcher.max_attempts = 5
+
+        with patch("worker.consumer.outbox", _mock_outbox([created, activated])) as queries:
+            await consumer.run_once()
+
+        dead = queries.dead_letter.await_args.args
+        assert dead[2] == activated.id and dead[4] == 5
+        failed = queries.mark_failed.await_args.args
+        assert failed[2] == created.id and failed[4] == 1
+        assert failed[5] == f"coalesced into outbox id={activated.id}: resend down"
+
+    @pytest.mark.asyncio
+    async def test_last_attempt_moves_delivery_to_dead_letter(self):
+        row = OutboxRow(
+            id=uuid4(), tenant_id=uuid4(), event_type="device.created",
+            payload={"device_id": str(uuid4())}, created_at=NOW, attempts=4,
+        )
+        handler = AsyncMock(side_effect=RuntimeError("still down"))
+        consumer = OutboxConsumer(NOTIFICATION, _mock_engine(AsyncMock()), _listener(), handler=handler)
+
+        consumer.dispatcher.max_attempts = 5
+
+        with patch("worker.consumer.outbox", _mock_outbox([row])) as queries:
+            await consumer.run_once()
+
+        queries.mark_failed.assert_not_awaited()
+        args = queries.dead_letter.await_args.args
+        assert args[1:3] == (NOTIFICATION, row.id)
+        assert args[4:6] == (5, "still down")
+
+    @pytest.mark.asyncio
+    async def test_idle_consumer_waits_under_its_own_name(self):
+        listener = _listener()
+        listener.wait = AsyncMock(return_value=False)
+        consumer = OutboxConsumer(NOTIFICATION, _mock_engine(AsyncMock()), listener, handler=AsyncMock())
+        calls = iter([False, False, True])
+
+        with patch("worker.consumer.outbox", _mock_outbox([])):
+            await consumer.run(lambda: next(calls), idle_wait=7)
+
+        listener.wait.assert_awaited_once_with(7, waiter=NOTIFICATION)
+
+
+class TestClaimBatch:
+    @pytest.mark.asyncio
+    async def test_holds_back_events_queued_behind_a_delayed_one(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(fetchall=MagicMock(return_value=[]))
+        await outbox.claim_batch(conn, NOTIFICATION, "w-a", limit=10, lease_seconds=60)
+
+        sql = " ".join(str(conn.execute.await_args.args[0]).split())
+        assert "e.payload->>'device_id' = d.payload->>'device_id'" in sql
+        assert "e.created_at < d.created_at" in sql
+        assert "e.next_attempt_at > d.next_attempt_at OR e.lease_until >= now()" in sql
@@ -0,0 +1,94 @@
+"""Direct device command tests — mocked connection."""
+
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+
+from worker.devices import DeviceCommandError, DeviceConflictError, DeviceNotFoundError, activate_device
+
+TENANT = uuid4()
+DEVICE = uuid4()
+
+
+def _conn(row, updated=1):
+    """A connection whose SELECT returns *row* and whose UPDATE touches *updated* rows."""
+    select = MagicMock()
+    select.one_or_none.return_value = row
+    update = MagicMock(rowcount=updated)
+    conn = AsyncMock()
+    conn.execute = AsyncMock(side_effect=[select, update, MagicMock(), MagicMock(), MagicMock()])
+    return conn
+
+
+def _device(status="retired", version=3):
+    return MagicMock(
+        id=DEVICE,
+        tenant_id=TENANT,
+        mac_address="aa:bb:cc:dd:ee:ff",
+        status=status,
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        version=version,
+    )
+
+
+def _sql(conn):
+    return [str(c.args[0]) for c in conn.execute.await_args_list]
+
+
+class TestActivateDevice:
+    @pytest.mark.asyncio
+    async def test_reactivation_bumps_version_and_writes_its_event(self):
+        conn = _conn(_device(version=3))
+
+        cause = uuid4()
+        snapshot = await activate_device(
+            conn, TENANT, DEVICE, "undo", "user-1", expected_version=3, causation_id=cause,
+        )
+
+        assert snapshot["status"] == "active"
+        assert snapshot["version"] == 4
+        update_params = conn.execute.await_args_list[1].args[1]
+        assert update_params["version"] == 3
+        sql = _sql(conn)
+        assert "INSERT INTO outbox " in sql[2]
+        assert "INSERT INTO outbox_deliveries" in sql[3]
+        assert "pg_notify" in sql[4]
+        event = conn.execute.await_args_list[2].args[1]
+        assert event["event_type"] == "device.activated"
+        payload = json.loads(event["payload"])
+        assert payload["device"]["version"] == 4
+        assert (payload["origin"], payload["causation_id"]) == ("system", str(cause))
+        fan_out = conn.execute.await_args_list[3].args[1]
+        assert "o.created_at = :created_at" in sql[3]
+        assert fan_out == {"id": event["id"], "created_at": event["created_at"]}
+
+    @pytest.mark.asyncio
+    async def test_active_device_is_refused(self):
+        conn = _conn(_device(status="active"))
+
+        with pytest.raises(DeviceCommandError, match="already active"):
+            await activate_device(conn, TENANT, DEVICE, "undo", "user-1")
+
+        assert len(_sql(conn)) == 1
+
+    @pytest.mark.asyncio
+    async def test_reason_is_required(self):
+        with pytest.raises(DeviceCommandError, match="reason"):
+            await activate_device(_conn(_device()), TENANT, DEVICE, "  ", "user-1")
+
+    @pytest.mark.asyncio
+    async def test_missing_device(self):
+        with pytest.raises(DeviceNotFoundError):
+            await activate_device(_conn(None), TENANT, DEVICE, "undo", "user-1")
+
+    @pytest.mark.asyncio
+    async def test_newer_change_is_not_overwritten(self):
+        conn = _conn(_device(version=5), updated=0)
+
+        with pytest.raises(DeviceConflictError):
+            await activate_device(conn, TENANT, DEVICE, "undo", "user-1", expected_version=3)
+
+        assert not any("outbox" in sql for sql in _sql(conn))
@@ -0,0 +1,143 @@
+"""Dispatcher tests — concurrency, ordering and outcome classification, no I/O."""
+
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from worker.circuit_breaker import CircuitOpenError
+from worker.dispatcher import Dispatcher, Outcome
+from worker.outbox import OutboxRow
+from worker.saga_engine import SagaInProgressError
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _row(device_id: str | None = None, attempts: int = 0, event_type: str = "device.created") -> OutboxRow:
+    return OutboxRow(
+        id=uuid4(),
+        tenant_id=uuid4(),
+        event_type=event_type,
+        payload={"device_id": device_id or str(uuid4()), "user_id": str(uuid4())},
+        created_at=NOW,
+        attempts=attempts,
+    )
+
+
+class TestDispatcher:
+    @pytest.mark.asyncio
+    async def test_respects_concurrency_limit(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(_row):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        dispatcher = Dispatcher(handler, concurrency=3)
+        results = await dispatcher.run([_row() for _ in range(10)])
+
+        assert peak == 3
+        assert all(r.outcome == Outcome.PROCESSED for r in results)
+
+    @pytest.mark.asyncio
+    async def test_same_device_runs_in_order(self):
+        device = str(uuid4())
+        rows = [_row(device) for _ in range(5)]
+        seen: list = []
+
+        async def handler(row):
+            await asyncio.sleep(0.001 * (5 - len(seen)))
+            seen.append(row.id)
+
+        await Dispatcher(handler, concurrency=5).run(rows)
+
+        assert seen == [r.id for r in rows]
+
+    @pytest.mark.asyncio
+    async def test_failure_holds_back_later_events_for_device(self):
+        device = str(uuid4())
+        first, second = _row(device), _row(device)
+        other = _row()
+
+        async def handler(row):
+            if row.id == first.id:
+                raise RuntimeError("boom")
+
+        results = await Dispatcher(handler, concurrency=5).run([first, second, other])
+
+        assert [r.outcome for r in results] == [Outcome.RETRY, Outcome.SKIPPED, Outcome.PROCESSED]
+        assert results[0].attempts == 1
+        assert results[1].attempts == 0
+
+    @pytest.mark.asyncio
+    async def test_dead_letters_when_attempts_exhausted(self):
+        async def handler(_row):
+            raise RuntimeError("boom")
+
+        results = await Dispatcher(handler, max_attempts=3).run([_row(attempts=2)])
+
+        assert results[0].outcome == Outcome.DEAD_LETTER
+        assert results[0].error == "boom"
+
+    @pytest.mark.asyncio
+    async def test_circuit_open_is_skipped_without_attempt(self):
+        async def handler(_row):
+            raise CircuitOpenError("open")
+
+        results = await Dispatcher(handler).run([_row(attempts=1)])
+
+        assert results[0].outcome == Outcome.SKIPPED
+        assert results[0].attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_saga_in_progress_elsewhere_is_deferred_without_attempt(self):
+        async def handler(_row):
+            raise SagaInProgressError("running elsewhere")
+
+        dispatcher = Dispatcher(handler, max_attempts=1, in_progress_delay=300.0)
+        results = await dispatcher.run([_row(attempts=0)])
+
+        assert results[0].outcome == Outcome.SKIPPED
+        assert results[0].attempts == 0
+        assert results[0].retry_after == 300.0
+
+    @pytest.mark.asyncio
+    async def test_on_result_fires_before_next_event_for_device(self):
+        device = str(uuid4())
+        rows = [_row(device), _row(device)]
+        log: list[str] = []
+
+        async def handler(row):
+            log.append(f"run {row.id}")
+
+        async def on_result(result):
+            log.append(f"record {result.row.id}")
+
+        await Dispatcher(handler, on_result=on_result).run(rows)
+
+        assert log == [
+            f"run {rows[0].id}",
+            f"record {rows[0].id}",
+            f"run {rows[1].id}",
+            f"record {rows[1].id}",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_held_back_events_inherit_retry_delay(self):
+        device = str(uuid4())
+        first, second = _row(device), _row(device)
+
+        async def handler(row):
+            if row.id == first.id:
+                raise RuntimeError("boom")
+
+        dispatcher = Dispatcher(handler, backoff=lambda attempt: 4.0 * attempt)
+        results = await dispatcher.run([first, second])
+
+        assert results[0].retry_after == 4.0
+        assert results[1].retry_after == 4.0
@@ -0,0 +1,110 @@
+"""Batched email tests — against a local HTTP stand-in for Resend's batch endpoint."""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from worker.circuit_breaker import CircuitBreaker
+from worker.email_batch import EmailBatcher, EmailDeliveryError
+
+
+class _ResendStandIn:
+    """``POST /emails/batch`` in permissive mode: addresses containing "bad" are rejected."""
+
+    def __init__(self) -> None:
+        self.batches: list[list[dict]] = []
+        self.status = 200
+        stand_in = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stand_in.batches.append(body)
+                if stand_in.status != 200:
+                    self.send_response(stand_in.status)
+                    self.end_headers()
+                    return
+                data, errors = [], []
+                for index, message in enumerate(body):
+                    if "bad" in message["to"][0]:
+                        errors.append({"index": index, "message": "Invalid `to` field"})
+                    else:
+                        data.append({"id": f"msg-{len(stand_in.batches)}-{index}"})
+                payload = json.dumps({"data": data, "errors": errors}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+
+@pytest.fixture
+def resend():
+    stand_in = _ResendStandIn()
+    yield stand_in
+    stand_in.server.shutdown()
+    stand_in.server.server_close()
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(failure_threshold=5, recovery_timeout=30.0, name="resend-test")
+
+
+class TestEmailBatcher:
+    @pytest.mark.asyncio
+    async def test_messages_within_the_window_share_one_request(self, resend):
+        async with httpx.AsyncClient(base_url=resend.url) as client:
+            mailer = EmailBatcher(client, _breaker(), window=0.05)
+            ids = await asyncio.gather(*(mailer.send(f"u{i}@example.com", "Hi", "<p>hi</p>") for i in range(5)))
+
+        assert len(resend.batches) == 1
+        assert [m["to"] for m in resend.batches[0]] == [[f"u{i}@example.com"] for i in range(5)]
+        assert ids == [f"msg-1-{i}" for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_full_buffers_are_split_into_chunks(self, resend):
+        async with httpx.AsyncClient(base_url=resend.url) as client:
+            mailer = EmailBatcher(client, _breaker(), window=10, max_batch=2)
+            await asyncio.gather(*(mailer.send(f"u{i}@example.com", "Hi", "") for i in range(4)))
+
+        assert [len(b) for b in resend.batches] == [2, 2]
+
+    @pytest.mark.asyncio
+    async def test_rejected_message_fails_only_its_caller(self, resend):
+        async with httpx.AsyncClient(base_url=resend.url) as client:
+            mailer = EmailBatcher(client, _breaker(), window=0.01)
+            results = await asyncio.gather(
+                mailer.send("ok@example.com", "Hi", ""),
+                mailer.send("bad@example.com", "Hi", ""),
+                mailer.send("also-ok@example.com", "Hi", ""),
+                return_exceptions=True,
+            )
+
+        assert results[0] == "msg-1-0"
+        assert isinstance(results[1], EmailDeliveryError)
+        assert results[2] == "msg-1-2"
+
+    @pytest.mark.asyncio
+    async def test_failed_request_fails_every_message_in_the_chunk(self, resend):
+        resend.status = 503
+        breaker = _breaker()
+        async with httpx.AsyncClient(base_url=resend.url) as client:
+            mailer = EmailBatcher(client, breaker, window=0.01)
+            results = await asyncio.gather(
+                *(mailer.send(f"u{i}@example.com", "Hi", "") for i in range(3)),
+                return_exceptions=True,
+            )
+
+        assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+        assert breaker._failure_count == 1  # one request, one breaker failure
@@ -0,0 +1,116 @@
+"""Email resolution cache tests — mocked tenancy client, no network."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from worker.circuit_breaker import CircuitBreaker
+from worker.email_cache import EmailLookupError, EmailResolver, email_cache_lookups
+
+
+def _response(status_code=200, json_data=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = json_data or {}
+    return resp
+
+
+def _resolver(client, **kwargs):
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30.0, name="tenancy-test")
+    return EmailResolver(client, breaker, **kwargs)
+
+
+class TestEmailResolver:
+    @pytest.mark.asyncio
+    async def test_second_lookup_is_a_hit(self):
+        client = AsyncMock()
+        client.get.return_value = _response(200, {"email": "a@example.com"})
+        resolver = _resolver(client)
+        hits_before = email_cache_lookups.value(result="hit")
+
+        assert await resolver.resolve("u1") == "a@example.com"
+        assert await resolver.resolve("u1") == "a@example.com"
+
+        client.get.assert_awaited_once()
+        assert email_cache_lookups.value(result="hit") == hits_before + 1
+
+    @pytest.mark.asyncio
+    async def test_peek_reads_the_cache_without_calling_tenancy(self):
+        client = AsyncMock()
+        client.get.return_value = _response(200, {"email": "a@example.com"})
+        resolver = _resolver(client)
+
+        assert resolver.peek("u1") is None
+        client.get.assert_not_awaited()
+        await resolver.resolve("u1")
+        assert resolver.peek("u1") == "a@example.com"
+        client.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_negatively_cached(self):
+        client = AsyncMock()
+        client.get.return_value = _response(404)
+        resolver = _resolver(client)
+
+        assert await resolver.resolve("u1") is None
+        assert await resolver.resolve("u1") is None
+        client.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_server_error_raises_and_is_not_cached(self):
+        client = AsyncMock()
+        client.get.return_value = _response(503)
+        resolver = _resolver(client)
+
+        for _ in range(2):
+            with pytest.raises(EmailLookupError):
+                await resolver.resolve("u1")
+        assert client.get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_are_coalesced(self):
+        release = asyncio.Event()
+
+        async def slow_get(_path):
+            await release.wait()
+            return _response(200, {"email": "a@example.com"})
+
+        client = AsyncMock()
+        client.get.side_effect = slow_get
+        resolver = _resolver(client)
+
+        tasks = [asyncio.create_task(resolver.resolve("u1")) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*tasks) == ["a@example.com"] * 5
+        client.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_are_refetched(self):
+        client = AsyncMock()
+        client.get.return_value = _response(200, {"email": "a@example.com"})
+        resolver = _resolver(client, ttl=10.0)
+
+        with patch("worker.email_cache.time.monotonic", return_value=100.0):
+            await resolver.resolve("u1")
+        with patch("worker.email_cache.time.monotonic", return_value=111.0):
+            await resolver.resolve("u1")
+
+        assert client.get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        client = AsyncMock()
+        client.get.return_value = _response(200, {"email": "a@example.com"})
+        resolver = _resolver(client, max_size=2)
+
+        await resolver.resolve("u1")
+        await resolver.resolve("u2")
+        await resolver.resolve("u1")  # u1 becomes most recently used
+        await resolver.resolve("u3")  # evicts u2
+
+        assert len(resolver) == 2
+        await resolver.resolve("u1")
+        assert client.get.await_count == 3
@@ -0,0 +1,47 @@
+"""Shared HTTP client wiring tests — no network."""
+
+import logging
+import sys
+
+import pytest
+
+from worker.http_clients import create_http_clients
+from worker.settings import settings
+
+
+class TestHttpClients:
+    @pytest.mark.asyncio
+    async def test_clients_carry_base_url_and_credentials(self):
+        http = create_http_clients()
+        try:
+            assert str(http.tenancy.base_url).rstrip("/") == settings.tenancy_service_url
+            assert http.tenancy.headers["x-internal-token"] == settings.tenancy_service_token
+            assert http.email.headers["Authorization"] == f"Bearer {settings.resend_api_key}"
+            assert http.device_service.headers["x-internal-token"] == settings.device_service_token
+        finally:
+            await http.aclose()
+
+    @pytest.mark.asyncio
+    async def test_http2_without_h2_falls_back(self, monkeypatch, caplog):
+        monkeypatch.setattr(settings, "http2_enabled", True)
+        monkeypatch.setitem(sys.modules, "h2", None)  # makes `import h2` fail
+
+        with caplog.at_level(logging.WARNING, logger="worker.http_clients"):
+            http = create_http_clients()
+        try:
+            assert "HTTP/2 requested but the 'h2' package is missing" in caplog.text
+            assert http.tenancy._transport._pool._http2 is False
+        finally:
+            await http.aclose()
+
+    @pytest.mark.asyncio
+    async def test_fresh_clients_report_empty_pools(self):
+        http = create_http_clients()
+        try:
+            assert http.pool_usage() == {
+                "tenancy": (0, 0),
+                "email": (0, 0),
+                "device_service": (0, 0),
+            }
+        finally:
+            await http.aclose()
@@ -0,0 +1,44 @@
+"""Outbox listener tests — wake-up semantics only, no database."""
+
+import pytest
+
+from worker.listener import OutboxListener, asyncpg_dsn
+
+
+class TestAsyncpgDsn:
+    def test_strips_sqlalchemy_driver(self):
+        dsn = asyncpg_dsn("postgresql+asyncpg://user:secret@db:5432/devices")
+        assert dsn == "postgresql://user:secret@db:5432/devices"
+
+
+class TestOutboxListener:
+    @pytest.mark.asyncio
+    async def test_wait_times_out_without_notification(self):
+        listener = OutboxListener("postgresql://unused", "outbox_events", enabled=False)
+        assert await listener.wait(0.01) is False
+
+    @pytest.mark.asyncio
+    async def test_wake_before_wait_is_not_lost(self):
+        listener = OutboxListener("postgresql://unused", "outbox_events", enabled=False)
+        listener.wake()
+        assert await listener.wait(5) is True
+        # The wake-up is consumed by the first waiter.
+        assert await listener.wait(0.01) is False
+
+    @pytest.mark.asyncio
+    async def test_notification_wakes_waiter(self):
+        listener = OutboxListener("postgresql://unused", "outbox_events", enabled=False)
+        listener._on_notify(None, 1, "outbox_events", "device.created")
+        assert await listener.wait(5) is True
+
+    @pytest.mark.asyncio
+    async def test_each_waiter_sees_every_wake_up(self):
+        listener = OutboxListener("postgresql://unused", "outbox_events", enabled=False)
+        assert await listener.wait(0.01, waiter="projection") is False
+        assert await listener.wait(0.01, waiter="notification") is False
+
+        listener._on_notify(None, 1, "outbox_events", "device.created")
+
+        assert await listener.wait(5, waiter="projection") is True
+        # Consumed by projection, but still pending for the busy notification waiter.
+        assert await listener.wait(5, waiter="notification") is True
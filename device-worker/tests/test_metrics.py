@@ -0,0 +1,94 @@
+"""Metrics tests — histogram buckets, text exposition and the /metrics endpoint."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from worker.metrics import Counter, Histogram, Registry
+from worker.metrics_server import CONTENT_TYPE, MetricsServer
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr("worker.metrics.REGISTRY", registry)
+    return registry
+
+
+class TestHistogram:
+    def test_buckets_are_cumulative(self, registry):
+        latency = Histogram("latency_seconds", "Latency.", labelnames=("op",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, op="get")
+
+        samples = {(name, labels.get("le")): value for name, labels, value in latency.samples()}
+        assert samples[("latency_seconds_bucket", "0.1")] == 1
+        assert samples[("latency_seconds_bucket", "1.0")] == 2
+        assert samples[("latency_seconds_bucket", "+Inf")] == 3
+        assert samples[("latency_seconds_sum", None)] == pytest.approx(5.55)
+        assert latency.value(op="get") == 3
+
+    def test_histograms_sum_across_processes(self, registry):
+        latency = Histogram("latency_seconds", "Latency.", buckets=(1.0,))
+        latency.observe(0.5)
+        dump = registry.dump()
+
+        combined = registry.combine({"0": dump, "1": dump})
+        assert combined['latency_seconds_bucket{le="1.0"}'] == 2
+        assert combined["latency_seconds_count"] == 2
+
+
+class TestExposition:
+    def test_renders_help_type_and_escaped_labels(self, registry):
+        events = Counter("events_total", "Events handled.", labelnames=("event_type",))
+        events.inc(3, event_type='device "x"')
+
+        text = registry.exposition()
+
+        assert text.splitlines() == [
+            "# HELP events_total Events handled.",
+            "# TYPE events_total counter",
+            'events_total{event_type="device \\"x\\""} 3',
+        ]
+
+    def test_histogram_series_share_one_family(self, registry):
+        Histogram("latency_seconds", "Latency.", buckets=(1.0,)).observe(2.0)
+
+        lines = registry.exposition().splitlines()
+
+        assert lines.count("# TYPE latency_seconds histogram") == 1
+        assert 'latency_seconds_bucket{le="+Inf"} 1' in lines
+        assert "latency_seconds_sum 2" in lines
+
+    def test_failing_collector_does_not_break_the_scrape(self, registry):
+        Counter("ok_total", "Ok.").inc()
+        registry.add_collector(lambda: 1 / 0)
+
+        assert "ok_total 1" in registry.exposition()
+
+
+class TestMetricsServer:
+    def test_serves_metrics_and_404s_elsewhere(self):
+        server = MetricsServer(0, lambda: "up 1\n", host="127.0.0.1")
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as res:
+                assert res.headers["Content-Type"] == CONTENT_TYPE
+                assert res.read() == b"up 1\n"
+            with pytest.raises(urllib.error.HTTPError) as exc:
+                urllib.request.urlopen(f"http://127.0.0.1:{server.port}/")
+            assert exc.value.code == 404
+        finally:
+            server.stop()
+
+    def test_taken_port_is_a_warning_not_a_crash(self, caplog):
+        first = MetricsServer(0, lambda: "", host="127.0.0.1")
+        first.start()
+        try:
+            second = MetricsServer(first.port, lambda: "", host="127.0.0.1")
+            assert second.start() is False
+            assert "continuing without the /metrics endpoint" in caplog.text
+            second.stop()
+        finally:
+            first.stop()
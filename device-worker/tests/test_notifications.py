@@ -0,0 +1,83 @@
+"""Notification coalescing tests — pure functions, no I/O."""
+
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from worker.metrics import coalesced_calls_saved
+from worker.notifications import coalesce, message_for
+from worker.outbox import OutboxRow
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+_clock = iter(range(10_000))
+
+
+def _row(event_type: str, device_id: str, user_id: str = "u1", **extra) -> OutboxRow:
+    return OutboxRow(
+        id=uuid4(),
+        tenant_id=uuid4(),
+        event_type=event_type,
+        payload={"device_id": device_id, "user_id": user_id, **extra},
+        created_at=NOW + timedelta(seconds=next(_clock)),
+    )
+
+
+class TestCoalesce:
+    def test_consecutive_notified_events_merge_into_the_last(self):
+        device = str(uuid4())
+        created, activated = _row("device.created", device), _row("device.activated", device)
+        saved_before = coalesced_calls_saved.value(consumer="notification", call="email")
+
+        batch = coalesce([created, activated])
+
+        assert [r.id for r in batch.rows] == [activated.id]
+        assert batch.rows[0].payload["coalesced"] == ["device.created", "device.activated"]
+        assert batch.absorbed == {activated.id: [created]}
+        assert coalesced_calls_saved.value(consumer="notification", call="email") == saved_before + 1
+        assert coalesced_calls_saved.value(consumer="notification", call="email_lookup") == 0
+
+    def test_saga_events_end_the_run(self):
+        device = str(uuid4())
+        rows = [_row("device.created", device), _row("device.retired", device), _row("device.activated", device)]
+
+        batch = coalesce(rows)
+
+        assert batch.rows == rows
+        assert batch.calls_saved == 0
+
+    def test_other_devices_and_recipients_are_not_merged(self):
+        device = str(uuid4())
+        rows = [
+            _row("device.created", device, user_id="u1"),
+            _row("device.created", str(uuid4()), user_id="u1"),
+            _row("device.activated", device, user_id="u2"),
+        ]
+
+        assert coalesce(rows).rows == rows
+
+    def test_system_originated_events_are_left_alone(self):
+        device = str(uuid4())
+        rows = [_row("device.created", device), _row("device.activated", device, origin="system")]
+
+        assert coalesce(rows).rows == rows
+
+    def test_leads_keep_outbox_order(self):
+        a, b = str(uuid4()), str(uuid4())
+        rows = [_row("device.created", a), _row("device.created", b), _row("device.activated", a)]
+
+        batch = coalesce(rows)
+
+        assert [r.id for r in batch.rows] == [rows[1].id, rows[2].id]
+
+
+class TestMessageFor:
+    def test_single_event(self):
+        assert message_for(["device.activated"]) == ("Device activated", "Your device is active.")
+
+    def test_merged_events_share_one_message(self):
+        subject, body = message_for(["device.created", "device.activated"])
+
+        assert subject == "Device updates"
+        assert body == "Your device has been registered. Your device is active."
+
+    def test_unnotified_event(self):
+        assert message_for(["device.retired"]) is None
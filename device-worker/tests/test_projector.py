@@ -0,0 +1,178 @@
+"""Batch projector tests — mocked engine and email resolver, no I/O."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID, uuid4
+
+import pytest
+
+from worker.metrics import coalesced_calls_saved
+from worker.outbox import OutboxRow
+from worker.projector import project_batch
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mock_engine(conn):
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+def _row(event_type: str, device_id: UUID, user_id: str = "u1", offset: int = 0) -> OutboxRow:
+    return OutboxRow(
+        id=uuid4(),
+        tenant_id=uuid4(),
+        event_type=event_type,
+        payload={"device_id": str(device_id), "user_id": user_id},
+        created_at=NOW + timedelta(seconds=offset),
+    )
+
+
+def _snapshot_row(event_type: str, device_id: UUID, status: str, version: int, offset: int = 0) -> OutboxRow:
+    row = _row(event_type, device_id, offset=offset)
+    row.payload["device"] = {
+        "id": str(device_id),
+        "tenant_id": str(row.tenant_id),
+        "mac_address": "AA:BB:CC:DD:EE:FF",
+        "status": status,
+        "created_at": NOW.isoformat(),
+        "updated_at": (NOW + timedelta(seconds=offset)).isoformat(),
+        "version": version,
+    }
+    return row
+
+
+def _emails(resolve=None, cached: dict[str, str] | None = None) -> MagicMock:
+    emails = MagicMock()
+    emails.peek.side_effect = lambda user_id: (cached or {}).get(user_id)
+    emails.resolve = AsyncMock(side_effect=resolve, return_value=None)
+    return emails
+
+
+class TestProjectBatch:
+    @pytest.mark.asyncio
+    async def test_one_upsert_with_events_collapsed_per_device(self):
+        conn = AsyncMock()
+        emails = _emails(cached={"u1": "owner@example.com"})
+        d1, d2 = uuid4(), uuid4()
+        rows = [
+            _row("device.created", d1, offset=0),
+            _row("device.retired", d1, offset=1),
+            _row("device.activated", d1, offset=2),
+            _row("device.retired", d2, offset=3),
+        ]
+        saved_before = coalesced_calls_saved.value(consumer="projection", call="projection_write")
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert failures == {}
+        assert coalesced_calls_saved.value(consumer="projection", call="projection_write") == saved_before + 2
+        conn.execute.assert_awaited_once()
+        sql, params = conn.execute.call_args[0]
+        assert "unnest" in str(sql)
+        assert "device_read_model.version <= EXCLUDED.version" in str(sql)
+        assert params["device_ids"] == [d1, d2]
+        assert params["owner_emails"] == ["owner@example.com", None]
+
+    @pytest.mark.asyncio
+    async def test_snapshot_events_upsert_without_reading_devices(self):
+        conn = AsyncMock()
+        emails = _emails(cached={"u1": "owner@example.com"})
+        device_id = uuid4()
+        rows = [
+            _snapshot_row("device.created", device_id, "active", 1, offset=0),
+            _snapshot_row("device.retired", device_id, "retired", 2, offset=1),
+        ]
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert failures == {}
+        conn.execute.assert_awaited_once()
+        sql, params = conn.execute.call_args[0]
+        assert "JOIN devices" not in str(sql)
+        assert params["ids"] == [device_id]
+        assert params["statuses"] == ["retired"]
+        assert params["versions"] == [2]
+        assert params["owner_emails"] == ["owner@example.com"]
+        assert params["updated_ats"] == [NOW + timedelta(seconds=1)]
+
+    @pytest.mark.asyncio
+    async def test_legacy_events_fall_back_to_devices_in_same_transaction(self):
+        conn = AsyncMock()
+        emails = _emails()
+        new_device, legacy_device = uuid4(), uuid4()
+        rows = [
+            _snapshot_row("device.activated", new_device, "active", 3),
+            _row("device.retired", legacy_device, offset=1),
+        ]
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert failures == {}
+        assert conn.execute.await_count == 2
+        snapshot_params = conn.execute.await_args_list[0][0][1]
+        legacy_sql, legacy_params = conn.execute.await_args_list[1][0]
+        assert snapshot_params["ids"] == [new_device]
+        assert "JOIN devices" in str(legacy_sql)
+        assert legacy_params["device_ids"] == [legacy_device]
+
+    @pytest.mark.asyncio
+    async def test_uncached_owner_email_is_backfilled_after_the_write(self):
+        conn = AsyncMock()
+        emails = _emails(resolve=lambda user_id: "owner@example.com")
+        devices = [uuid4() for _ in range(3)]
+        rows = [_row("device.created", d, user_id="u1") for d in devices]
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert failures == {}
+        emails.resolve.assert_awaited_once_with("u1")
+        assert conn.execute.await_count == 2
+        upsert_params = conn.execute.await_args_list[0][0][1]
+        backfill_sql, backfill_params = conn.execute.await_args_list[1][0]
+        assert upsert_params["owner_emails"] == [None, None, None]
+        assert "owner_email IS NULL" in str(backfill_sql)
+        assert backfill_params["device_ids"] == devices
+        assert backfill_params["owner_emails"] == ["owner@example.com"] * 3
+
+    @pytest.mark.asyncio
+    async def test_email_lookup_failure_does_not_fail_the_projection(self):
+        conn = AsyncMock()
+
+        async def resolve(user_id):
+            raise RuntimeError("tenancy down")
+
+        emails = _emails(resolve=resolve)
+        device_id = uuid4()
+        rows = [_row("device.created", device_id), _row("device.retired", device_id, offset=1)]
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert failures == {}
+        conn.execute.assert_awaited_once()
+        params = conn.execute.call_args[0][1]
+        assert params["device_ids"] == [device_id]
+        assert params["owner_emails"] == [None]
+
+    @pytest.mark.asyncio
+    async def test_write_failure_fails_every_projected_event(self):
+        conn = AsyncMock()
+        conn.execute.side_effect = RuntimeError("db down")
+        emails = _emails()
+        rows = [_row("device.retired", uuid4()), _row("device.activated", uuid4())]
+
+        failures = await project_batch(_mock_engine(conn), emails, rows)
+
+        assert set(failures) == {r.id for r in rows}
+
+    @pytest.mark.asyncio
+    async def test_ignores_unrelated_events(self):
+        conn = AsyncMock()
+        emails = _emails()
+        row = OutboxRow(id=uuid4(), tenant_id=uuid4(), event_type="benchmark.ping", payload={}, created_at=NOW)
+
+        assert await project_batch(_mock_engine(conn), emails, [row]) == {}
+        conn.execute.assert_not_awaited()
+
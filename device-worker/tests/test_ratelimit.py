@@ -0,0 +1,139 @@
+"""Rate limiter and bulkhead tests — pure asyncio, no I/O."""
+
+import asyncio
+import time
+
+import pytest
+
+from worker.circuit_breaker import CircuitBreaker, CircuitOpenError
+from worker.ratelimit import Bulkhead, DependencyLimiter, TokenBucket, dependency_wait
+
+
+class TestTokenBucket:
+    @pytest.mark.asyncio
+    async def test_burst_passes_then_calls_are_paced(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        started = time.monotonic()
+
+        for _ in range(4):
+            await bucket.acquire()
+
+        # 2 immediately, then 2 more at 50/s
+        assert time.monotonic() - started >= 0.035
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_returns_its_reservation(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        await bucket.acquire()
+
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert bucket._reserve() == pytest.approx(1.0, abs=0.05)
+
+
+class TestBulkhead:
+    @pytest.mark.asyncio
+    async def test_waiters_are_served_in_order(self):
+        bulkhead = Bulkhead(1)
+        await bulkhead.acquire()
+        order = []
+
+        async def _wait(i):
+            await bulkhead.acquire()
+            order.append(i)
+            bulkhead.release()
+
+        tasks = [asyncio.create_task(_wait(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        bulkhead.release()
+        await asyncio.gather(*tasks)
+
+        assert order == [0, 1, 2]
+        assert bulkhead.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        bulkhead = Bulkhead(1)
+        await bulkhead.acquire()
+        waiter = asyncio.create_task(bulkhead.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        bulkhead.release()
+        assert bulkhead.in_use == 0
+
+
+class TestDependencyLimiter:
+    @pytest.mark.asyncio
+    async def test_callers_queue_instead_of_failing(self):
+        limiter = DependencyLimiter("test-dep", max_concurrent=2)
+        running = peak = 0
+        waits_before = dependency_wait.value(dependency="test-dep")
+
+        async def _call():
+            nonlocal running, peak
+            async with limiter:
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        calls = [asyncio.create_task(_call()) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert limiter.queued == 3
+        await asyncio.gather(*calls)
+
+        assert peak == 2
+        assert limiter.queued == 0
+        assert dependency_wait.value(dependency="test-dep") == waits_before + 5
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_fails_fast_instead_of_queueing(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=999, name="test-dep-open")
+        limiter = DependencyLimiter("test-dep-open", rate=1, burst=1, breaker=breaker)
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        async with limiter:
+            with pytest.raises(RuntimeError):
+                await breaker.call(failing)
+
+        started = time.monotonic()
+        with pytest.raises(CircuitOpenError):
+            async with limiter:
+                pass
+        assert time.monotonic() - started < 0.1
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_queued_callers_fail_fast_once_the_breaker_opens(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=999, name="test-dep-opening")
+        limiter = DependencyLimiter("test-dep-opening", max_concurrent=1, breaker=breaker)
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        async def _first():
+            async with limiter:
+                await asyncio.sleep(0.01)
+                with pytest.raises(RuntimeError):
+                    await breaker.call(failing)
+
+        async def _queued():
+            async with limiter:
+                pass
+
+        first = asyncio.create_task(_first())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_queued())
+        await first
+        with pytest.raises(CircuitOpenError):
+            await queued
+        assert limiter.bulkhead.in_use == 0
@@ -0,0 +1,97 @@
+"""Dead-letter replay tests — filter building and chunk pacing, no database."""
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from worker import main as worker_main
+from worker.replay import ReplayFilter, replay, replay_chunk
+
+
+def _mock_engine(conn):
+    engine = MagicMock()
+    for method in (engine.begin, engine.connect):
+        method.return_value.__aenter__ = AsyncMock(return_value=conn)
+        method.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+class TestReplayFilter:
+    def test_empty_filter_matches_everything(self):
+        assert ReplayFilter().where() == ("TRUE", {})
+
+    def test_combines_all_filters(self):
+        tenant = uuid4()
+        since = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        where, params = ReplayFilter(tenant_id=tenant, event_type="device.created", since=since).where()
+        assert where == "TRUE AND tenant_id = :tenant_id AND event_type = :event_type AND created_at >= :since"
+        assert params == {"tenant_id": tenant, "event_type": "device.created", "since": since}
+
+
+class TestReplay:
+    @pytest.mark.asyncio
+    async def test_moves_chunks_until_exhausted_at_the_given_rate(self):
+        conn = AsyncMock()
+        with (
+            patch("worker.replay.replay_chunk", AsyncMock(side_effect=[100, 100, 40])) as chunk,
+            patch("worker.replay.asyncio.sleep", AsyncMock()) as sleep,
+        ):
+            total = await replay(_mock_engine(conn), ReplayFilter(), chunk_size=100, rate=50.0)
+
+        assert total == 240
+        assert chunk.await_count == 3
+        # Two full chunks, each followed by a pause of up to 100 / 50 seconds.
+        assert sleep.await_count == 2
+        assert all(0 < call.args[0] <= 2.0 for call in sleep.await_args_list)
+        # Workers are woken after every chunk that moved rows.
+        assert sum("pg_notify" in str(c.args[0]) for c in conn.execute.await_args_list) == 3
+
+    @pytest.mark.asyncio
+    async def test_zero_rate_means_unlimited(self):
+        conn = AsyncMock()
+        with (
+            patch("worker.replay.replay_chunk", AsyncMock(side_effect=[100, 10])),
+            patch("worker.replay.asyncio.sleep", AsyncMock()) as sleep,
+        ):
+            assert await replay(_mock_engine(conn), ReplayFilter(), chunk_size=100, rate=0) == 110
+        sleep.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_existing_delivery_is_reset_not_dropped(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(rowcount=1)
+
+        await replay_chunk(conn, ReplayFilter(), limit=10)
+
+        sql = str(conn.execute.await_args.args[0])
+        assert "DO NOTHING" not in sql
+        assert "ON CONFLICT (outbox_id, consumer) DO UPDATE SET" in sql
+        assert "processed_at = NULL" in sql
+        assert "errors = outbox_deliveries.errors || EXCLUDED.errors" in sql
+
+    @pytest.mark.asyncio
+    async def test_dry_run_only_counts(self):
+        conn = AsyncMock()
+        with (
+            patch("worker.replay.count_dead_letters", AsyncMock(return_value=7)),
+            patch("worker.replay.replay_chunk", AsyncMock()) as chunk,
+        ):
+            assert await replay(_mock_engine(conn), ReplayFilter(), dry_run=True) == 7
+        chunk.assert_not_awaited()
+
+
+class TestReplayCommand:
+    def test_parses_filters_and_runs_replay(self):
+        tenant = uuid4()
+        with patch.object(worker_main.replay, "run", AsyncMock(return_value=0)) as run:
+            worker_main.main(
+                ["replay", "--tenant", str(tenant), "--event-type", "device.created",
+                 "--since", "2026-03-01T00:00:00+00:00", "--rate", "10"]
+            )
+        args = run.await_args.args[0]
+        assert args.tenant == tenant
+        assert args.event_type == "device.created"
+        assert args.since == datetime(2026, 3, 1, tzinfo=timezone.utc)
+        assert args.rate == 10.0
@@ -0,0 +1,176 @@
+"""Outbox retention tests — partition bookkeeping with a mocked connection."""
+
+import gzip
+import json
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from worker.metrics import outbox_default_partition_events
+from worker.retention import OutboxRetention, Partition, parse_lower_bound, parse_upper_bound, partition_name
+
+NOW = datetime(2026, 3, 20, 12, 0, tzinfo=timezone.utc)
+
+
+def _executed(conn: AsyncMock) -> list[str]:
+    return [str(call.args[0]) for call in conn.execute.await_args_list]
+
+
+class TestPartitionBounds:
+    def test_partition_name(self):
+        assert partition_name(date(2026, 3, 1)) == "outbox_p20260301"
+
+    def test_parses_range_upper_bound(self):
+        bound = "FOR VALUES FROM ('2026-03-01 00:00:00+00') TO ('2026-03-02 00:00:00+00')"
+        assert parse_upper_bound(bound) == datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+    def test_history_partition_has_an_upper_bound(self):
+        bound = "FOR VALUES FROM (MINVALUE) TO ('2026-03-01 00:00:00+00')"
+        assert parse_upper_bound(bound) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+    def test_default_partition_never_expires(self):
+        assert parse_upper_bound("DEFAULT") is None
+
+    def test_parses_range_lower_bound(self):
+        assert parse_lower_bound("FOR VALUES FROM (MINVALUE) TO ('2026-03-01 00:00:00+00')") is None
+        bound = "FOR VALUES FROM ('2026-03-01 00:00:00+00') TO ('2026-03-02 00:00:00+00')"
+        assert parse_lower_bound(bound) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+class TestExpire:
+    @pytest.mark.asyncio
+    async def test_drops_only_old_fully_processed_partitions(self):
+        retention = OutboxRetention(MagicMock(), retention_days=7)
+        conn = AsyncMock()
+        partitions = [
+            Partition("outbox_p20260310", datetime(2026, 3, 11, tzinfo=timezone.utc)),
+            Partition("outbox_p20260312", datetime(2026, 3, 13, tzinfo=timezone.utc)),
+            Partition("outbox_p20260319", datetime(2026, 3, 20, tzinfo=timezone.utc)),
+            Partition("outbox_default", None),
+        ]
+        with (
+            patch.object(retention, "_partitions", AsyncMock(return_value=partitions)),
+            patch.object(retention, "_has_pending", AsyncMock(side_effect=[False, True])),
+            patch.object(retention, "_delete_deliveries", AsyncMock()) as delete,
+        ):
+            dropped = await retention._expire(conn, cutoff=datetime(2026, 3, 13, 12, tzinfo=timezone.utc))
+
+        assert dropped == ["outbox_p20260310"]
+        delete.assert_awaited_once_with(conn, datetime(2026, 3, 11, tzinfo=timezone.utc))
+        assert _executed(conn) == [
+            "ALTER TABLE outbox DETACH PARTITION outbox_p20260310",
+            "DROP TABLE outbox_p20260310",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_premake_creates_missing_days_only(self):
+        retention = OutboxRetention(MagicMock(), premake_days=2)
+        conn = AsyncMock()
+        existing = [Partition("outbox_p20260320", datetime(2026, 3, 21, tzinfo=timezone.utc))]
+        with patch.object(retention, "_partitions", AsyncMock(return_value=existing)):
+            await retention._premake(conn, NOW.date())
+
+        statements = _executed(conn)
+        assert len(statements) == 2
+        assert statements[0].startswith("CREATE TABLE IF NOT EXISTS outbox_p20260321 PARTITION OF outbox")
+        assert "TO ('2026-03-22T00:00:00+00:00')" in statements[0]
+        assert statements[1].startswith("CREATE TABLE IF NOT EXISTS outbox_p20260322")
+
+    @pytest.mark.asyncio
+    async def test_premake_skips_days_covered_by_the_history_partition(self):
+        # Partitioning was introduced today: outbox_history runs up to tomorrow.
+        retention = OutboxRetention(MagicMock(), premake_days=2)
+        conn = AsyncMock()
+        existing = [
+            Partition("outbox_history", datetime(2026, 3, 21, tzinfo=timezone.utc)),
+            Partition("outbox_default", None),
+        ]
+        with patch.object(retention, "_partitions", AsyncMock(return_value=existing)):
+            await retention._premake(conn, NOW.date())
+
+        statements = _executed(conn)
+        assert len(statements) == 2
+        assert statements[0].startswith("CREATE TABLE IF NOT EXISTS outbox_p20260321 PARTITION OF outbox")
+        assert statements[1].startswith("CREATE TABLE IF NOT EXISTS outbox_p20260322")
+
+    @pytest.mark.asyncio
+    async def test_skips_run_when_another_process_holds_the_lock(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=False))
+        engine = MagicMock()
+        engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+        engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+        retention = OutboxRetention(engine)
+
+        with patch.object(retention, "_premake", AsyncMock()) as premake:
+            assert await retention.run_once(NOW) == []
+        premake.assert_not_awaited()
+
+
+    @pytest.mark.asyncio
+    async def test_premake_still_runs_with_expiry_disabled(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=True))
+        engine = MagicMock()
+        engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+        engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+        retention = OutboxRetention(engine)
+
+        with (
+            patch.object(retention, "_premake", AsyncMock()) as premake,
+            patch.object(retention, "_check_default", AsyncMock()) as check_default,
+            patch.object(retention, "_expire", AsyncMock()) as expire,
+        ):
+            assert await retention.run_once(NOW, expire=False) == []
+
+        premake.assert_awaited_once()
+        check_default.assert_awaited_once()
+        expire.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_rows_in_the_default_partition_are_reported(self, caplog):
+        retention = OutboxRetention(MagicMock())
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=3))
+        partitions = [
+            Partition("outbox_p20260320", datetime(2026, 3, 21, tzinfo=timezone.utc)),
+            Partition("outbox_default", None),
+        ]
+        with patch.object(retention, "_partitions", AsyncMock(return_value=partitions)):
+            assert await retention._check_default(conn) == 3
+
+        assert "FROM outbox_default" in _executed(conn)[0]
+        assert "outbox_default holds 3 event(s)" in caplog.text
+        assert outbox_default_partition_events.value() == 3
+
+
+class TestArchive:
+    @pytest.mark.asyncio
+    async def test_writes_gzipped_json_lines(self, tmp_path):
+        rows = [
+            SimpleNamespace(
+                id=uuid4(), tenant_id=uuid4(), event_type="device.created",
+                payload={"device_id": "d1"}, created_at=NOW,
+            )
+            for _ in range(3)
+        ]
+
+        async def chunks(_size):
+            yield rows[:2]
+            yield rows[2:]
+
+        conn = AsyncMock()
+        conn.stream.return_value = MagicMock(partitions=chunks)
+        retention = OutboxRetention(MagicMock(), archive_dir=str(tmp_path / "archive"))
+
+        await retention._archive(conn, "outbox_p20260310")
+
+        path = tmp_path / "archive" / "outbox_p20260310.jsonl.gz"
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            lines = [json.loads(line) for line in fh]
+        assert [line["id"] for line in lines] == [str(r.id) for r in rows]
+        assert lines[0]["created_at"] == NOW.isoformat()
+        assert not list((tmp_path / "archive").glob("*.partial"))
@@ -1,5 +1,8 @@
 """Retry and circuit breaker tests — pure logic, no I/O."""
 
+import asyncio
+from unittest.mock import patch
+
 import pytest
 
 from worker.circuit_breaker import CircuitBreaker, CircuitOpenError, State
@@ -77,6 +80,23 @@ class TestCircuitBreaker:
         # recovery_timeout=0 means it transitions immediately
         assert cb.state == State.HALF_OPEN
 
+    @pytest.mark.asyncio
+    async def test_peek_state_does_not_transition(self):
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=0, name="test")
+        transitions = []
+        cb.add_listener(lambda breaker, old, new: transitions.append((old, new)))
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await cb.call(failing)
+
+        assert cb.peek_state() == State.HALF_OPEN
+        assert transitions == [(State.CLOSED, State.OPEN)]
+        assert cb.state == State.HALF_OPEN
+        assert transitions[-1] == (State.OPEN, State.HALF_OPEN)
+
     @pytest.mark.asyncio
     async def test_half_open_success_closes(self):
         cb = CircuitBreaker(failure_threshold=1, recovery_timeout=0, name="test")
@@ -94,3 +114,104 @@ class TestCircuitBreaker:
         result = await cb.call(succeeding)
         assert result == "ok"
         assert cb.state == State.CLOSED
+
+
+async def _fail():
+    raise RuntimeError("boom")
+
+
+async def _ok():
+    return "ok"
+
+
+class TestSlidingWindowBreaker:
+    @pytest.mark.asyncio
+    async def test_opens_on_failure_rate_once_volume_is_reached(self):
+        cb = CircuitBreaker(name="test", window_seconds=60, failure_rate_threshold=0.5, minimum_calls=4)
+
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+        await cb.call(_ok)
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+        assert cb.state == State.CLOSED  # 3 calls, below minimum volume
+
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+        assert cb.state == State.OPEN  # 3/4 failed
+
+    @pytest.mark.asyncio
+    async def test_old_calls_fall_out_of_the_window(self):
+        cb = CircuitBreaker(name="test", window_seconds=10, failure_rate_threshold=0.5, minimum_calls=2)
+
+        with patch("worker.circuit_breaker.time.monotonic", return_value=100.0):
+            with pytest.raises(RuntimeError):
+                await cb.call(_fail)
+        with patch("worker.circuit_breaker.time.monotonic", return_value=200.0):
+            with pytest.raises(RuntimeError):
+                await cb.call(_fail)
+            assert cb.state == State.CLOSED
+            assert cb.failure_rate() == 1.0
+
+    @pytest.mark.asyncio
+    async def test_slow_calls_count_as_failures(self):
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=999, name="test", slow_call_threshold=0.01)
+
+        async def slow():
+            await asyncio.sleep(0.02)
+            return "late"
+
+        assert await cb.call(slow) == "late"
+        assert cb.state == State.OPEN
+
+
+class TestHalfOpenProbes:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_beyond_probe_cap_fail_fast(self):
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=0, name="test", half_open_max_calls=2)
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+
+        release = asyncio.Event()
+
+        async def probe():
+            await release.wait()
+            return "ok"
+
+        probes = [asyncio.create_task(cb.call(probe)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await cb.call(_ok)
+
+        release.set()
+        assert await asyncio.gather(*probes) == ["ok", "ok"]
+        assert cb.state == State.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_failed_probe_reopens(self):
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=0, name="test", half_open_max_calls=3)
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+
+        await cb.call(_ok)
+        assert cb.state == State.HALF_OPEN  # 1 of 3 probes succeeded
+        cb.recovery_timeout = 999
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+        assert cb.state == State.OPEN
+
+    @pytest.mark.asyncio
+    async def test_transitions_are_reported_to_listeners(self):
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=0, name="test")
+        seen = []
+        cb.add_listener(lambda breaker, old, new: seen.append((breaker.name, old, new)))
+
+        with pytest.raises(RuntimeError):
+            await cb.call(_fail)
+        await cb.call(_ok)
+
+        assert seen == [
+            ("test", State.CLOSED, State.OPEN),
+            ("test", State.OPEN, State.HALF_OPEN),
+            ("test", State.HALF_OPEN, State.CLOSED),
+        ]
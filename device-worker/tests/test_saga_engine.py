@@ -0,0 +1,232 @@
+"""Saga engine tests — resumption and recovery against a mocked connection."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from worker.saga_engine import (
+    COMPENSATED,
+    COMPENSATING,
+    COMPLETED,
+    RUNNING,
+    RetryPolicy,
+    Saga,
+    SagaInProgressError,
+    SagaRecovery,
+    SagaState,
+    Step,
+    saga_id_for,
+)
+
+
+def _mock_engine(conn):
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+def _conn(existing_row=None):
+    """A connection whose INSERT ... ON CONFLICT returns nothing if *existing_row* is given."""
+    conn = AsyncMock()
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = None if existing_row else "inserted"
+    result.one.return_value = existing_row
+    conn.execute = AsyncMock(return_value=result)
+    return conn
+
+
+class _ThreeSteps(Saga):
+    SAGA_TYPE = "test.three"
+
+    def __init__(self, engine, fail_at=None):
+        super().__init__(engine)
+        self.calls = []
+        self.fail_at = fail_at
+
+    def steps(self):
+        def action(name):
+            async def _run(state):
+                self.calls.append(name)
+                if name == self.fail_at:
+                    raise RuntimeError(f"{name} failed")
+            return _run
+
+        def undo(name):
+            async def _run(state):
+                self.calls.append(f"undo {name}")
+            return _run
+
+        return [
+            Step("reserve", action=action("reserve"), compensate=undo("reserve")),
+            Step("charge", action=action("charge"), compensate=undo("charge")),
+            Step("ship", action=action("ship")),
+        ]
+
+
+def _saved(conn):
+    return [
+        (c.args[1]["status"], c.args[1]["step"])
+        for c in conn.execute.await_args_list
+        if isinstance(c.args[1], dict) and "status" in c.args[1]
+    ]
+
+
+def _state(status, step):
+    return SagaState(uuid4(), uuid4(), _ThreeSteps.SAGA_TYPE, status, step, {})
+
+
+class TestSagaRun:
+    @pytest.mark.asyncio
+    async def test_each_completed_step_is_recorded(self):
+        conn = _conn()
+        saga = _ThreeSteps(_mock_engine(conn))
+
+        assert await saga.run(uuid4(), uuid4(), {}) == COMPLETED
+
+        assert saga.calls == ["reserve", "charge", "ship"]
+        assert _saved(conn) == [(RUNNING, "charge"), (RUNNING, "ship"), (COMPLETED, "done")]
+
+    @pytest.mark.asyncio
+    async def test_failure_compensates_completed_steps_in_reverse(self):
+        conn = _conn()
+        saga = _ThreeSteps(_mock_engine(conn), fail_at="ship")
+
+        assert await saga.run(uuid4(), uuid4(), {}) == COMPENSATED
+
+        assert saga.calls == ["reserve", "charge", "ship", "undo charge", "undo reserve"]
+        assert _saved(conn)[-3:] == [(COMPENSATING, "charge"), (COMPENSATING, "reserve"), (COMPENSATED, "done")]
+
+    @pytest.mark.asyncio
+    async def test_resume_skips_completed_steps(self):
+        saga = _ThreeSteps(_mock_engine(_conn()))
+
+        await saga.resume(_state(RUNNING, "ship"))
+
+        assert saga.calls == ["ship"]
+
+    @pytest.mark.asyncio
+    async def test_resumed_compensation_continues_where_it_stopped(self):
+        saga = _ThreeSteps(_mock_engine(_conn()))
+
+        await saga.resume(_state(COMPENSATING, "charge"))
+
+        assert saga.calls == ["undo reserve"]
+
+    @pytest.mark.asyncio
+    async def test_redelivered_event_does_not_rerun_a_finished_saga(self):
+        row = MagicMock(payload={}, status=COMPLETED, current_step="done", error=None)
+        saga = _ThreeSteps(_mock_engine(_conn(existing_row=row)))
+
+        with patch("worker.saga_engine.claim_stale", AsyncMock(return_value=[])):
+            assert await saga.run(uuid4(), uuid4(), {}) == COMPLETED
+
+        assert saga.calls == []
+
+    @pytest.mark.asyncio
+    async def test_saga_held_by_another_worker_is_retried_later(self):
+        row = MagicMock(payload={}, status=RUNNING, current_step="charge", error=None)
+        saga = _ThreeSteps(_mock_engine(_conn(existing_row=row)))
+
+        with patch("worker.saga_engine.claim_stale", AsyncMock(return_value=[])):
+            with pytest.raises(SagaInProgressError):
+                await saga.run(uuid4(), uuid4(), {})
+
+    def test_saga_id_is_stable_per_event(self):
+        event_id = uuid4()
+        assert saga_id_for("t", event_id) == saga_id_for("t", event_id)
+        assert saga_id_for("t", event_id) != saga_id_for("other", event_id)
+
+
+class _Flaky(Saga):
+    SAGA_TYPE = "test.flaky"
+
+    def __init__(self, engine, failures, retry, error=ConnectionError):
+        super().__init__(engine)
+        self.failures = failures
+        self.retry = retry
+        self.error = error
+        self.calls = []
+
+    def steps(self):
+        async def send(state):
+            self.calls.append("send")
+            if self.calls.count("send") <= self.failures:
+                raise self.error("send failed")
+
+        async def undo(state):
+            self.calls.append("undo reserve")
+
+        return [
+            Step("reserve", compensate=undo),
+            Step("send", action=send, retry=self.retry),
+        ]
+
+
+def _retry(**kwargs):
+    kwargs.setdefault("max_attempts", 3)
+    return RetryPolicy(base_delay=0.001, max_delay=0.001, **kwargs)
+
+
+class TestStepRetry:
+    @pytest.mark.asyncio
+    async def test_step_that_recovers_within_its_budget_does_not_compensate(self):
+        conn = _conn()
+        saga = _Flaky(_mock_engine(conn), failures=2, retry=_retry())
+
+        assert await saga.run(uuid4(), uuid4(), {}) == COMPLETED
+
+        assert saga.calls == ["send", "send", "send"]
+        assert COMPENSATING not in [status for status, _ in _saved(conn)]
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_triggers_compensation(self):
+        saga = _Flaky(_mock_engine(_conn()), failures=5, retry=_retry())
+
+        assert await saga.run(uuid4(), uuid4(), {}) == COMPENSATED
+
+        assert saga.calls == ["send", "send", "send", "undo reserve"]
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_compensates_at_once(self):
+        retry = _retry(retryable=lambda exc: isinstance(exc, ConnectionError))
+        saga = _Flaky(_mock_engine(_conn()), failures=1, retry=retry, error=ValueError)
+
+        assert await saga.run(uuid4(), uuid4(), {}) == COMPENSATED
+
+        assert saga.calls == ["send", "undo reserve"]
+
+    @pytest.mark.asyncio
+    async def test_no_retry_starts_past_the_deadline(self):
+        retry = RetryPolicy(max_attempts=10, base_delay=5.0, max_delay=5.0, deadline=0.01)
+        saga = _Flaky(_mock_engine(_conn()), failures=1, retry=retry)
+
+        with patch("worker.saga_engine.random.uniform", return_value=5.0):
+            assert await saga.run(uuid4(), uuid4(), {}) == COMPENSATED
+
+        assert saga.calls == ["send", "undo reserve"]
+
+    @pytest.mark.asyncio
+    async def test_failed_attempts_record_the_error(self):
+        conn = _conn()
+        saga = _Flaky(_mock_engine(conn), failures=1, retry=_retry())
+
+        await saga.run(uuid4(), uuid4(), {})
+
+        touched = [c.args[1] for c in conn.execute.await_args_list if "SET error" in str(c.args[0])]
+        assert [params["error"] for params in touched] == ["send failed"]
+
+
+class TestSagaRecovery:
+    @pytest.mark.asyncio
+    async def test_stuck_sagas_are_resumed_by_type(self):
+        engine = _mock_engine(_conn())
+        saga = _ThreeSteps(engine)
+        stuck = [_state(RUNNING, "ship"), SagaState(uuid4(), uuid4(), "unknown", RUNNING, "x", {})]
+
+        with patch("worker.saga_engine.claim_stale", AsyncMock(return_value=stuck)):
+            resumed = await SagaRecovery(engine, [saga]).run_once()
+
+        assert resumed == 1
+        assert saga.calls == ["ship"]
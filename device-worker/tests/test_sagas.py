@@ -5,10 +5,15 @@ from datetime import datetime, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
+import httpx
 import pytest
 
-from worker.circuit_breaker import CircuitBreaker
-from worker.sagas import DeviceRetirementSaga
+from worker.circuit_breaker import CircuitBreaker, CircuitOpenError
+from worker.devices import DeviceConflictError
+from worker.email_batch import EmailDeliveryError
+from worker.email_cache import EmailLookupError, EmailResolver
+from worker.http_clients import HttpClients
+from worker.sagas import DeviceRetirementSaga, is_transient
 
 TENANT = uuid4()
 DEVICE_ID = str(uuid4())
@@ -18,10 +23,18 @@ USER_ID = str(uuid4())
 def _mock_conn():
     """Create a mock AsyncConnection that records SQL calls."""
     conn = AsyncMock()
-    conn.execute = AsyncMock()
+    conn.execute = AsyncMock(return_value=MagicMock())
     return conn
 
 
+def _mock_engine(conn):
+    """Create a mock AsyncEngine whose begin() yields *conn*."""
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
 def _mock_breakers():
     """Create test circuit breakers that pass through calls."""
     tenancy = CircuitBreaker(failure_threshold=5, recovery_timeout=30.0, name="tenancy-test")
@@ -39,22 +52,18 @@ def _mock_httpx_response(status_code=200, json_data=None):
     return resp
 
 
-def _setup_mock_client(mock_http_client_fn):
-    """Configure _http_client mock to return an async context manager with a mock client."""
+def _mock_http():
+    """Create HttpClients whose dependencies all share one mock client."""
     mock_client = AsyncMock()
-    cm = AsyncMock()
-    cm.__aenter__ = AsyncMock(return_value=mock_client)
-    cm.__aexit__ = AsyncMock(return_value=False)
-    mock_http_client_fn.return_value = cm
-    return mock_client
+    http = HttpClients(tenancy=mock_client, email=mock_client, device_service=mock_client)
+    return http, mock_client
 
 
 class TestDeviceRetirementSaga:
     @pytest.mark.asyncio
-    @patch("worker.sagas._http_client")
-    async def test_successful_saga(self, mock_http_client_fn):
+    async def test_successful_saga(self):
         conn = _mock_conn()
-        mock_client = _setup_mock_client(mock_http_client_fn)
+        http, mock_client = _mock_http()
 
         # First call: resolve email
         mock_client.get.return_value = _mock_httpx_response(
@@ -64,7 +73,7 @@ class TestDeviceRetirementSaga:
         mock_client.post.return_value = _mock_httpx_response(200)
 
         tenancy_breaker, email_breaker = _mock_breakers()
-        saga = DeviceRetirementSaga(conn, tenancy_breaker, email_breaker)
+        saga = DeviceRetirementSaga(_mock_engine(conn), http, EmailResolver(http.tenancy, tenancy_breaker), email_breaker)
         await saga.start(
             tenant_id=TENANT,
             device_id=DEVICE_ID,
@@ -83,10 +92,9 @@ class TestDeviceRetirementSaga:
         assert params["status"] == "completed"
 
     @pytest.mark.asyncio
-    @patch("worker.sagas._http_client")
-    async def test_notify_failure_triggers_compensation(self, mock_http_client_fn):
+    async def test_notify_failure_triggers_compensation(self):
         conn = _mock_conn()
-        mock_client = _setup_mock_client(mock_http_client_fn)
+        http, mock_client = _mock_http()
 
         # Email resolution fails
         mock_client.get.return_value = _mock_httpx_response(500)
@@ -95,7 +103,7 @@ class TestDeviceRetirementSaga:
         mock_client.post.return_value = _mock_httpx_response(200)
 
         tenancy_breaker, email_breaker = _mock_breakers()
-        saga = DeviceRetirementSaga(conn, tenancy_breaker, email_breaker)
+        saga = DeviceRetirementSaga(_mock_engine(conn), http, EmailResolver(http.tenancy, tenancy_breaker), email_breaker)
         await saga.start(
             tenant_id=TENANT,
             device_id=DEVICE_ID,
@@ -113,10 +121,9 @@ class TestDeviceRetirementSaga:
         assert "compensated" in statuses
 
     @pytest.mark.asyncio
-    @patch("worker.sagas._http_client")
-    async def test_compensation_failure_results_in_failed(self, mock_http_client_fn):
+    async def test_compensation_failure_results_in_failed(self):
         conn = _mock_conn()
-        mock_client = _setup_mock_client(mock_http_client_fn)
+        http, mock_client = _mock_http()
 
         # Email resolution fails
         mock_client.get.return_value = _mock_httpx_response(500)
@@ -125,7 +132,7 @@ class TestDeviceRetirementSaga:
         mock_client.post.side_effect = Exception("Network error")
 
         tenancy_breaker, email_breaker = _mock_breakers()
-        saga = DeviceRetirementSaga(conn, tenancy_breaker, email_breaker)
+        saga = DeviceRetirementSaga(_mock_engine(conn), http, EmailResolver(http.tenancy, tenancy_breaker), email_breaker)
         await saga.start(
             tenant_id=TENANT,
             device_id=DEVICE_ID,
@@ -139,3 +146,85 @@ class TestDeviceRetirementSaga:
             if isinstance(call[0][1], dict) and "status" in call[0][1]
         ]
         assert "failed" in statuses
+
+
+class TestDatabaseCompensation:
+    async def _compensate(self, activate):
+        http, mock_client = _mock_http()
+        mock_client.post.return_value = _mock_httpx_response(200)
+        tenancy_breaker, email_breaker = _mock_breakers()
+        saga = DeviceRetirementSaga(
+            _mock_engine(_mock_conn()), http, EmailResolver(http.tenancy, tenancy_breaker), email_breaker,
+            db_compensation=True,
+        )
+        with patch("worker.sagas.activate_device", activate):
+            await saga._step_compensate(TENANT, DEVICE_ID, "End of life", user_id=USER_ID, expected_version=2)
+        return mock_client
+
+    @pytest.mark.asyncio
+    async def test_device_is_reactivated_without_calling_device_service(self):
+        activate = AsyncMock()
+
+        mock_client = await self._compensate(activate)
+
+        mock_client.post.assert_not_called()
+        args = activate.await_args.args
+        assert (args[1], str(args[2]), args[4], args[5]) == (TENANT, DEVICE_ID, USER_ID, 2)
+
+    @pytest.mark.asyncio
+    async def test_database_failure_falls_back_to_http(self):
+        mock_client = await self._compensate(AsyncMock(side_effect=OSError("permission denied")))
+
+        mock_client.post.assert_awaited_once()
+        kwargs = mock_client.post.await_args.kwargs
+        assert kwargs["json"]["expected_version"] == 2
+        assert kwargs["headers"]["x-user-id"] == USER_ID
+        assert kwargs["headers"]["x-origin"] == "system"
+
+    @pytest.mark.asyncio
+    async def test_refused_reactivation_is_not_retried_over_http(self):
+        with pytest.raises(DeviceConflictError):
+            await self._compensate(AsyncMock(side_effect=DeviceConflictError("changed")))
+
+
+class TestSystemOriginatedEvents:
+    @pytest.mark.asyncio
+    async def test_compensating_activation_is_not_notified(self):
+        from worker.main import handle_event
+
+        http, mock_client = _mock_http()
+        tenancy_breaker, _ = _mock_breakers()
+        payload = {"device_id": DEVICE_ID, "user_id": USER_ID, "origin": "system", "causation_id": str(uuid4())}
+
+        await handle_event(
+            _mock_engine(_mock_conn()), http, EmailResolver(http.tenancy, tenancy_breaker),
+            "device.activated", payload, TENANT,
+        )
+
+        mock_client.get.assert_not_called()
+        mock_client.post.assert_not_called()
+
+
+def _status_error(status_code):
+    request = httpx.Request("POST", "http://resend.test/emails")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+class TestNotifyRetryability:
+    @pytest.mark.parametrize("exc", [
+        httpx.ConnectError("refused"),
+        CircuitOpenError("open"),
+        EmailLookupError("Tenancy returned 503"),
+        _status_error(503),
+        _status_error(429),
+    ])
+    def test_transient_errors_are_retried(self, exc):
+        assert is_transient(exc)
+
+    @pytest.mark.parametrize("exc", [
+        _status_error(422),
+        EmailDeliveryError("bad@example.com: Invalid `to` field"),
+        RuntimeError("No email found for user"),
+    ])
+    def test_permanent_errors_are_not(self, exc):
+        assert not is_transient(exc)
@@ -0,0 +1,118 @@
+"""Tenant-hash sharding tests — partition assignment and membership, no I/O."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from worker import outbox
+from worker.sharding import OUTBOX_PARTITIONS, ShardMembership, assign_partitions
+
+
+def _mock_engine(conn):
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+class TestAssignPartitions:
+    def test_members_cover_every_partition_exactly_once(self):
+        members = ["w-c", "w-a", "w-b"]
+        owned = [p for m in members for p in assign_partitions(members, m)]
+        assert sorted(owned) == list(range(OUTBOX_PARTITIONS))
+
+    def test_ranges_are_contiguous_and_balanced(self):
+        members = ["w-a", "w-b", "w-c"]
+        sizes = []
+        for m in members:
+            parts = assign_partitions(members, m)
+            assert parts == list(range(parts[0], parts[-1] + 1))
+            sizes.append(len(parts))
+        assert max(sizes) - min(sizes) <= 1
+
+    def test_worker_missing_from_members_still_gets_a_share(self):
+        # A worker whose first heartbeat is not yet visible counts itself.
+        assert assign_partitions([], "w-a") == list(range(OUTBOX_PARTITIONS))
+        assert len(assign_partitions(["w-b"], "w-a")) == OUTBOX_PARTITIONS // 2
+
+    def test_more_workers_than_partitions_leaves_some_idle(self):
+        members = [f"w-{i:03d}" for i in range(8)]
+        assert sum(len(assign_partitions(members, m, partitions=4)) for m in members) == 4
+        assert assign_partitions(members, "w-000", partitions=4) == []
+
+
+class TestShardMembership:
+    @pytest.mark.asyncio
+    async def test_refresh_heartbeats_and_rebalances(self):
+        conn = AsyncMock()
+        members = MagicMock()
+        members.fetchall.return_value = [SimpleNamespace(worker_id="w-a"), SimpleNamespace(worker_id="w-b")]
+        conn.execute.side_effect = [MagicMock(), MagicMock(), members]
+        membership = ShardMembership(_mock_engine(conn), "notification", "w-b")
+
+        assert membership.due()
+        partitions = await membership.refresh()
+
+        assert partitions == list(range(OUTBOX_PARTITIONS // 2, OUTBOX_PARTITIONS))
+        assert membership.partitions == partitions
+        assert not membership.due()
+        heartbeat_params = conn.execute.await_args_list[0].args[1]
+        assert heartbeat_params == {"consumer": "notification", "worker_id": "w-b"}
+
+
+    @pytest.mark.asyncio
+    async def test_heartbeats_continue_while_a_batch_runs(self):
+        membership = ShardMembership(MagicMock(), "notification", "w-a", heartbeat_interval=0.01)
+        membership.refresh = AsyncMock(return_value=[])
+
+        membership.start()
+        await asyncio.sleep(0.05)  # a long batch, no consumer involvement
+        await membership.stop()
+
+        assert membership.refresh.await_count >= 3
+        assert not membership.running
+
+    def test_lapsed_membership_is_not_alive(self):
+        membership = ShardMembership(MagicMock(), "notification", "w-a", member_ttl=30.0)
+        assert not membership.alive()
+
+        membership._last_heartbeat = time.monotonic()
+        assert membership.alive()
+
+        membership._last_heartbeat = time.monotonic() - 31.0
+        assert not membership.alive()
+
+
+class TestShardingSettings:
+    def test_member_ttl_must_exceed_the_lease(self, monkeypatch):
+        from worker.main import _build_consumers
+        from worker.settings import settings
+
+        monkeypatch.setattr(settings, "outbox_sharding_enabled", True)
+        monkeypatch.setattr(settings, "outbox_lease_seconds", 120.0)
+        monkeypatch.setattr(settings, "shard_member_ttl_seconds", 20.0)
+
+        with pytest.raises(ValueError, match="SHARD_MEMBER_TTL_SECONDS"):
+            _build_consumers(MagicMock(), MagicMock(), MagicMock())
+
+
+class TestClaimBatchPartitions:
+    @pytest.mark.asyncio
+    async def test_no_assigned_partitions_claims_nothing(self):
+        conn = AsyncMock()
+        rows = await outbox.claim_batch(conn, "projection", "w-a", limit=10, lease_seconds=60, partitions=[])
+        assert rows == []
+        conn.execute.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_partitions_filter_the_claim(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(fetchall=MagicMock(return_value=[]))
+        await outbox.claim_batch(conn, "projection", "w-a", limit=10, lease_seconds=60, partitions=[3, 4])
+
+        sql, params = conn.execute.await_args.args
+        assert "partition = ANY" in str(sql)
+        assert params["partitions"] == [3, 4]
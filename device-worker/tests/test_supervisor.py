@@ -0,0 +1,93 @@
+"""Supervisor tests — restart policy and metric merging, no real child processes."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from worker import main as worker_main
+from worker.metrics import REGISTRY
+from worker.supervisor import Supervisor, _Slot
+
+
+def _dead_process(exitcode: int = 1) -> MagicMock:
+    process = MagicMock()
+    process.is_alive.return_value = False
+    process.exitcode = exitcode
+    return process
+
+
+class TestRestartPolicy:
+    def test_crashed_child_restarts_with_growing_backoff(self):
+        supervisor = Supervisor(1, restart_max_delay=30.0)
+        slot = supervisor._slots[0]
+        with patch("worker.supervisor.time.monotonic", return_value=100.0):
+            slot.process, slot.started_at = _dead_process(), 99.0
+            supervisor._reap_and_restart()
+        assert slot.process is None
+        assert (slot.restarts, slot.restart_at) == (1, 101.0)
+
+        with patch("worker.supervisor.time.monotonic", return_value=110.0):
+            slot.process, slot.started_at = _dead_process(), 109.0
+            supervisor._reap_and_restart()
+        assert (slot.restarts, slot.restart_at) == (2, 113.0)
+
+    def test_restart_happens_once_backoff_elapses(self):
+        supervisor = Supervisor(1)
+        slot = supervisor._slots[0]
+        slot.restart_at = 50.0
+        with patch.object(supervisor, "_start") as start:
+            with patch("worker.supervisor.time.monotonic", return_value=49.0):
+                supervisor._reap_and_restart()
+            start.assert_not_called()
+            with patch("worker.supervisor.time.monotonic", return_value=50.0):
+                supervisor._reap_and_restart()
+            start.assert_called_once_with(slot)
+
+    def test_long_lived_child_resets_backoff(self):
+        supervisor = Supervisor(1)
+        slot = supervisor._slots[0]
+        slot.restarts = 4
+        with patch("worker.supervisor.time.monotonic", return_value=1000.0):
+            slot.process, slot.started_at = _dead_process(), 100.0
+            supervisor._reap_and_restart()
+        assert (slot.restarts, slot.restart_at) == (0, 1000.0)
+
+
+class TestCombinedMetrics:
+    def test_counters_sum_and_gauges_follow_their_mode(self):
+        supervisor = Supervisor(2)
+        supervisor._slots = [
+            _Slot(index=0, samples=[
+                ("email_cache_lookups_total", {"result": "hit"}, 3.0),
+                ("outbox_backlog_events", {"consumer": "notification"}, 40.0),
+                ("outbox_batch_size", {"consumer": "notification"}, 20.0),
+            ]),
+            _Slot(index=1, samples=[
+                ("email_cache_lookups_total", {"result": "hit"}, 4.0),
+                ("outbox_backlog_events", {"consumer": "notification"}, 38.0),
+                ("outbox_batch_size", {"consumer": "notification"}, 80.0),
+            ]),
+        ]
+
+        combined = supervisor.metrics()
+
+        assert combined['email_cache_lookups_total{result="hit"}'] == 7.0
+        assert combined['outbox_backlog_events{consumer="notification"}'] == 40.0
+        assert combined['outbox_batch_size{consumer="notification",process="0"}'] == 20.0
+        assert combined['outbox_batch_size{consumer="notification",process="1"}'] == 80.0
+
+
+class TestMain:
+    def test_single_process_runs_in_place(self):
+        with patch.object(worker_main, "run_worker") as run_worker, patch.object(worker_main, "Supervisor") as sup:
+            worker_main.main(["--processes", "1"])
+        run_worker.assert_called_once_with()
+        sup.assert_not_called()
+
+    @pytest.mark.parametrize("processes", [2, 8])
+    def test_multiple_processes_use_the_supervisor(self, processes):
+        with patch.object(worker_main, "run_worker") as run_worker, patch.object(worker_main, "Supervisor") as sup:
+            worker_main.main(["--processes", str(processes)])
+        run_worker.assert_not_called()
+        assert sup.call_args.args == (processes,)
+        sup.return_value.run.assert_called_once_with()
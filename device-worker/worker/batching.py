@@ -0,0 +1,89 @@
+"""Adaptive batch sizing for outbox claims.
+
+Multiplicative increase while batches come back full and healthy,
+multiplicative decrease as soon as event latency or the error rate rises —
+the same shape as TCP congestion control, which keeps a struggling
+dependency from being flooded during a backlog drain.
+"""
+
+import time
+from collections import deque
+from collections.abc import Sequence
+
+from worker.dispatcher import EventResult, Outcome
+
+
+class AdaptiveBatchSizer:
+    """Tracks the claim batch size between *min_size* and *max_size*.
+
+    Args:
+        min_size: floor (and starting size).
+        max_size: ceiling.
+        latency_threshold: mean per-event seconds above which the batch shrinks.
+        error_rate_threshold: fraction of failed events above which the
+            batch shrinks.
+
+    Skipped events (held back behind a failed event for the same device, or
+    stopped by an open circuit) say nothing about how the batch went, so
+    they count towards neither the error rate nor the mean latency.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 10,
+        max_size: int = 500,
+        latency_threshold: float = 2.0,
+        error_rate_threshold: float = 0.2,
+    ) -> None:
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.latency_threshold = latency_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.size = min_size
+
+    def observe(self, requested: int, results: Sequence[EventResult], claimed: int | None = None) -> int:
+        """Adjust the size after a batch of *requested* rows; returns the new size.
+
+        *claimed* is the number of rows the batch came back with, when
+        coalescing dispatched fewer *results* than that.
+        """
+        if not results:
+            return self.size
+
+        judged = [r for r in results if r.outcome != Outcome.SKIPPED]
+        if not judged:
+            return self.size
+        failed = sum(1 for r in judged if r.outcome != Outcome.PROCESSED)
+        error_rate = failed / len(judged)
+        mean_latency = sum(r.duration for r in judged) / len(judged)
+
+        if mean_latency > self.latency_threshold or error_rate > self.error_rate_threshold:
+            self.size = max(self.min_size, self.size // 2)
+        elif (len(results) if claimed is None else claimed) >= requested:
+            self.size = min(self.max_size, self.size * 2)
+        return self.size
+
+
+class DrainRateMeter:
+    """Completed events per second over a sliding *window* (seconds)."""
+
+    def __init__(self, window: float = 60.0) -> None:
+        self.window = window
+        self._samples: deque[tuple[float, int]] = deque()
+        self._started = time.monotonic()
+
+    def record(self, count: int, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        if count:
+            self._samples.append((now, count))
+        self._trim(now)
+
+    def rate(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._trim(now)
+        span = min(self.window, max(now - self._started, 1e-9))
+        return sum(n for _, n in self._samples) / span
+
+    def _trim(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
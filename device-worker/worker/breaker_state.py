@@ -0,0 +1,145 @@
+"""Circuit breaker state shared by all worker replicas, kept in Postgres.
+
+Without it every replica learns that a dependency is down on its own, so N
+replicas spend N times the failures tripping, then probe N times during
+recovery. With a ``PostgresBreakerState`` attached, a ``CircuitBreaker``:
+
+- publishes its own OPEN and CLOSED transitions to ``circuit_breakers``,
+  bumping the row's ``generation``;
+- every ``sync_interval`` seconds reads the row back and adopts any newer
+  generation, so one replica tripping opens the breaker for the others;
+- probes in HALF_OPEN only while holding the row's probe lease, which a
+  single replica at a time can take.
+
+If the table cannot be reached the breaker keeps working on local state.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SharedState:
+    state: str  # "open" or "closed"
+    generation: int
+    open_for: float  # seconds since opened_at, 0 when closed
+
+
+class PostgresBreakerState:
+    """One breaker's row in ``circuit_breakers``.
+
+    Args:
+        engine: database engine.
+        name: breaker name (the row key).
+        owner: this replica's id, recorded with the probe lease.
+        sync_interval: minimum seconds between reads of the shared row.
+        probe_lease: seconds a probe lease is held before others may take it.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        name: str,
+        owner: str,
+        sync_interval: float = 1.0,
+        probe_lease: float = 30.0,
+    ) -> None:
+        self.engine = engine
+        self.name = name
+        self.owner = owner
+        self.sync_interval = sync_interval
+        self.probe_lease = probe_lease
+
+        self._lease_until = 0.0
+        self._denied_until = 0.0
+
+    async def load(self) -> SharedState | None:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    """
+                    SELECT state, generation,
+                           COALESCE(EXTRACT(EPOCH FROM now() - opened_at), 0) AS open_for
+                    FROM circuit_breakers
+                    WHERE name = :name
+                    """
+                ),
+                {"name": self.name},
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+        return SharedState(row.state, int(row.generation), float(row.open_for))
+
+    async def publish(self, state: str) -> int | None:
+        """Record a transition to *state*; returns the new generation.
+
+        Re-opening after a failed probe restarts the shared recovery timer.
+        Returns None when nothing changed (another replica got there first).
+        """
+        self._lease_until = self._denied_until = 0.0
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    """
+                    INSERT INTO circuit_breakers (name, state, generation, opened_at, updated_at)
+                    VALUES (:name, :state, 1, CASE WHEN :state = 'open' THEN now() END, now())
+                    ON CONFLICT (name) DO UPDATE
+                    SET state = EXCLUDED.state,
+                        generation = circuit_breakers.generation + 1,
+                        opened_at = COALESCE(EXCLUDED.opened_at, circuit_breakers.opened_at),
+                        probe_owner = NULL,
+                        probe_until = NULL,
+                        updated_at = now()
+                    WHERE circuit_breakers.state <> EXCLUDED.state
+                       OR circuit_breakers.probe_owner = :owner
+                    RETURNING generation
+                    """
+                ),
+                {"name": self.name, "state": state, "owner": self.owner},
+            )
+            generation = result.scalar_one_or_none()
+        return int(generation) if generation is not None else None
+
+    async def acquire_probe(self, recovery_timeout: float) -> bool:
+        """Take (or keep) the probe lease; False while another replica holds it."""
+        now = time.monotonic()
+        if now < self._lease_until:
+            return True
+        if now < self._denied_until:
+            return False
+        async with self.engine.begin() as conn:
+            # Without an open shared row (never published, or already closed)
+            # the local state decides.
+            result = await conn.execute(
+                text(
+                    """
+                    WITH lease AS (
+                        UPDATE circuit_breakers
+                        SET probe_owner = :owner,
+                            probe_until = now() + make_interval(secs => :lease),
+                            updated_at = now()
+                        WHERE name = :name
+                          AND state = 'open'
+                          AND opened_at <= now() - make_interval(secs => :recovery)
+                          AND (probe_owner IS NULL OR probe_owner = :owner OR probe_until < now())
+                        RETURNING name
+                    )
+                    SELECT EXISTS (SELECT 1 FROM lease)
+                        OR NOT EXISTS (SELECT 1 FROM circuit_breakers WHERE name = :name AND state = 'open')
+                    """
+                ),
+                {"name": self.name, "owner": self.owner, "lease": self.probe_lease, "recovery": recovery_timeout},
+            )
+            acquired = bool(result.scalar_one())
+        if acquired:
+            self._lease_until = now + self.probe_lease
+        else:
+            self._denied_until = now + self.sync_interval
+        return acquired
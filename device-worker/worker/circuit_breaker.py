@@ -1,7 +1,39 @@
-"""Simple in-process circuit breaker — no external dependencies."""
+"""Simple in-process circuit breaker — no external dependencies.
 
+Two ways to trip:
+
+- consecutive (default): ``failure_threshold`` failures in a row open the
+  circuit, any success resets the count;
+- sliding window (``window_seconds`` set): the circuit opens once at least
+  ``minimum_calls`` calls were made in the last ``window_seconds`` and
+  ``failure_rate_threshold`` of them failed. Single successes no longer mask
+  a mostly failing dependency.
+
+In both modes a call slower than ``slow_call_threshold`` counts as a failure
+(its result is still returned), and HALF_OPEN lets at most
+``half_open_max_calls`` probes through at once; callers beyond that fail fast
+instead of stampeding a recovering dependency. The circuit closes once that
+many probes succeeded and reopens on the first failed one.
+
+Every state change is logged and passed to the listeners registered with
+``add_listener``.
+
+Replicas can share one breaker through ``shared_state`` (see
+``worker.breaker_state``): a trip anywhere opens it everywhere, and only the
+replica holding the probe lease probes during recovery.
+"""
+
+import logging
 import time
+from collections import deque
+from collections.abc import Callable
 from enum import Enum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from worker.breaker_state import PostgresBreakerState
+
+logger = logging.getLogger(__name__)
 
 
 class State(str, Enum):
@@ -10,13 +42,23 @@ class State(str, Enum):
     HALF_OPEN = "half_open"
 
 
+TransitionListener = Callable[["CircuitBreaker", State, State], None]
+
+
 class CircuitBreaker:
     """Wraps async callables with fail-fast behaviour.
 
     Args:
-        failure_threshold: consecutive failures before opening.
+        failure_threshold: consecutive failures before opening (consecutive mode).
         recovery_timeout: seconds to wait before trying half-open.
         name: label for logging.
+        window_seconds: enables sliding-window mode over this many seconds.
+        failure_rate_threshold: failed share of windowed calls that opens the circuit.
+        minimum_calls: calls needed in the window before the rate is judged.
+        half_open_max_calls: concurrent probes allowed while half-open, and
+            successes needed to close.
+        slow_call_threshold: seconds after which a call counts as failed.
+        shared_state: optional backend shared with other replicas.
     """
 
     def __init__(
@@ -24,27 +66,80 @@ class CircuitBreaker:
         failure_threshold: int = 5,
         recovery_timeout: float = 30.0,
         name: str = "circuit",
+        window_seconds: float | None = None,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        half_open_max_calls: int = 1,
+        slow_call_threshold: float | None = None,
+        shared_state: "PostgresBreakerState | None" = None,
     ) -> None:
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
         self.name = name
+        self.window_seconds = window_seconds
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_threshold = slow_call_threshold
+        self.shared_state = shared_state
 
         self._state = State.CLOSED
         self._failure_count = 0
         self._last_failure_time: float = 0.0
+        # Sliding window: one [second, calls, failures] bucket per second.
+        self._window: deque[list[int]] = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._listeners: list[TransitionListener] = []
+        self._shared_generation = 0
+        self._next_sync = 0.0
 
     @property
     def state(self) -> State:
         if self._state == State.OPEN:
             if time.monotonic() - self._last_failure_time >= self.recovery_timeout:
-                self._state = State.HALF_OPEN
+                self._transition(State.HALF_OPEN)
+        return self._state
+
+    def peek_state(self) -> State:
+        """``state`` without side effects, for readers off the event loop.
+
+        Reports HALF_OPEN once the recovery timeout has passed but leaves the
+        transition (and its listeners) to the next caller of ``state``.
+        """
+        if self._state == State.OPEN and time.monotonic() - self._last_failure_time >= self.recovery_timeout:
+            return State.HALF_OPEN
         return self._state
 
+    def add_listener(self, listener: TransitionListener) -> None:
+        """Call ``listener(breaker, old_state, new_state)`` on every transition."""
+        self._listeners.append(listener)
+
+    def failure_rate(self) -> float:
+        """Failed share of the calls in the current window (sliding-window mode)."""
+        calls, failures = self._window_totals(time.monotonic())
+        return failures / calls if calls else 0.0
+
+    def raise_if_open(self) -> None:
+        """Raise ``CircuitOpenError`` if a call made now would be refused.
+
+        Lets callers fail fast before queueing for a rate limit; ``call``
+        still makes the final decision.
+        """
+        current = self.state
+        if current == State.OPEN:
+            raise CircuitOpenError(f"Circuit '{self.name}' is open — failing fast")
+        if current == State.HALF_OPEN and self._probes_in_flight >= self.half_open_max_calls:
+            raise CircuitOpenError(f"Circuit '{self.name}' is half-open and probing — failing fast")
+
     async def call(self, func, *args, **kwargs):
         """Execute *func* through the breaker.
 
-        Raises ``CircuitOpenError`` when the circuit is open.
+        Raises ``CircuitOpenError`` when the circuit is open, or half-open
+        with all probe slots taken.
         """
+        if self.shared_state is not None:
+            await self._sync_shared()
         current = self.state
 
         if current == State.OPEN:
@@ -52,26 +147,149 @@ class CircuitBreaker:
                 f"Circuit '{self.name}' is open — failing fast"
             )
 
+        probe = current == State.HALF_OPEN
+        if probe:
+            if self._probes_in_flight >= self.half_open_max_calls:
+                raise CircuitOpenError(
+                    f"Circuit '{self.name}' is half-open and probing — failing fast"
+                )
+            self._probes_in_flight += 1
+            try:
+                allowed = await self._shared_probe_allowed()
+            except BaseException:  # cancelled while asking; give the slot back
+                self._probes_in_flight -= 1
+                raise
+            if not allowed:
+                self._probes_in_flight -= 1
+                raise CircuitOpenError(
+                    f"Circuit '{self.name}' is half-open and another replica is probing — failing fast"
+                )
+
+        before = self._state
+        started = time.monotonic()
         try:
             result = await func(*args, **kwargs)
         except Exception:
             self._record_failure()
+            if self.shared_state is not None and self._state != before:
+                await self._publish_shared()
             raise
+        finally:
+            if probe:
+                self._probes_in_flight -= 1
 
-        self._record_success()
+        elapsed = time.monotonic() - started
+        if self.slow_call_threshold is not None and elapsed > self.slow_call_threshold:
+            logger.warning("Circuit '%s' call took %.1fs, counting it as failed", self.name, elapsed)
+            self._record_failure()
+        else:
+            self._record_success(probe)
+        if self.shared_state is not None and self._state != before:
+            await self._publish_shared()
         return result
 
     # -- internals --------------------------------------------------
 
+    async def _sync_shared(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.shared_state.sync_interval
+        try:
+            shared = await self.shared_state.load()
+        except Exception as exc:
+            logger.warning("Circuit '%s' shared state unavailable, using local state: %s", self.name, exc)
+            return
+        if shared is None or shared.generation <= self._shared_generation:
+            return
+        self._shared_generation = shared.generation
+        if shared.state == State.OPEN.value:
+            self._last_failure_time = time.monotonic() - shared.open_for
+            self._transition(State.OPEN)
+        elif self._state != State.CLOSED:
+            self._transition(State.CLOSED)
+
+    async def _shared_probe_allowed(self) -> bool:
+        if self.shared_state is None:
+            return True
+        try:
+            return await self.shared_state.acquire_probe(self.recovery_timeout)
+        except Exception as exc:
+            logger.warning("Circuit '%s' probe lease unavailable, probing locally: %s", self.name, exc)
+            return True
+
+    async def _publish_shared(self) -> None:
+        state = State.OPEN if self._state == State.OPEN else State.CLOSED
+        try:
+            generation = await self.shared_state.publish(state.value)
+        except Exception as exc:
+            logger.warning("Circuit '%s' could not publish %s: %s", self.name, state.value, exc)
+            return
+        if generation is not None:
+            self._shared_generation = generation
+
     def _record_failure(self) -> None:
+        now = time.monotonic()
         self._failure_count += 1
-        self._last_failure_time = time.monotonic()
-        if self._failure_count >= self.failure_threshold:
-            self._state = State.OPEN
+        self._last_failure_time = now
+        if self._state == State.HALF_OPEN:
+            self._transition(State.OPEN)
+            return
+        if self._state != State.CLOSED:
+            return
+        if self.window_seconds is None:
+            if self._failure_count >= self.failure_threshold:
+                self._transition(State.OPEN)
+            return
+        self._count(now, failed=True)
+        calls, failures = self._window_totals(now)
+        if calls >= self.minimum_calls and failures / calls >= self.failure_rate_threshold:
+            self._transition(State.OPEN)
 
-    def _record_success(self) -> None:
+    def _record_success(self, probe: bool = False) -> None:
+        if self._state == State.HALF_OPEN:
+            if probe:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_max_calls:
+                    self._transition(State.CLOSED)
+            return
+        if probe:
+            return  # the circuit already moved on while this probe ran
         self._failure_count = 0
-        self._state = State.CLOSED
+        if self.window_seconds is not None:
+            self._count(time.monotonic(), failed=False)
+
+    def _count(self, now: float, failed: bool) -> None:
+        second = int(now)
+        if self._window and self._window[-1][0] == second:
+            bucket = self._window[-1]
+        else:
+            bucket = [second, 0, 0]
+            self._window.append(bucket)
+        bucket[1] += 1
+        bucket[2] += int(failed)
+
+    def _window_totals(self, now: float) -> tuple[int, int]:
+        horizon = now - (self.window_seconds or 0.0)
+        while self._window and self._window[0][0] + 1 <= horizon:
+            self._window.popleft()
+        return sum(b[1] for b in self._window), sum(b[2] for b in self._window)
+
+    def _transition(self, new: State) -> None:
+        old = self._state
+        if old == new:
+            return
+        self._state = new
+        self._probe_successes = 0
+        if new == State.CLOSED:
+            self._failure_count = 0
+            self._window.clear()
+        logger.warning("Circuit '%s' %s -> %s", self.name, old.value, new.value)
+        for listener in self._listeners:
+            try:
+                listener(self, old, new)
+            except Exception:
+                logger.exception("Circuit '%s' transition listener failed", self.name)
 
 
 class CircuitOpenError(Exception):
@@ -0,0 +1,294 @@
+"""Named outbox consumers.
+
+Each consumer owns its delivery rows in ``outbox_deliveries`` and runs its own
+claim → dispatch → record loop with its own concurrency and adaptive batch
+size. Projection (fast, DB-only) and notification (slow, external) therefore
+advance independently: an outage at Resend or tenancy-service delays emails
+but not the read model.
+"""
+
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from worker import metrics, outbox
+from worker.batching import AdaptiveBatchSizer, DrainRateMeter
+from worker.dispatcher import Dispatcher, EventResult, Outcome
+from worker.listener import OutboxListener
+from worker.notifications import CoalescedBatch
+from worker.outbox import OutboxRow
+from worker.settings import settings
+from worker.sharding import ShardMembership
+
+logger = logging.getLogger(__name__)
+
+PROJECTION = "projection"
+NOTIFICATION = "notification"
+
+EventHandler = Callable[[OutboxRow], Awaitable[None]]
+BatchHandler = Callable[[Sequence[OutboxRow]], Awaitable[Mapping[UUID, Exception]]]
+Coalescer = Callable[[Sequence[OutboxRow]], CoalescedBatch]
+
+
+class OutboxConsumer:
+    """Claims and processes one consumer's deliveries.
+
+    Args:
+        name: consumer name, as registered in ``outbox_consumers``.
+        engine: shared database engine.
+        listener: shared wake-up source; this consumer waits under its own name.
+        handler: per-event side effects, dispatched concurrently with
+            per-device ordering.
+        batch_handler: optional coroutine run once per claimed batch before
+            dispatch; returns the events it failed, which are then retried
+            like any other failure.
+        coalescer: optional stage between claiming and dispatch that merges
+            events (see ``worker.notifications.coalesce``); absorbed events
+            are recorded with their lead's outcome.
+        concurrency: events in flight at once.
+        batch_min: smallest (and starting) claim batch.
+        batch_max: largest claim batch; further capped so a batch of
+            slow-but-acceptable events finishes within its lease.
+        call_rate: events per second the handler's rate-limited dependency
+            lets through, if any; also caps the batch so its rate-limit
+            queue drains within the lease.
+        membership: when set, only the tenant-hash partitions assigned to
+            this worker are claimed (sharding mode).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        engine: AsyncEngine,
+        listener: OutboxListener,
+        handler: EventHandler | None = None,
+        batch_handler: BatchHandler | None = None,
+        coalescer: Coalescer | None = None,
+        concurrency: int = 10,
+        batch_min: int = 10,
+        batch_max: int = 500,
+        call_rate: float | None = None,
+        membership: ShardMembership | None = None,
+    ) -> None:
+        self.name = name
+        self.engine = engine
+        self.listener = listener
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.coalescer = coalescer
+        self.membership = membership
+        self.dispatcher = Dispatcher(
+            self._handle,
+            concurrency=concurrency,
+            max_attempts=settings.retry_max_attempts,
+            backoff=backoff_delay,
+            circuit_open_delay=settings.cb_recovery_timeout,
+            in_progress_delay=settings.saga_stale_after_seconds,
+            on_result=self._record_result,
+        )
+        lease_bound = int(
+            settings.outbox_lease_seconds / settings.batch_latency_threshold_seconds * concurrency
+        )
+        if call_rate:
+            lease_bound = min(lease_bound, int(settings.outbox_lease_seconds * call_rate))
+        self.sizer = AdaptiveBatchSizer(
+            min_size=batch_min,
+            max_size=min(batch_max, lease_bound),
+            latency_threshold=settings.batch_latency_threshold_seconds,
+            error_rate_threshold=settings.batch_error_rate_threshold,
+        )
+        self.drain = DrainRateMeter()
+        self._batch_errors: Mapping[UUID, Exception] = {}
+        self._absorbed: Mapping[UUID, Sequence[OutboxRow]] = {}
+        self._last_backlog_sample = 0.0
+
+    async def run_once(self) -> tuple[int, int, int]:
+        """Claim and process one batch.
+
+        Returns ``(batch_size, claimed, processed)``.
+        """
+        partitions = None
+        if self.membership is not None:
+            # ``run`` heartbeats in the background; refresh inline otherwise.
+            if not self.membership.running and self.membership.due():
+                try:
+                    await self.membership.refresh()
+                except Exception as exc:
+                    logger.warning("[%s] Shard heartbeat failed, keeping current partitions: %s", self.name, exc)
+            if self.membership.alive():
+                partitions = self.membership.partitions
+            else:
+                logger.warning("[%s] Shard membership lapsed, claiming nothing until a heartbeat succeeds", self.name)
+                partitions = []
+
+        batch_size = self.sizer.size
+        metrics.outbox_batch_size.set(batch_size, consumer=self.name)
+        async with self.engine.begin() as conn:
+            events = await outbox.claim_batch(
+                conn, self.name, settings.worker_id,
+                limit=batch_size, lease_seconds=settings.outbox_lease_seconds,
+                partitions=partitions,
+            )
+
+        self._batch_errors = {}
+        self._absorbed = {}
+        dispatched: Sequence[OutboxRow] = events
+        if events:
+            logger.info("[%s] Claimed %d event(s) from outbox", self.name, len(events))
+            if self.batch_handler is not None:
+                self._batch_errors = await self.batch_handler(events)
+            if self.coalescer is not None:
+                coalesced = self.coalescer(events)
+                dispatched, self._absorbed = coalesced.rows, coalesced.absorbed
+                if coalesced.calls_saved:
+                    logger.info(
+                        "[%s] Coalesced %d event(s) into %d, saving %d call(s)",
+                        self.name, len(events), len(dispatched), coalesced.calls_saved,
+                    )
+
+        results = await self.dispatcher.run(dispatched)
+        processed = sum(
+            1 + len(self._absorbed.get(r.row.id, ())) for r in results if r.outcome == Outcome.PROCESSED
+        )
+        self.drain.record(processed)
+        self.sizer.observe(batch_size, results, claimed=len(events))
+
+        if time.monotonic() - self._last_backlog_sample >= settings.backlog_sample_interval_seconds:
+            self._last_backlog_sample = time.monotonic()
+            try:
+                await self._sample_backlog()
+            except Exception as exc:
+                logger.warning("[%s] Backlog sampling failed: %s", self.name, exc)
+        return batch_size, len(events), processed
+
+    async def run(self, stopping: Callable[[], bool], idle_wait: float) -> None:
+        """Process batches until *stopping* returns True."""
+        logger.info("[%s] Consumer started", self.name)
+        if self.membership is not None:
+            # Idle waits must not outlast the heartbeat, so rebalances are noticed.
+            idle_wait = min(idle_wait, self.membership.heartbeat_interval)
+            try:
+                await self.membership.refresh()
+            except Exception as exc:
+                logger.warning("[%s] Shard heartbeat failed: %s", self.name, exc)
+            self.membership.start()
+        try:
+            while not stopping():
+                batch_size, claimed, processed = await self.run_once()
+                if stopping():
+                    break
+                # Drain mode: a full batch that made progress means a backlog is
+                # waiting, so claim again straight away instead of idling.
+                draining = claimed >= batch_size and processed > 0
+                if not draining:
+                    await self.listener.wait(idle_wait, waiter=self.name)
+        finally:
+            if self.membership is not None:
+                await self.membership.stop()
+                try:
+                    await self.membership.leave()
+                except Exception as exc:
+                    logger.warning("[%s] Could not leave shard membership: %s", self.name, exc)
+        logger.info("[%s] Consumer stopped", self.name)
+
+    # -- internals --------------------------------------------------
+
+    async def _handle(self, row: OutboxRow) -> None:
+        batch_error = self._batch_errors.get(row.id)
+        if batch_error is not None:
+            raise batch_error
+        if self.handler is not None:
+            await self.handler(row)
+
+    async def _record_result(self, result: EventResult) -> None:
+        await self._record_one(result)
+        for row in self._absorbed.get(result.row.id, ()):
+            await self._record_one(self._absorbed_result(result, row))
+
+    def _absorbed_result(self, lead: EventResult, row: OutboxRow) -> EventResult:
+        """*lead*'s outcome for an event merged into it, counted against *row*'s own attempts."""
+        if lead.outcome in (Outcome.PROCESSED, Outcome.SKIPPED):
+            return replace(lead, row=row, attempts=row.attempts)
+        attempts = row.attempts + 1
+        dead = attempts >= self.dispatcher.max_attempts
+        return replace(
+            lead,
+            row=row,
+            outcome=Outcome.DEAD_LETTER if dead else Outcome.RETRY,
+            attempts=attempts,
+            error=f"coalesced into outbox id={lead.row.id}: {lead.error}"[:512],
+            retry_after=None if dead else self.dispatcher.backoff(attempts),
+        )
+
+    async def _record_one(self, result: EventResult) -> None:
+        row = result.row
+        metrics.outbox_events.inc(consumer=self.name, event_type=row.event_type, outcome=result.outcome.value)
+        metrics.outbox_handler_duration.observe(result.duration, consumer=self.name, event_type=row.event_type)
+
+        worker_id = settings.worker_id
+        now = datetime.now(timezone.utc)
+        retry_at = now + timedelta(seconds=result.retry_after) if result.retry_after else None
+
+        async with self.engine.begin() as conn:
+            if result.outcome == Outcome.PROCESSED:
+                owned = await outbox.mark_processed(conn, self.name, row.id, worker_id, now)
+                if owned:
+                    logger.info("[%s] Outbox id=%s processed OK", self.name, row.id)
+            elif result.outcome == Outcome.SKIPPED:
+                owned = await outbox.release(conn, self.name, row.id, worker_id, retry_at=retry_at)
+            elif result.outcome == Outcome.DEAD_LETTER:
+                owned = await outbox.dead_letter(
+                    conn, self.name, row.id, worker_id, result.attempts, result.error, now,
+                )
+                if owned:
+                    logger.error(
+                        "[%s] Outbox id=%s dead-lettered after %d attempts",
+                        self.name, row.id, result.attempts,
+                    )
+            else:
+                owned = await outbox.mark_failed(
+                    conn, self.name, row.id, worker_id, result.attempts, result.error,
+                    next_attempt_at=retry_at or now,
+                )
+                if owned:
+                    logger.warning(
+                        "[%s] Outbox id=%s failed (attempt %d/%d, next attempt in %.1fs): %s",
+                        self.name, row.id, result.attempts, settings.retry_max_attempts,
+                        result.retry_after or 0.0, result.error,
+                    )
+
+        if not owned:
+            logger.warning(
+                "[%s] Outbox id=%s lease expired before its %s result was recorded; "
+                "another worker owns it",
+                self.name, row.id, result.outcome.value,
+            )
+
+    async def _sample_backlog(self) -> None:
+        async with self.engine.connect() as conn:
+            backlog, oldest = await outbox.backlog(conn, self.name)
+        rate = self.drain.rate()
+        lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        metrics.outbox_backlog.set(backlog, consumer=self.name)
+        metrics.outbox_drain_rate.set(rate, consumer=self.name)
+        metrics.outbox_lag.set(max(0.0, lag), consumer=self.name)
+        if backlog:
+            logger.info(
+                "[%s] Outbox backlog=%d drain_rate=%.1f/s batch_size=%d",
+                self.name, backlog, rate, self.sizer.size,
+            )
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    delay = min(
+        settings.retry_base_delay * (2 ** attempt),
+        settings.retry_max_delay,
+    )
+    return random.uniform(0, delay)
@@ -0,0 +1,153 @@
+"""Device commands the worker runs directly against device-service's tables.
+
+Saga compensation used to call back into device-service over HTTP to
+reactivate a retired device: a network hop, a full request and a pool
+checkout there, for a write to the database the worker is already connected
+to. ``activate_device`` performs the same change on the worker's own
+connection:
+
+- the rules of ``Device.activate`` (the device must be retired, a reason is
+  required);
+- the optimistic ``version`` check of the device repository, bumping the
+  version on success;
+- the ``device.activated`` outbox event with its device snapshot, marked as
+  ``system``-originated with the causing event's id, fanned out to every
+  registered consumer and announced with ``pg_notify``, as device-service's
+  outbox repository does.
+
+Everything happens in the caller's transaction, so the status change and its
+event commit together. Keep it in step with device-service's
+``DevicesApplicationService.activate``.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from worker.outbox import ORIGIN_SYSTEM
+from worker.settings import settings
+
+ACTIVE = "active"
+
+
+class DeviceCommandError(Exception):
+    """A device command was refused; retrying it unchanged will not help."""
+
+
+class DeviceNotFoundError(DeviceCommandError):
+    pass
+
+
+class DeviceConflictError(DeviceCommandError):
+    """The device changed since the version the command expected."""
+
+
+async def activate_device(
+    conn: AsyncConnection,
+    tenant_id: UUID,
+    device_id: UUID,
+    reason: str,
+    user_id: str,
+    expected_version: int | None = None,
+    causation_id: UUID | None = None,
+) -> dict[str, Any]:
+    """Reactivate a retired device and write its ``device.activated`` event.
+
+    *expected_version* guards against overwriting a newer change; None
+    accepts whatever version is read. *causation_id* is the event that led
+    to the reactivation. Returns the new device snapshot.
+    """
+    result = await conn.execute(
+        text(
+            """
+            SELECT id, tenant_id, mac_address, status, created_at, version
+            FROM devices
+            WHERE tenant_id = :tenant_id AND id = :id
+            """
+        ),
+        {"tenant_id": tenant_id, "id": device_id},
+    )
+    device = result.one_or_none()
+    if device is None:
+        raise DeviceNotFoundError(f"Device {device_id} not found")
+    if device.status == ACTIVE:
+        raise DeviceCommandError("Device already active")
+    if not reason.strip():
+        raise DeviceCommandError("Activation reason is required")
+    version = device.version if expected_version is None else expected_version
+
+    now = datetime.now(timezone.utc)
+    result = await conn.execute(
+        text(
+            """
+            UPDATE devices
+            SET status = :status, updated_at = :now, version = :version + 1
+            WHERE tenant_id = :tenant_id AND id = :id AND version = :version
+            """
+        ),
+        {"status": ACTIVE, "now": now, "version": version, "tenant_id": tenant_id, "id": device_id},
+    )
+    if result.rowcount != 1:
+        raise DeviceConflictError(f"Device {device_id} was updated by another request")
+
+    snapshot = {
+        "id": str(device.id),
+        "tenant_id": str(device.tenant_id),
+        "mac_address": device.mac_address,
+        "status": ACTIVE,
+        "created_at": device.created_at.isoformat(),
+        "updated_at": now.isoformat(),
+        "version": version + 1,
+    }
+    payload = {
+        "device_id": str(device_id),
+        "user_id": user_id,
+        "origin": ORIGIN_SYSTEM,
+        "reason": reason,
+        "device": snapshot,
+    }
+    if causation_id is not None:
+        payload["causation_id"] = str(causation_id)
+    await _add_event(conn, tenant_id, "device.activated", payload)
+    return snapshot
+
+
+async def _add_event(conn: AsyncConnection, tenant_id: UUID, event_type: str, payload: dict[str, Any]) -> None:
+    event_id = uuid4()
+    created_at = datetime.now(timezone.utc)
+    await conn.execute(
+        text(
+            """
+            INSERT INTO outbox (id, tenant_id, event_type, payload, created_at)
+            VALUES (:id, :tenant_id, :event_type, :payload, :created_at)
+            """
+        ),
+        {
+            "id": event_id,
+            "tenant_id": tenant_id,
+            "event_type": event_type,
+            "payload": json.dumps(payload),
+            "created_at": created_at,
+        },
+    )
+    await conn.execute(
+        text(
+            """
+            INSERT INTO outbox_deliveries
+                (outbox_id, consumer, tenant_id, event_type, payload, created_at, next_attempt_at, attempts)
+            SELECT o.id, c.name, o.tenant_id, o.event_type, o.payload, o.created_at, o.created_at, 0
+            FROM outbox o
+            CROSS JOIN outbox_consumers c
+            WHERE o.id = :id AND o.created_at = :created_at
+            """
+        ),
+        {"id": event_id, "created_at": created_at},
+    )
+    await conn.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": settings.outbox_notify_channel, "payload": event_type},
+    )
@@ -0,0 +1,159 @@
+"""Bounded concurrent dispatch of a claimed outbox batch.
+
+Events are grouped by ``device_id``; groups run concurrently under a shared
+semaphore while the events inside a group run one after another in outbox
+order. If an event fails, the rest of its group is held back with the same
+retry delay, so a later event for the same device never overtakes an
+earlier one. Across batches the claim keeps the same order (see
+``worker.outbox``): later events stay unclaimed while the failed one waits.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from enum import Enum
+
+from worker.circuit_breaker import CircuitOpenError
+from worker.outbox import OutboxRow
+from worker.saga_engine import SagaInProgressError
+
+logger = logging.getLogger(__name__)
+
+
+class Outcome(str, Enum):
+    PROCESSED = "processed"
+    RETRY = "retry"
+    DEAD_LETTER = "dead_letter"
+    SKIPPED = "skipped"  # circuit open, or held back behind a failed event
+
+
+@dataclass(frozen=True)
+class EventResult:
+    row: OutboxRow
+    outcome: Outcome
+    attempts: int
+    error: str | None = None
+    duration: float = 0.0
+    retry_after: float | None = None  # seconds until the row is due again
+
+
+def ordering_key(row: OutboxRow) -> str:
+    """Events sharing a key are processed sequentially."""
+    return str(row.payload.get("device_id") or row.id)
+
+
+class Dispatcher:
+    """Runs outbox events concurrently with a per-device ordering guarantee.
+
+    Args:
+        handler: coroutine performing all side effects for one event; raising
+            marks the event as failed.
+        concurrency: maximum events in flight at once.
+        max_attempts: attempts after which a failing event is dead-lettered.
+        backoff: maps the attempt number of a failed event to its retry delay.
+        circuit_open_delay: retry delay for events skipped by an open circuit.
+        in_progress_delay: retry delay for events whose saga another worker
+            is running; like a circuit skip, it costs no attempt.
+        on_result: optional coroutine called with each result as soon as its
+            event finishes (before the next event for the same device starts).
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[OutboxRow], Awaitable[None]],
+        concurrency: int = 10,
+        max_attempts: int = 5,
+        backoff: Callable[[int], float] = lambda _attempt: 0.0,
+        circuit_open_delay: float = 0.0,
+        in_progress_delay: float = 0.0,
+        on_result: Callable[[EventResult], Awaitable[None]] | None = None,
+    ) -> None:
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.circuit_open_delay = circuit_open_delay
+        self.in_progress_delay = in_progress_delay
+        self.on_result = on_result
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(self, rows: Sequence[OutboxRow]) -> list[EventResult]:
+        """Dispatch *rows* and return one result per row, in input order."""
+        groups: dict[str, list[OutboxRow]] = {}
+        for row in rows:
+            groups.setdefault(ordering_key(row), []).append(row)
+
+        results: dict[object, EventResult] = {}
+
+        async def _run_group(group: list[OutboxRow]) -> None:
+            for idx, row in enumerate(group):
+                result = await self._run_one(row)
+                await self._emit(results, result)
+                if result.outcome != Outcome.PROCESSED:
+                    for held in group[idx + 1:]:
+                        await self._emit(
+                            results,
+                            EventResult(
+                                row=held,
+                                outcome=Outcome.SKIPPED,
+                                attempts=held.attempts,
+                                error=f"held back behind outbox id={row.id}",
+                                retry_after=result.retry_after,
+                            ),
+                        )
+                    return
+
+        await asyncio.gather(*(_run_group(g) for g in groups.values()))
+        return [results[row.id] for row in rows]
+
+    async def _emit(self, results: dict[object, EventResult], result: EventResult) -> None:
+        results[result.row.id] = result
+        if self.on_result is not None:
+            await self.on_result(result)
+
+    async def _run_one(self, row: OutboxRow) -> EventResult:
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                logger.info("Processing outbox id=%s event_type=%s", row.id, row.event_type)
+                await self.handler(row)
+            except CircuitOpenError as exc:
+                logger.warning("Outbox id=%s skipped — circuit open: %s", row.id, exc)
+                return EventResult(
+                    row=row,
+                    outcome=Outcome.SKIPPED,
+                    attempts=row.attempts,
+                    error=str(exc),
+                    duration=time.monotonic() - started,
+                    retry_after=self.circuit_open_delay,
+                )
+            except SagaInProgressError as exc:
+                logger.info("Outbox id=%s deferred — %s", row.id, exc)
+                return EventResult(
+                    row=row,
+                    outcome=Outcome.SKIPPED,
+                    attempts=row.attempts,
+                    error=str(exc),
+                    duration=time.monotonic() - started,
+                    retry_after=self.in_progress_delay,
+                )
+            except Exception as exc:
+                attempts = row.attempts + 1
+                dead = attempts >= self.max_attempts
+                return EventResult(
+                    row=row,
+                    outcome=Outcome.DEAD_LETTER if dead else Outcome.RETRY,
+                    attempts=attempts,
+                    error=str(exc)[:512],
+                    duration=time.monotonic() - started,
+                    retry_after=None if dead else self.backoff(attempts),
+                )
+
+            return EventResult(
+                row=row,
+                outcome=Outcome.PROCESSED,
+                attempts=row.attempts,
+                duration=time.monotonic() - started,
+            )
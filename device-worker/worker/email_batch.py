@@ -0,0 +1,160 @@
+"""Batched email delivery through Resend's ``POST /emails/batch``.
+
+Every notification used to be its own ``POST /emails``; onboarding a few
+thousand devices meant thousands of requests queued behind the Resend rate
+limit. ``EmailBatcher.send`` instead buffers the message for up to
+``window`` seconds (or until ``max_batch`` are waiting) and delivers the
+buffer in one request per chunk of up to ``max_batch`` messages.
+
+Batches are sent with ``x-batch-validation: permissive``, so one invalid
+message does not reject its whole chunk: Resend reports per-index errors,
+which are raised from that message's ``send`` call only. Each caller (an
+outbox row's handler) therefore fails or succeeds on its own, and the
+dispatcher retries just the affected rows. A failed request (transport error,
+5xx, open circuit) fails every message in the chunk.
+
+Point ``RESEND_BASE_URL`` at any stand-in that implements the batch endpoint
+to run against a local server.
+"""
+
+import asyncio
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+import httpx
+
+from worker.circuit_breaker import CircuitBreaker
+from worker.metrics import Histogram
+from worker.ratelimit import DependencyLimiter
+from worker.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Resend accepts at most 100 messages per batch request.
+MAX_BATCH = 100
+
+email_batch_size = Histogram(
+    "email_batch_size",
+    "Messages per /emails/batch request.",
+    buckets=(1, 2, 5, 10, 25, 50, 100),
+)
+
+
+class EmailDeliveryError(Exception):
+    """The provider rejected one message of a batch."""
+
+
+@dataclass
+class _Message:
+    to: str
+    subject: str
+    html: str
+    future: asyncio.Future[str | None] = field(repr=False)
+
+    def body(self) -> dict:
+        return {"from": settings.resend_from, "to": [self.to], "subject": self.subject, "html": self.html}
+
+
+class EmailBatcher:
+    """Collects outgoing emails and flushes them in batches.
+
+    Args:
+        client: pooled Resend client.
+        breaker: circuit breaker guarding Resend; one batch is one call.
+        limiter: rate limit and bulkhead for Resend; one batch is one call.
+        window: seconds the first buffered message waits for company.
+        max_batch: messages per request (at most 100).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        breaker: CircuitBreaker,
+        limiter: DependencyLimiter | None = None,
+        window: float = 0.05,
+        max_batch: int = MAX_BATCH,
+    ) -> None:
+        self.client = client
+        self.breaker = breaker
+        self.limiter = limiter
+        self.window = window
+        self.max_batch = min(max_batch, MAX_BATCH)
+
+        self._buffer: list[_Message] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def send(self, to: str, subject: str, html: str) -> str | None:
+        """Queue one email and wait for its batch; returns the provider's id.
+
+        Raises ``EmailDeliveryError`` if the provider rejected this message,
+        or the batch request's error if the whole request failed.
+        """
+        loop = asyncio.get_running_loop()
+        message = _Message(to, subject, html, loop.create_future())
+        self._buffer.append(message)
+        if len(self._buffer) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await asyncio.shield(message.future)
+
+    def flush(self) -> None:
+        """Start delivering everything buffered so far."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        buffered, self._buffer = self._buffer, []
+        for start in range(0, len(buffered), self.max_batch):
+            task = asyncio.create_task(self._deliver(buffered[start:start + self.max_batch]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def aclose(self) -> None:
+        """Flush and wait for in-flight batches."""
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # -- internals --------------------------------------------------
+
+    async def _deliver(self, batch: list[_Message]) -> None:
+        email_batch_size.observe(len(batch))
+        try:
+            async with self.limiter or nullcontext():
+                result = await self.breaker.call(self._post, batch)
+        except Exception as exc:
+            logger.warning("Email batch of %d failed: %s", len(batch), exc)
+            for message in batch:
+                _settle(message.future, exc=exc)
+            return
+
+        ids = [item.get("id") for item in result.get("data") or []]
+        errors = {err.get("index"): err.get("message", "rejected") for err in result.get("errors") or []}
+        accepted = iter(ids)
+        for index, message in enumerate(batch):
+            if index in errors:
+                _settle(message.future, exc=EmailDeliveryError(f"{message.to}: {errors[index]}"))
+            else:
+                _settle(message.future, result=next(accepted, None))
+        logger.info("Email batch sent: %d accepted, %d rejected", len(batch) - len(errors), len(errors))
+
+    async def _post(self, batch: list[_Message]) -> dict:
+        res = await self.client.post(
+            "/emails/batch",
+            json=[message.body() for message in batch],
+            headers={"x-batch-validation": "permissive"},
+        )
+        res.raise_for_status()
+        return res.json()
+
+
+def _settle(future: asyncio.Future, result: str | None = None, exc: BaseException | None = None) -> None:
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+        future.exception()  # a caller that went away should not log "never retrieved"
+    else:
+        future.set_result(result)
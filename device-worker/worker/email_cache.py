@@ -0,0 +1,136 @@
+"""Cached user_id → email resolution against tenancy-service.
+
+One resolver is shared by notification, projection and the retirement saga,
+so a ``device.created`` event costs at most one tenancy call — and repeated
+events for the same user usually cost none.
+
+- TTL + size-bounded LRU eviction.
+- Negative caching: a 404 is remembered (for a shorter TTL) as "no email".
+- Single-flight: concurrent lookups for the same user share one request.
+- Errors are never cached; they propagate to every waiter of that flight.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import httpx
+
+from worker.circuit_breaker import CircuitBreaker
+from worker.metrics import Counter
+from worker.ratelimit import DependencyLimiter
+
+email_cache_lookups = Counter(
+    "email_cache_lookups_total",
+    "user_id → email lookups by result (hit, miss, coalesced).",
+    labelnames=("result",),
+)
+
+
+class EmailLookupError(Exception):
+    """Tenancy-service answered with an unexpected status."""
+
+
+class EmailResolver:
+    """Resolve and cache user emails.
+
+    Args:
+        client: pooled tenancy-service client.
+        breaker: circuit breaker guarding tenancy-service; only cache misses
+            go through it.
+        ttl: seconds a resolved email stays cached.
+        negative_ttl: seconds a "user has no email" answer stays cached.
+        max_size: entries kept before least-recently-used eviction.
+        limiter: rate limit and bulkhead for tenancy-service calls.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        breaker: CircuitBreaker,
+        ttl: float = 300.0,
+        negative_ttl: float = 60.0,
+        max_size: int = 10_000,
+        limiter: DependencyLimiter | None = None,
+    ) -> None:
+        self.client = client
+        self.breaker = breaker
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.limiter = limiter
+
+        self._entries: OrderedDict[str, tuple[float, str | None]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[str | None]] = {}
+
+    async def resolve(self, user_id: str) -> str | None:
+        """Return the user's email, or None if tenancy-service has none."""
+        cached = self._get(user_id)
+        if cached is not None:
+            email_cache_lookups.inc(result="hit")
+            return cached[1]
+
+        inflight = self._inflight.get(user_id)
+        if inflight is not None:
+            email_cache_lookups.inc(result="coalesced")
+            return await asyncio.shield(inflight)
+
+        email_cache_lookups.inc(result="miss")
+        future: asyncio.Future[str | None] = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            async with self.limiter or nullcontext():
+                email = await self.breaker.call(self._fetch, user_id)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an un-awaited failure does not log a warning.
+            future.exception()
+            raise
+        else:
+            self._put(user_id, email)
+            future.set_result(email)
+            return email
+        finally:
+            del self._inflight[user_id]
+
+    def peek(self, user_id: str) -> str | None:
+        """The cached email for *user_id*, if any; never calls tenancy-service."""
+        cached = self._get(user_id)
+        return cached[1] if cached is not None else None
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- internals --------------------------------------------------
+
+    async def _fetch(self, user_id: str) -> str | None:
+        res = await self.client.get(f"/internal/user-email/{user_id}")
+        if res.status_code == 404:
+            return None
+        if res.status_code != 200:
+            raise EmailLookupError(f"Tenancy returned {res.status_code} for user {user_id}")
+        return res.json().get("email") or None
+
+    def _get(self, user_id: str) -> tuple[float, str | None] | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _put(self, user_id: str, email: str | None) -> None:
+        ttl = self.ttl if email else self.negative_ttl
+        self._entries[user_id] = (time.monotonic() + ttl, email)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
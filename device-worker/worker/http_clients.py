@@ -0,0 +1,82 @@
+"""Long-lived, pooled HTTP clients — one per external dependency.
+
+Created once at worker startup and closed on shutdown, so connections (and
+TLS sessions to Resend) are reused across events instead of paying a fresh
+handshake per request.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+from worker.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HttpClients:
+    tenancy: httpx.AsyncClient
+    email: httpx.AsyncClient
+    device_service: httpx.AsyncClient
+
+    async def aclose(self) -> None:
+        for client in (self.tenancy, self.email, self.device_service):
+            await client.aclose()
+
+    def pool_usage(self) -> dict[str, tuple[int, int]]:
+        """``(in_use, idle)`` connection counts per client."""
+        return {
+            "tenancy": _pool_usage(self.tenancy),
+            "email": _pool_usage(self.email),
+            "device_service": _pool_usage(self.device_service),
+        }
+
+
+def _pool_usage(client: httpx.AsyncClient) -> tuple[int, int]:
+    # httpx does not expose pool state publicly; read httpcore's pool when
+    # it is there and report nothing otherwise (e.g. a mock transport).
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", ()))
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return len(connections) - idle, idle
+
+
+def _client(base_url: str, headers: dict[str, str]) -> httpx.AsyncClient:
+    kwargs = dict(
+        base_url=base_url,
+        headers=headers,
+        timeout=httpx.Timeout(
+            settings.http_timeout,
+            connect=settings.http_connect_timeout,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    )
+    if settings.http2_enabled:
+        try:
+            return httpx.AsyncClient(http2=True, **kwargs)
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is missing; using HTTP/1.1")
+    return httpx.AsyncClient(**kwargs)
+
+
+def create_http_clients() -> HttpClients:
+    return HttpClients(
+        tenancy=_client(
+            settings.tenancy_service_url,
+            {"x-internal-token": settings.tenancy_service_token},
+        ),
+        email=_client(
+            settings.resend_base_url,
+            {"Authorization": f"Bearer {settings.resend_api_key}"},
+        ),
+        device_service=_client(
+            settings.device_service_url,
+            {"x-internal-token": settings.device_service_token},
+        ),
+    )
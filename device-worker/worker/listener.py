@@ -0,0 +1,115 @@
+"""Outbox wake-ups via Postgres LISTEN/NOTIFY.
+
+device-service issues ``pg_notify`` in the same transaction as each outbox
+insert, so the notification is delivered exactly when the row becomes
+visible. The listener keeps one dedicated asyncpg connection (outside the
+SQLAlchemy pool) and turns notifications into one ``asyncio.Event`` per
+waiter, so every consumer loop sharing the listener hears every wake-up. Polling on a slow timer stays in place as a safety net for
+missed notifications and dropped connections.
+"""
+
+import asyncio
+import logging
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """Convert a SQLAlchemy ``postgresql+asyncpg://`` URL to a plain asyncpg DSN."""
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+class OutboxListener:
+    """Waits for outbox notifications, falling back to a timeout.
+
+    Args:
+        dsn: asyncpg connection string.
+        channel: NOTIFY channel device-service publishes on.
+        enabled: when False, no connection is opened and ``wait`` is a plain sleep
+            that can still be interrupted by ``wake``.
+    """
+
+    def __init__(self, dsn: str, channel: str, enabled: bool = True) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.enabled = enabled
+
+        self._conn: asyncpg.Connection | None = None
+        self._events: dict[str, asyncio.Event] = {}
+        self._woken = False
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def start(self) -> None:
+        if not self.enabled or self.connected:
+            return
+        try:
+            self._conn = await asyncpg.connect(self.dsn)
+            await self._conn.add_listener(self.channel, self._on_notify)
+            self._conn.add_termination_listener(self._on_terminate)
+        except Exception as exc:
+            logger.warning("LISTEN %s unavailable, relying on fallback poll: %s", self.channel, exc)
+            self._conn = None
+            return
+        logger.info("Listening for outbox notifications on channel %r", self.channel)
+        # Rows may have been inserted while we were not listening.
+        self.wake()
+
+    async def wait(self, timeout: float, waiter: str = "default") -> bool:
+        """Block until a notification (or ``wake``) arrives or *timeout* elapses.
+
+        Wake-ups are tracked per *waiter* name, so one waiter consuming a
+        wake-up does not hide it from another that is busy. A waiter's first
+        call returns immediately if a wake-up happened before it registered.
+
+        Returns True when woken early, False on timeout.
+        """
+        if self.enabled and not self.connected:
+            await self.start()
+        event = self._event(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except TimeoutError:
+            return False
+        finally:
+            event.clear()
+        return True
+
+    def wake(self) -> None:
+        """Wake every waiter immediately (used for shutdown and reconnects)."""
+        self._woken = True
+        for event in self._events.values():
+            event.set()
+
+    async def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            await conn.remove_listener(self.channel, self._on_notify)
+            await conn.close()
+        except Exception as exc:
+            logger.warning("Error closing LISTEN connection: %s", exc)
+
+    # -- internals --------------------------------------------------
+
+    def _event(self, waiter: str) -> asyncio.Event:
+        event = self._events.get(waiter)
+        if event is None:
+            event = self._events[waiter] = asyncio.Event()
+            if self._woken:
+                event.set()
+        return event
+
+    def _on_notify(self, _conn, _pid, _channel, _payload) -> None:
+        self.wake()
+
+    def _on_terminate(self, _conn) -> None:
+        logger.warning("LISTEN connection lost, will reconnect on next wait")
+        self._conn = None
@@ -1,19 +1,32 @@
+import argparse
 import asyncio
 import logging
-import random
 import signal
-from datetime import datetime, timezone
 from typing import Any
 from uuid import UUID
 
 import httpx
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
-
-from worker.circuit_breaker import CircuitBreaker, CircuitOpenError
-from worker.projector import project_event
-from worker.sagas import DeviceRetirementSaga
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from worker import metrics, replay
+from worker.breaker_state import PostgresBreakerState
+from worker.circuit_breaker import CircuitBreaker, State
+from worker.consumer import NOTIFICATION, PROJECTION, OutboxConsumer
+from worker.email_batch import MAX_BATCH as EMAIL_BATCH_MAX, EmailBatcher
+from worker.email_cache import EmailResolver
+from worker.http_clients import HttpClients, create_http_clients
+from worker.listener import OutboxListener, asyncpg_dsn
+from worker.metrics_server import MetricsServer
+from worker.notifications import coalesce, message_for
+from worker.outbox import is_system_originated
+from worker.projector import project_batch
+from worker.ratelimit import DependencyLimiter
+from worker.retention import OutboxRetention
+from worker.saga_engine import RetryPolicy, SagaRecovery
+from worker.sagas import DeviceRetirementSaga, is_transient
 from worker.settings import settings
+from worker.sharding import ShardMembership
+from worker.supervisor import Supervisor
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,70 +36,122 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ── Circuit breakers (one per external dependency) ────────────────
-email_breaker = CircuitBreaker(
-    failure_threshold=settings.cb_failure_threshold,
-    recovery_timeout=settings.cb_recovery_timeout,
-    name="resend",
-)
-tenancy_breaker = CircuitBreaker(
-    failure_threshold=settings.cb_failure_threshold,
-    recovery_timeout=settings.cb_recovery_timeout,
-    name="tenancy",
-)
+_BREAKER_STATE_VALUES = {State.CLOSED: 0, State.HALF_OPEN: 1, State.OPEN: 2}
 
-# ── Graceful shutdown flag ────────────────────────────────────────
-_shutdown_requested = False
 
+def _on_breaker_transition(breaker: CircuitBreaker, old: State, new: State) -> None:
+    metrics.circuit_breaker_transitions.inc(name=breaker.name, from_state=old.value, to_state=new.value)
+    metrics.circuit_breaker_state.set(_BREAKER_STATE_VALUES[new], name=breaker.name)
 
-def _http_client() -> httpx.AsyncClient:
-    """Create an httpx client with configured timeouts."""
-    return httpx.AsyncClient(
-        timeout=httpx.Timeout(
-            settings.http_timeout,
-            connect=settings.http_connect_timeout,
-        )
+
+def _breaker(name: str) -> CircuitBreaker:
+    breaker = CircuitBreaker(
+        failure_threshold=settings.cb_failure_threshold,
+        recovery_timeout=settings.cb_recovery_timeout,
+        name=name,
+        window_seconds=settings.cb_window_seconds or None,
+        failure_rate_threshold=settings.cb_failure_rate_threshold,
+        minimum_calls=settings.cb_minimum_calls,
+        half_open_max_calls=settings.cb_half_open_max_calls,
+        slow_call_threshold=settings.cb_slow_call_seconds or None,
     )
+    breaker.add_listener(_on_breaker_transition)
+    return breaker
 
 
-async def resolve_user_email(user_id: str) -> str | None:
-    async def _call() -> str | None:
-        async with _http_client() as client:
-            res = await client.get(
-                f"{settings.tenancy_service_url}/internal/user-email/{user_id}",
-                headers={"x-internal-token": settings.tenancy_service_token},
-            )
-            if res.status_code != 200:
-                return None
-            data = res.json()
-            return data.get("email")
+email_breaker = _breaker("resend")
+tenancy_breaker = _breaker("tenancy")
 
-    return await tenancy_breaker.call(_call)
+# ── Rate limits and bulkheads (outside the breakers) ──────────────
+email_limiter = DependencyLimiter(
+    "resend",
+    rate=settings.resend_rate_per_second or None,
+    burst=settings.resend_burst,
+    max_concurrent=settings.resend_max_concurrency or None,
+    breaker=email_breaker,
+)
+tenancy_limiter = DependencyLimiter(
+    "tenancy",
+    rate=settings.tenancy_rate_per_second or None,
+    burst=settings.tenancy_burst,
+    max_concurrent=settings.tenancy_max_concurrency or None,
+    breaker=tenancy_breaker,
+)
+device_service_limiter = DependencyLimiter(
+    "device_service",
+    rate=settings.device_service_rate_per_second or None,
+    burst=settings.device_service_burst,
+    max_concurrent=settings.device_service_max_concurrency or None,
+)
 
+# ── Outbox wake-ups (LISTEN/NOTIFY with fallback poll) ────────────
+listener = OutboxListener(
+    asyncpg_dsn(settings.database_url),
+    settings.outbox_notify_channel,
+    enabled=settings.outbox_listen_enabled,
+)
 
-async def send_email(to_email: str, subject: str, body: str) -> None:
-    async def _call() -> None:
-        async with _http_client() as client:
-            res = await client.post(
-                "https://api.resend.com/emails",
-                headers={"Authorization": f"Bearer {settings.resend_api_key}"},
-                json={
-                    "from": settings.resend_from,
-                    "to": [to_email],
-                    "subject": subject,
-                    "html": body,
-                },
-            )
-            res.raise_for_status()
+# ── Graceful shutdown flag ────────────────────────────────────────
+_shutdown_requested = False
 
-    await email_breaker.call(_call)
+
+async def send_email(client: httpx.AsyncClient, to_email: str, subject: str, body: str) -> None:
+    async def _call() -> None:
+        res = await client.post(
+            "/emails",
+            json={
+                "from": settings.resend_from,
+                "to": [to_email],
+                "subject": subject,
+                "html": body,
+            },
+        )
+        res.raise_for_status()
+
+    async with email_limiter:
+        await email_breaker.call(_call)
+
+
+def _retirement_saga(
+    engine: AsyncEngine,
+    http: HttpClients,
+    emails: EmailResolver,
+    mailer: EmailBatcher | None = None,
+) -> DeviceRetirementSaga:
+    return DeviceRetirementSaga(
+        engine, http, emails, email_breaker,
+        email_limiter=email_limiter,
+        device_service_limiter=device_service_limiter,
+        mailer=mailer,
+        stale_after=settings.saga_stale_after_seconds,
+        notify_retry=RetryPolicy(
+            max_attempts=settings.saga_notify_max_attempts,
+            base_delay=settings.saga_notify_base_delay_seconds,
+            max_delay=settings.saga_notify_max_delay_seconds,
+            deadline=settings.saga_notify_deadline_seconds or None,
+            retryable=is_transient,
+        ),
+        db_compensation=settings.saga_db_compensation_enabled,
+    )
 
 
 async def handle_event(
-    conn: AsyncConnection,
+    engine: AsyncEngine,
+    http: HttpClients,
+    emails: EmailResolver,
     event_type: str,
     payload: dict[str, Any],
     tenant_id: UUID,
+    mailer: EmailBatcher | None = None,
+    event_id: UUID | None = None,
 ) -> None:
+    if is_system_originated(payload):
+        # e.g. a saga's compensating reactivation: projection picks it up,
+        # but nobody asked for it, so nobody is emailed about it
+        logger.debug("Event %s is system-originated, no notification", event_type)
+        metrics.notifications_suppressed.inc(event_type=event_type)
+        return
+
     user_id = payload.get("user_id")
     if not user_id:
         logger.warning("Event %s missing user_id, skipping", event_type)
@@ -98,133 +163,288 @@ async def handle_event(
         return
 
     if event_type == "device.retired":
-        saga = DeviceRetirementSaga(conn, tenancy_breaker, email_breaker)
+        saga = _retirement_saga(engine, http, emails, mailer)
         await saga.start(
             tenant_id=tenant_id,
             device_id=device_id,
             user_id=user_id,
             reason=payload.get("reason", ""),
+            event_id=event_id,
+            version=(payload.get("device") or {}).get("version"),
         )
         return
 
-    # Non-saga events: simple email notification
-    email = await resolve_user_email(user_id)
+    # Non-saga events: simple email notification, possibly for several
+    # coalesced events of this device at once
+    message = message_for(payload.get("coalesced") or [event_type])
+    if message is None:
+        return
+    email = await emails.resolve(user_id)
     if not email:
         return
 
-    if event_type == "device.activated":
-        await send_email(email, "Device activated", "Your device is active.")
-    elif event_type == "device.created":
-        await send_email(email, "Device registered", "Your device has been registered.")
+    subject, body = message
+    if mailer is not None:
+        await mailer.send(email, subject, body)
+    else:
+        await send_email(http.email, email, subject, body)
+
+
+def _build_consumers(
+    engine: AsyncEngine,
+    http: HttpClients,
+    emails: EmailResolver,
+    mailer: EmailBatcher | None = None,
+) -> list[OutboxConsumer]:
+    if settings.outbox_sharding_enabled and settings.shard_member_ttl_seconds <= settings.outbox_lease_seconds:
+        raise ValueError(
+            "SHARD_MEMBER_TTL_SECONDS must exceed OUTBOX_LEASE_SECONDS, or peers take over "
+            "a worker's partitions while its rows are still leased"
+        )
 
+    def membership(consumer: str) -> ShardMembership | None:
+        if not settings.outbox_sharding_enabled:
+            return None
+        return ShardMembership(
+            engine,
+            consumer,
+            settings.worker_id,
+            heartbeat_interval=settings.shard_heartbeat_interval_seconds,
+            member_ttl=settings.shard_member_ttl_seconds,
+        )
 
-def _backoff_delay(attempt: int) -> float:
-    """Exponential backoff with full jitter."""
-    delay = min(
-        settings.retry_base_delay * (2 ** attempt),
-        settings.retry_max_delay,
-    )
-    return random.uniform(0, delay)
+    available = {
+        PROJECTION: lambda: OutboxConsumer(
+            PROJECTION,
+            engine,
+            listener,
+            batch_handler=lambda rows: project_batch(engine, emails, rows),
+            concurrency=settings.projection_concurrency,
+            batch_min=settings.projection_batch_min,
+            batch_max=settings.projection_batch_max,
+            membership=membership(PROJECTION),
+        ),
+        NOTIFICATION: lambda: OutboxConsumer(
+            NOTIFICATION,
+            engine,
+            listener,
+            handler=lambda row: handle_event(
+                engine, http, emails, row.event_type, row.payload, row.tenant_id, mailer, row.id,
+            ),
+            coalescer=coalesce if settings.notification_coalescing_enabled else None,
+            concurrency=settings.worker_concurrency,
+            batch_min=settings.outbox_batch_min,
+            batch_max=settings.outbox_batch_max,
+            call_rate=_email_rate(),
+            membership=membership(NOTIFICATION),
+        ),
+    }
+    unknown = set(settings.consumer_names) - set(available)
+    if unknown:
+        raise ValueError(f"Unknown outbox consumer(s): {', '.join(sorted(unknown))}")
+    return [available[name]() for name in settings.consumer_names]
+
+
+def _email_rate() -> float | None:
+    """Notifications Resend accepts per second (None if not rate-limited)."""
+    if not settings.resend_rate_per_second:
+        return None
+    per_call = min(settings.email_batch_max, EMAIL_BATCH_MAX) if settings.email_batch_enabled else 1
+    return settings.resend_rate_per_second * per_call
+
+
+def _dependency_collector(engine: AsyncEngine, http: HttpClients):
+    """Metrics collector for breaker states and connection-pool usage.
+
+    Runs on the metrics server's thread, so it only reads: breakers are
+    peeked, never moved to HALF_OPEN from here.
+    """
+
+    def collect() -> None:
+        for breaker in (email_breaker, tenancy_breaker):
+            metrics.circuit_breaker_state.set(_BREAKER_STATE_VALUES[breaker.peek_state()], name=breaker.name)
+        pool = engine.pool
+        metrics.db_pool_connections.set(pool.checkedout(), state="in_use")
+        metrics.db_pool_connections.set(pool.checkedin(), state="idle")
+        for client, (in_use, idle) in http.pool_usage().items():
+            metrics.http_pool_connections.set(in_use, client=client, state="in_use")
+            metrics.http_pool_connections.set(idle, client=client, state="idle")
+
+    return collect
+
+
+async def _retention_loop(retention: OutboxRetention) -> None:
+    while not _shutdown_requested:
+        try:
+            await retention.run_once(expire=settings.outbox_retention_enabled)
+        except Exception as exc:
+            logger.warning("Outbox retention run failed: %s", exc)
+        await asyncio.sleep(settings.outbox_retention_interval_seconds)
+
+
+async def _saga_recovery_loop(recovery: SagaRecovery) -> None:
+    while not _shutdown_requested:
+        try:
+            resumed = await recovery.run_once()
+            if resumed:
+                logger.info("Resumed %d stuck saga(s)", resumed)
+        except Exception as exc:
+            logger.warning("Saga recovery run failed: %s", exc)
+        await asyncio.sleep(settings.saga_recovery_interval_seconds)
 
 
 async def poll_loop() -> None:
-    engine = create_async_engine(settings.database_url, pool_pre_ping=True)
-    max_attempts = settings.retry_max_attempts
-    logger.info("Worker started, polling every %ds", settings.poll_interval_seconds)
+    # Each in-flight event may hold a connection briefly, plus one claim
+    # connection per consumer.
+    concurrency = {
+        PROJECTION: settings.projection_concurrency,
+        NOTIFICATION: settings.worker_concurrency,
+    }
+    engine = create_async_engine(
+        settings.database_url,
+        pool_pre_ping=True,
+        pool_size=sum(concurrency.get(name, 0) + 1 for name in settings.consumer_names),
+    )
+    http = create_http_clients()
+    emails = EmailResolver(
+        http.tenancy,
+        tenancy_breaker,
+        ttl=settings.email_cache_ttl_seconds,
+        negative_ttl=settings.email_cache_negative_ttl_seconds,
+        max_size=settings.email_cache_max_size,
+        limiter=tenancy_limiter,
+    )
+    mailer = None
+    if settings.email_batch_enabled:
+        mailer = EmailBatcher(
+            http.email,
+            email_breaker,
+            email_limiter,
+            window=settings.email_batch_window_seconds,
+            max_batch=settings.email_batch_max,
+        )
+    consumers = _build_consumers(engine, http, emails, mailer)
+    if settings.cb_shared_state_enabled:
+        for breaker in (email_breaker, tenancy_breaker):
+            breaker.shared_state = PostgresBreakerState(
+                engine,
+                breaker.name,
+                settings.worker_id,
+                sync_interval=settings.cb_shared_sync_interval_seconds,
+                probe_lease=settings.cb_probe_lease_seconds,
+            )
+    collector = _dependency_collector(engine, http)
+    metrics.REGISTRY.add_collector(collector)
+
+    if listener.enabled:
+        await listener.start()
+        idle_wait = settings.fallback_poll_interval_seconds
+        logger.info("Worker %s started, LISTEN mode with %ds fallback poll", settings.worker_id, idle_wait)
+    else:
+        idle_wait = settings.poll_interval_seconds
+        logger.info("Worker %s started, polling every %ds", settings.worker_id, idle_wait)
+    logger.info(
+        "Running outbox consumers: %s%s",
+        ", ".join(c.name for c in consumers),
+        " (tenant-hash sharded)" if settings.outbox_sharding_enabled else "",
+    )
+
+    # Runs even with retention disabled: future partitions must keep being
+    # created, or inserts pile up in outbox_default.
+    retention = OutboxRetention(
+        engine,
+        retention_days=settings.outbox_retention_days,
+        premake_days=settings.outbox_partition_premake_days,
+        archive_dir=settings.outbox_archive_dir,
+    )
+    retention_task = asyncio.create_task(_retention_loop(retention))
+
+    recovery = SagaRecovery(
+        engine,
+        [_retirement_saga(engine, http, emails, mailer)],
+        stale_after=settings.saga_stale_after_seconds,
+        batch_size=settings.saga_recovery_batch_size,
+    )
+    recovery_task = asyncio.create_task(_saga_recovery_loop(recovery))
 
     try:
-        while not _shutdown_requested:
-            async with engine.begin() as conn:
-                rows = await conn.execute(
-                    text(
-                        """
-                        SELECT id, event_type, payload, attempts, tenant_id
-                        FROM outbox
-                        WHERE processed_at IS NULL
-                        ORDER BY created_at ASC
-                        LIMIT 10
-                        FOR UPDATE SKIP LOCKED
-                        """
-                    )
-                )
-                events = rows.fetchall()
-
-                if events:
-                    logger.info("Polled %d event(s) from outbox", len(events))
-
-                for row in events:
-                    if _shutdown_requested:
-                        logger.info("Shutdown requested, stopping event processing")
-                        break
-
-                    attempts = int(row.attempts)
-                    try:
-                        logger.info("Processing outbox id=%s event_type=%s", row.id, row.event_type)
-                        await handle_event(conn, row.event_type, row.payload, row.tenant_id)
-                        await project_event(conn, row.event_type, row.payload, tenancy_breaker)
-                        await conn.execute(
-                            text(
-                                """
-                                UPDATE outbox
-                                SET processed_at = :now
-                                WHERE id = :id
-                                """
-                            ),
-                            {"id": row.id, "now": datetime.now(timezone.utc)},
-                        )
-                        logger.info("Outbox id=%s processed OK", row.id)
-                    except CircuitOpenError as exc:
-                        logger.warning(
-                            "Outbox id=%s skipped — circuit open: %s",
-                            row.id, exc,
-                        )
-                    except Exception as exc:
-                        attempts += 1
-                        delay = _backoff_delay(attempts)
-                        logger.warning(
-                            "Outbox id=%s failed (attempt %d/%d, next backoff %.1fs): %s",
-                            row.id, attempts, max_attempts, delay, exc,
-                        )
-                        await conn.execute(
-                            text(
-                                """
-                                UPDATE outbox
-                                SET attempts = :attempts, last_error = :err
-                                WHERE id = :id
-                                """
-                            ),
-                            {"id": row.id, "attempts": attempts, "err": str(exc)[:512]},
-                        )
-                        if attempts >= max_attempts:
-                            logger.error("Outbox id=%s dead-lettered after %d attempts", row.id, max_attempts)
-                            await conn.execute(
-                                text("UPDATE outbox SET processed_at = :now WHERE id = :id"),
-                                {"id": row.id, "now": datetime.now(timezone.utc)},
-                            )
-
-            await asyncio.sleep(settings.poll_interval_seconds)
+        await asyncio.gather(
+            *(c.run(lambda: _shutdown_requested, idle_wait) for c in consumers)
+        )
     finally:
+        recovery_task.cancel()
+        await asyncio.gather(recovery_task, return_exceptions=True)
+        metrics.REGISTRY.remove_collector(collector)
+        for breaker in (email_breaker, tenancy_breaker):
+            breaker.shared_state = None
+        retention_task.cancel()
+        await asyncio.gather(retention_task, return_exceptions=True)
+        await listener.close()
+        if mailer is not None:
+            await mailer.aclose()
+        logger.info("Closing HTTP clients")
+        await http.aclose()
         logger.info("Disposing database engine")
         await engine.dispose()
         logger.info("Worker stopped")
 
 
-def main() -> None:
+def run_worker() -> None:
+    """Run one worker event loop in this process until SIGTERM/SIGINT."""
     loop = asyncio.new_event_loop()
 
     def _handle_signal() -> None:
         global _shutdown_requested
         logger.info("Received shutdown signal, draining...")
         _shutdown_requested = True
+        listener.wake()
 
     for sig in (signal.SIGTERM, signal.SIGINT):
         loop.add_signal_handler(sig, _handle_signal)
 
+    server = None
+    if settings.metrics_port:
+        server = MetricsServer(settings.metrics_port, metrics.REGISTRY.exposition)
+        server.start()
+
     try:
         loop.run_until_complete(poll_loop())
     finally:
+        if server is not None:
+            server.stop()
         loop.close()
 
 
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="worker", description="Outbox worker")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.worker_processes,
+        help="worker processes to run under a supervisor (default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command")
+    replay.add_arguments(
+        commands.add_parser("replay", help="move dead-lettered events back into the live queue")
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        asyncio.run(replay.run(args))
+        return
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    Supervisor(
+        args.processes,
+        drain_timeout=settings.supervisor_drain_timeout_seconds,
+        restart_max_delay=settings.supervisor_restart_max_delay_seconds,
+        metrics_interval=settings.backlog_sample_interval_seconds,
+        metrics_port=settings.metrics_port,
+    ).run()
+
+
 if __name__ == "__main__":
     main()
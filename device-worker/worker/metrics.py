@@ -0,0 +1,330 @@
+"""Minimal in-process metrics — no external dependencies.
+
+Metric names and label conventions follow Prometheus so the values can be
+exported as-is.
+
+Under the multi-process supervisor each child ships ``REGISTRY.dump()`` to the
+parent, which merges them with ``combine``: counters and histograms are
+summed, gauges follow their ``multiprocess_mode``. ``exposition`` renders
+samples in the Prometheus text format (served by ``worker.metrics_server``).
+
+Values that are cheaper to read on demand than to keep updated (breaker
+states, pool usage) are refreshed by collectors registered with
+``REGISTRY.add_collector``, which run before every ``dump``.
+"""
+
+import logging
+import math
+import threading
+from collections.abc import Callable, Iterable, Mapping, Sequence
+
+logger = logging.getLogger(__name__)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class _Metric:
+    TYPE = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down.
+
+    *multiprocess_mode* decides how per-process values merge: ``sum`` (rates),
+    ``max`` (values every process samples from the same source, such as the
+    backlog) or ``all`` (kept per process under a ``process`` label).
+    """
+
+    TYPE = "gauge"
+    MULTIPROCESS_MODES = ("sum", "max", "all")
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        multiprocess_mode: str = "sum",
+    ) -> None:
+        if multiprocess_mode not in self.MULTIPROCESS_MODES:
+            raise ValueError(f"Unknown multiprocess_mode {multiprocess_mode!r}")
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, help, labelnames)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus sum and count."""
+
+    TYPE = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, help, labelnames)
+        self._observations: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # [bucket counts..., sum, count]
+            counts = self._observations.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def value(self, **labels: str) -> float:
+        """Number of observations."""
+        counts = self._observations.get(self._key(labels))
+        return counts[-1] if counts else 0.0
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._observations.items()]
+        out: list[Sample] = []
+        for key, counts in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                out.append((f"{self.name}_bucket", {**labels, "le": _format_bound(bound)}, count))
+            out.append((f"{self.name}_sum", labels, counts[-2]))
+            out.append((f"{self.name}_count", labels, counts[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} already registered")
+        self._metrics[metric.name] = metric
+
+    def metrics(self) -> list[_Metric]:
+        return list(self._metrics.values())
+
+    def get(self, name: str) -> _Metric | None:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes metrics right before each ``dump``."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def dump(self) -> list[Sample]:
+        """Every sample of every metric; picklable, for shipping to a parent process."""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as exc:
+                logger.warning("Metrics collector %r failed: %s", collector, exc)
+        return [sample for metric in self.metrics() for sample in metric.samples()]
+
+    def snapshot(self) -> dict[str, float]:
+        """Flat ``name{label="v"} -> value`` view, handy for logging."""
+        return _flatten(self.dump())
+
+    def combine(self, dumps: Mapping[str, list[Sample]]) -> dict[str, float]:
+        """Merge ``dump()`` output from several processes, keyed by process id."""
+        return _flatten(self.combine_samples(dumps))
+
+    def exposition(self, samples: Iterable[Sample] | None = None) -> str:
+        """Render *samples* (default: this process's) in the Prometheus text format."""
+        families: dict[str, list[Sample]] = {}
+        for sample in self.dump() if samples is None else samples:
+            families.setdefault(self._family(sample[0]), []).append(sample)
+
+        lines: list[str] = []
+        for family, family_samples in families.items():
+            metric = self.get(family)
+            if metric is not None:
+                lines.append(f"# HELP {family} {_escape(metric.help, quote=False)}")
+                lines.append(f"# TYPE {family} {metric.TYPE}")
+            for name, labels, value in family_samples:
+                rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                lines.append(f"{name}{{{rendered}}} {_format_value(value)}" if rendered else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def combine_samples(self, dumps: Mapping[str, list[Sample]]) -> list[Sample]:
+        """Like ``combine`` but returns samples, ready for ``exposition``."""
+        merged: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        for process, samples in dumps.items():
+            for name, labels, value in samples:
+                metric = self.get(name)
+                mode = getattr(metric, "multiprocess_mode", "sum")
+                if mode == "all":
+                    labels = {**labels, "process": process}
+                key = (name, tuple(labels.items()))
+                if key in merged and mode == "max":
+                    merged[key] = max(merged[key], value)
+                else:
+                    merged[key] = merged.get(key, 0.0) + value
+        return [(name, dict(labels), value) for (name, labels), value in merged.items()]
+
+    def _family(self, sample_name: str) -> str:
+        if sample_name in self._metrics:
+            return sample_name
+        for suffix in ("_bucket", "_sum", "_count"):
+            base = sample_name.removesuffix(suffix)
+            if base != sample_name and isinstance(self._metrics.get(base), Histogram):
+                return base
+        return sample_name
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+def _escape(value: str, quote: bool = True) -> str:
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _flatten(samples: Iterable[Sample]) -> dict[str, float]:
+    out: dict[str, float] = {}
+    for name, labels, value in samples:
+        suffix = ",".join(f'{k}="{v}"' for k, v in labels.items())
+        out[f"{name}{{{suffix}}}" if suffix else name] = value
+    return out
+
+
+REGISTRY = Registry()
+
+
+# ── Outbox throughput (per consumer) ──────────────────────────────
+outbox_backlog = Gauge(
+    "outbox_backlog_events",
+    "Unprocessed outbox deliveries that are due now (sampled).",
+    labelnames=("consumer",),
+    multiprocess_mode="max",
+)
+outbox_drain_rate = Gauge(
+    "outbox_drain_rate_events_per_second",
+    "Events completed per second over the recent window.",
+    labelnames=("consumer",),
+)
+outbox_batch_size = Gauge(
+    "outbox_batch_size",
+    "Current adaptive claim batch size.",
+    labelnames=("consumer",),
+    multiprocess_mode="all",
+)
+outbox_lag = Gauge(
+    "outbox_lag_seconds",
+    "Age of the oldest unprocessed outbox delivery (sampled).",
+    labelnames=("consumer",),
+    multiprocess_mode="max",
+)
+
+# ── Event handling (per consumer and event type) ──────────────────
+outbox_events = Counter(
+    "outbox_events_total",
+    "Outbox deliveries handled, by outcome (processed, retry, dead_letter, skipped).",
+    labelnames=("consumer", "event_type", "outcome"),
+)
+notifications_suppressed = Counter(
+    "notifications_suppressed_total",
+    "System-originated events (e.g. saga compensation) delivered without a notification.",
+    labelnames=("event_type",),
+)
+outbox_default_partition_events = Gauge(
+    "outbox_default_partition_events",
+    "Events in outbox_default (sampled, capped at 1000); should be 0.",
+    multiprocess_mode="max",
+)
+coalesced_calls_saved = Counter(
+    "coalesced_calls_saved_total",
+    "External calls and writes avoided by merging events for the same device within a batch.",
+    labelnames=("consumer", "call"),
+)
+outbox_handler_duration = Histogram(
+    "outbox_handler_duration_seconds",
+    "Time spent handling one outbox delivery.",
+    labelnames=("consumer", "event_type"),
+)
+
+# ── Dependencies ──────────────────────────────────────────────────
+circuit_breaker_state = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    labelnames=("name",),
+    multiprocess_mode="max",
+)
+circuit_breaker_transitions = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes.",
+    labelnames=("name", "from_state", "to_state"),
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Database pool connections by state (in_use, idle).",
+    labelnames=("state",),
+)
+http_pool_connections = Gauge(
+    "http_pool_connections",
+    "HTTP client pool connections by client and state (in_use, idle).",
+    labelnames=("client", "state"),
+)
@@ -0,0 +1,83 @@
+"""Prometheus scrape endpoint — ``GET /metrics`` on ``METRICS_PORT``.
+
+A stdlib HTTP server on a daemon thread, so scrapes never wait on (or block)
+the worker's event loop. *render* produces the response body: a single
+worker serves ``REGISTRY.exposition()``, the supervisor serves its children's
+merged samples.
+"""
+
+import logging
+import threading
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """Serves ``render()`` at ``/metrics`` until ``stop``.
+
+    Args:
+        port: TCP port; 0 picks a free one (see ``port`` after ``start``).
+        render: returns the exposition text.
+        host: interface to bind.
+    """
+
+    def __init__(self, port: int, render: Callable[[], str], host: str = "0.0.0.0") -> None:
+        self.host = host
+        self.render = render
+        self._requested_port = port
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1] if self._server else self._requested_port
+
+    def start(self) -> bool:
+        """Start serving; returns False (after a warning) if the port cannot be bound.
+
+        Metrics are not worth refusing to process events over, so a taken
+        port leaves the worker running without the endpoint.
+        """
+        render = self.render
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = render().encode()
+                except Exception:
+                    logger.exception("Rendering metrics failed")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # one line per scrape is noise
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self._requested_port), _Handler)
+        except OSError as exc:
+            logger.warning(
+                "Cannot serve metrics on %s:%d (%s); continuing without the /metrics endpoint",
+                self.host, self._requested_port, exc,
+            )
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+        return True
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
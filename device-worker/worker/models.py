@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, Index, JSON, String
+from sqlalchemy import BigInteger, Column, DateTime, Index, JSON, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase
 
@@ -22,4 +22,18 @@ class SagaStateModel(Base):
 
     __table_args__ = (
         Index("ix_saga_state_tenant_type", "tenant_id", "saga_type"),
-    )
\ No newline at end of file
+        Index("ix_saga_state_status_updated", "status", "updated_at"),
+    )
+
+
+class CircuitBreakerModel(Base):
+    # Shared breaker state across worker replicas (worker.breaker_state).
+    __tablename__ = "circuit_breakers"
+
+    name = Column(String(64), primary_key=True)
+    state = Column(String(16), nullable=False)
+    generation = Column(BigInteger, nullable=False)
+    opened_at = Column(DateTime(timezone=True), nullable=True)
+    probe_owner = Column(String(128), nullable=True)
+    probe_until = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
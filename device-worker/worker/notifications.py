@@ -0,0 +1,97 @@
+"""Notification policy and in-batch coalescing.
+
+``NOTIFICATIONS`` maps the event types that get a plain notification email
+to its subject and body. ``device.retired`` is not among them: its email is
+sent by the retirement saga, which compensates if it cannot be delivered.
+
+``coalesce`` runs between claiming a batch and dispatching it. Consecutive
+events for one device (in outbox order) that the policy notifies about and
+that go to the same user are merged into one *lead* row, the run's last
+event, whose payload lists every merged event type in ``coalesced``. The
+handler sends one combined email for the lead; the other events of the run
+are *absorbed* and share the lead's outcome, so a failure retries the whole
+run; each event still counts its own attempts towards dead-lettering. Any
+other event (a saga, a system-originated event) ends the run.
+
+Each merged event saves one email, counted in ``coalesced_calls_saved_total``.
+Its email lookup is not counted: the ``EmailResolver`` cache would have
+served it anyway.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, field, replace
+from uuid import UUID
+
+from worker import metrics
+from worker.dispatcher import ordering_key
+from worker.outbox import OutboxRow, is_system_originated
+
+NOTIFICATIONS: dict[str, tuple[str, str]] = {
+    "device.created": ("Device registered", "Your device has been registered."),
+    "device.activated": ("Device activated", "Your device is active."),
+}
+
+
+def message_for(event_types: Sequence[str]) -> tuple[str, str] | None:
+    """Subject and body for one or more (merged) events; None if none is notified."""
+    known = [NOTIFICATIONS[t] for t in dict.fromkeys(event_types) if t in NOTIFICATIONS]
+    if not known:
+        return None
+    if len(known) == 1:
+        return known[0]
+    return "Device updates", " ".join(body for _subject, body in known)
+
+
+@dataclass
+class CoalescedBatch:
+    # What to dispatch: untouched events plus one lead per merged run, in outbox order.
+    rows: list[OutboxRow]
+    # Lead id → the run's other events, which take the lead's outcome.
+    absorbed: dict[UUID, list[OutboxRow]] = field(default_factory=dict)
+
+    @property
+    def calls_saved(self) -> int:
+        return sum(len(rows) for rows in self.absorbed.values())
+
+
+def coalesce(rows: Sequence[OutboxRow], consumer: str = "notification") -> CoalescedBatch:
+    """Merge runs of notified events per device and recipient (see module docs).
+
+    The calls saved are counted under *consumer*.
+    """
+    runs: dict[str, list[OutboxRow]] = {}
+    order: list[list[OutboxRow]] = []
+    for row in rows:
+        key = ordering_key(row)
+        run = runs.get(key)
+        if run is not None and _mergeable(row) and _mergeable(run[-1]) and _recipient(row) == _recipient(run[-1]):
+            run.append(row)
+            continue
+        run = [row]
+        runs[key] = run
+        order.append(run)
+
+    batch = CoalescedBatch(rows=[])
+    for run in order:
+        if len(run) == 1:
+            batch.rows.append(run[0])
+            continue
+        last = run[-1]
+        lead = replace(last, payload={**last.payload, "coalesced": [r.event_type for r in run]})
+        batch.rows.append(lead)
+        batch.absorbed[lead.id] = run[:-1]
+    # Leads take the position of their run's last event.
+    batch.rows.sort(key=lambda r: r.created_at)
+
+    saved = batch.calls_saved
+    if saved:
+        metrics.coalesced_calls_saved.inc(saved, consumer=consumer, call="email")
+    return batch
+
+
+def _mergeable(row: OutboxRow) -> bool:
+    return row.event_type in NOTIFICATIONS and not is_system_originated(row.payload) and bool(_recipient(row))
+
+
+def _recipient(row: OutboxRow) -> str | None:
+    return row.payload.get("user_id")
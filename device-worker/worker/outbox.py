@@ -1,7 +1,52 @@
+"""Outbox claim protocol.
+
+Every outbox event is fanned out (by device-service, in the inserting
+transaction) into one ``outbox_deliveries`` row per registered consumer. Each
+consumer — e.g. ``projection`` and ``notification`` — claims, retries and
+completes its own delivery rows, so a slow or failing consumer never holds
+back the others.
+
+A worker claims a batch with one short ``UPDATE ... RETURNING`` that stamps
+``claimed_by`` and ``lease_until``; no transaction stays open while the
+events' side effects run. Results are committed afterwards in short
+per-event transactions guarded by ``claimed_by``, so a worker whose lease
+expired (and whose rows were re-claimed elsewhere) cannot overwrite the new
+owner's progress.
+
+Every failed attempt is appended to the delivery's ``errors`` history. A
+delivery that runs out of attempts is moved, with that history, to
+``outbox_dead_letter`` (see ``worker.replay`` for putting it back).
+
+Event payloads carry an ``origin`` marker: ``user`` for requests made by a
+person, ``system`` for the platform's own follow-ups (saga compensation),
+which also carry the ``causation_id`` of the event that caused them.
+System-originated events are projected but never notified about.
+
+Failed deliveries are rescheduled through ``next_attempt_at``; the claim scan
+only considers rows that are due, via the partial index
+``ix_outbox_deliveries_pending`` (``WHERE processed_at IS NULL``). In sharding
+mode the scan is further restricted to the worker's tenant-hash partitions
+(see ``worker.sharding``), served by ``ix_outbox_deliveries_pending_partition``.
+
+Events for one device are delivered in outbox order across batches too: a
+delivery is not claimed while an earlier pending delivery for the same
+device (and consumer) is scheduled after it — waiting out a retry delay —
+or leased to a worker. An earlier delivery that is due sorts ahead of it and
+is claimed in the same batch, where the dispatcher keeps the two in order.
+The lookup is served by ``ix_outbox_deliveries_pending_device``.
+"""
+
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
 
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+ORIGIN_USER = "user"
+ORIGIN_SYSTEM = "system"
+
 
 @dataclass(frozen=True)
 class OutboxRow:
@@ -9,4 +54,245 @@ class OutboxRow:
     tenant_id: UUID
     event_type: str
     payload: dict
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+    attempts: int = 0
+
+
+def is_system_originated(payload: dict) -> bool:
+    """True for events the platform emitted on its own (no person to notify)."""
+    return payload.get("origin") == ORIGIN_SYSTEM
+
+
+async def claim_batch(
+    conn: AsyncConnection,
+    consumer: str,
+    worker_id: str,
+    limit: int,
+    lease_seconds: float,
+    partitions: Sequence[int] | None = None,
+) -> list[OutboxRow]:
+    """Lease up to *limit* of *consumer*'s due deliveries, earliest scheduled first.
+
+    Deliveries queued behind an earlier one for the same device that is
+    not claimable with them are held back (see module docs).
+    *partitions* restricts the claim to those tenant-hash partitions; None
+    claims from all of them.
+    """
+    params = {"consumer": consumer, "worker_id": worker_id, "limit": limit, "lease_seconds": lease_seconds}
+    partition_filter = ""
+    if partitions is not None:
+        if not partitions:
+            return []
+        partition_filter = "AND partition = ANY(CAST(:partitions AS smallint[]))"
+        params["partitions"] = list(partitions)
+
+    result = await conn.execute(
+        text(
+            f"""
+            UPDATE outbox_deliveries
+            SET claimed_by = :worker_id,
+                lease_until = now() + make_interval(secs => :lease_seconds)
+            WHERE consumer = :consumer
+              AND outbox_id IN (
+                SELECT outbox_id
+                FROM outbox_deliveries d
+                WHERE consumer = :consumer
+                  AND processed_at IS NULL
+                  AND next_attempt_at <= now()
+                  AND (lease_until IS NULL OR lease_until < now())
+                  {partition_filter}
+                  AND NOT EXISTS (
+                    SELECT 1
+                    FROM outbox_deliveries e
+                    WHERE e.consumer = d.consumer
+                      AND e.tenant_id = d.tenant_id
+                      AND e.payload->>'device_id' = d.payload->>'device_id'
+                      AND e.processed_at IS NULL
+                      AND e.created_at < d.created_at
+                      AND (e.next_attempt_at > d.next_attempt_at OR e.lease_until >= now())
+                  )
+                ORDER BY next_attempt_at ASC, created_at ASC
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING outbox_id, tenant_id, event_type, payload, created_at, attempts
+            """
+        ),
+        params,
+    )
+    rows = [
+        OutboxRow(
+            id=r.outbox_id,
+            tenant_id=r.tenant_id,
+            event_type=r.event_type,
+            payload=r.payload,
+            created_at=r.created_at,
+            attempts=int(r.attempts),
+        )
+        for r in result.fetchall()
+    ]
+    # RETURNING does not preserve the subquery's ORDER BY; dispatch needs
+    # outbox order so per-device events stay sequential.
+    rows.sort(key=lambda r: r.created_at)
+    return rows
+
+
+async def mark_processed(
+    conn: AsyncConnection,
+    consumer: str,
+    row_id: UUID,
+    worker_id: str,
+    now: datetime,
+) -> bool:
+    """Returns False if the lease was lost to another worker."""
+    result = await conn.execute(
+        text(
+            """
+            UPDATE outbox_deliveries
+            SET processed_at = :now, claimed_by = NULL, lease_until = NULL
+            WHERE outbox_id = :id AND consumer = :consumer AND claimed_by = :worker_id
+            """
+        ),
+        {"id": row_id, "consumer": consumer, "worker_id": worker_id, "now": now},
+    )
+    return result.rowcount == 1
+
+
+async def mark_failed(
+    conn: AsyncConnection,
+    consumer: str,
+    row_id: UUID,
+    worker_id: str,
+    attempts: int,
+    error: str | None,
+    next_attempt_at: datetime,
+) -> bool:
+    """Record a failed attempt, schedule the retry and release the lease.
+
+    Returns False if the lease was lost to another worker.
+    """
+    result = await conn.execute(
+        text(
+            """
+            UPDATE outbox_deliveries
+            SET attempts = CAST(:attempts AS integer),
+                last_error = CAST(:err AS text),
+                errors = errors || jsonb_build_array(jsonb_build_object(
+                    'attempt', CAST(:attempts AS integer), 'error', CAST(:err AS text), 'at', now()
+                )),
+                next_attempt_at = :next_attempt_at,
+                claimed_by = NULL,
+                lease_until = NULL
+            WHERE outbox_id = :id AND consumer = :consumer AND claimed_by = :worker_id
+            """
+        ),
+        {
+            "id": row_id,
+            "consumer": consumer,
+            "worker_id": worker_id,
+            "attempts": attempts,
+            "err": error,
+            "next_attempt_at": next_attempt_at,
+        },
+    )
+    return result.rowcount == 1
+
+
+async def dead_letter(
+    conn: AsyncConnection,
+    consumer: str,
+    row_id: UUID,
+    worker_id: str,
+    attempts: int,
+    error: str | None,
+    now: datetime,
+) -> bool:
+    """Move a delivery that ran out of attempts to ``outbox_dead_letter``.
+
+    The final error is appended to the delivery's error history. Returns False
+    if the lease was lost to another worker.
+    """
+    result = await conn.execute(
+        text(
+            """
+            WITH moved AS (
+                DELETE FROM outbox_deliveries
+                WHERE outbox_id = :id AND consumer = :consumer AND claimed_by = :worker_id
+                RETURNING outbox_id, consumer, tenant_id, event_type, payload, created_at, errors
+            )
+            INSERT INTO outbox_dead_letter
+                (outbox_id, consumer, tenant_id, event_type, payload, created_at,
+                 attempts, last_error, errors, dead_lettered_at)
+            SELECT outbox_id, consumer, tenant_id, event_type, payload, created_at,
+                   CAST(:attempts AS integer), CAST(:err AS text),
+                   errors || jsonb_build_array(jsonb_build_object(
+                       'attempt', CAST(:attempts AS integer),
+                       'error', CAST(:err AS text),
+                       'at', CAST(:now AS timestamptz)
+                   )),
+                   CAST(:now AS timestamptz)
+            FROM moved
+            ON CONFLICT (outbox_id, consumer) DO UPDATE SET
+                attempts = EXCLUDED.attempts,
+                last_error = EXCLUDED.last_error,
+                errors = outbox_dead_letter.errors || EXCLUDED.errors,
+                dead_lettered_at = EXCLUDED.dead_lettered_at
+            """
+        ),
+        {
+            "id": row_id,
+            "consumer": consumer,
+            "worker_id": worker_id,
+            "attempts": attempts,
+            "err": error,
+            "now": now,
+        },
+    )
+    return result.rowcount == 1
+
+
+async def release(
+    conn: AsyncConnection,
+    consumer: str,
+    row_id: UUID,
+    worker_id: str,
+    retry_at: datetime | None = None,
+) -> bool:
+    """Give a claimed delivery back without counting an attempt.
+
+    *retry_at* defers the delivery; None leaves it due immediately.
+    """
+    result = await conn.execute(
+        text(
+            """
+            UPDATE outbox_deliveries
+            SET claimed_by = NULL,
+                lease_until = NULL,
+                next_attempt_at = COALESCE(:retry_at, next_attempt_at)
+            WHERE outbox_id = :id AND consumer = :consumer AND claimed_by = :worker_id
+            """
+        ),
+        {"id": row_id, "consumer": consumer, "worker_id": worker_id, "retry_at": retry_at},
+    )
+    return result.rowcount == 1
+
+
+async def backlog(conn: AsyncConnection, consumer: str) -> tuple[int, datetime | None]:
+    """*consumer*'s due deliveries, and the ``created_at`` of its oldest unprocessed one.
+
+    Both are served by ix_outbox_deliveries_pending.
+    """
+    result = await conn.execute(
+        text(
+            """
+            SELECT count(*) FILTER (WHERE next_attempt_at <= now()) AS due,
+                   min(created_at) AS oldest
+            FROM outbox_deliveries
+            WHERE consumer = :consumer
+              AND processed_at IS NULL
+            """
+        ),
+        {"consumer": consumer},
+    )
+    row = result.one()
+    return int(row.due), row.oldest
@@ -1,87 +1,225 @@
+import asyncio
 import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Any
+from uuid import UUID
 
-import httpx
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
-from worker.circuit_breaker import CircuitBreaker
-from worker.settings import settings
+from worker import metrics
+from worker.email_cache import EmailResolver
+from worker.outbox import OutboxRow
 
 logger = logging.getLogger(__name__)
 
+PROJECTED_EVENTS = ("device.created", "device.retired", "device.activated")
 
-def _http_client() -> httpx.AsyncClient:
-    return httpx.AsyncClient(
-        timeout=httpx.Timeout(
-            settings.http_timeout,
-            connect=settings.http_connect_timeout,
+
+@dataclass(frozen=True)
+class DeviceSnapshot:
+    """Device state carried in the ``device`` key of an outbox payload."""
+
+    id: UUID
+    tenant_id: UUID
+    mac_address: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    version: int
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> "DeviceSnapshot | None":
+        """Parse the snapshot, or None for events emitted before snapshots existed."""
+        data = payload.get("device")
+        if not isinstance(data, dict):
+            return None
+        return cls(
+            id=UUID(data["id"]),
+            tenant_id=UUID(data["tenant_id"]),
+            mac_address=data["mac_address"],
+            status=data["status"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            updated_at=datetime.fromisoformat(data["updated_at"]),
+            version=int(data["version"]),
         )
-    )
 
 
-async def resolve_user_email(
-    user_id: str,
-    tenancy_breaker: CircuitBreaker,
-) -> str | None:
-    """Resolve email from Tenancy Service via circuit breaker. Returns None if not found."""
+async def project_batch(
+    engine: AsyncEngine,
+    emails: EmailResolver,
+    rows: Sequence[OutboxRow],
+) -> dict[UUID, Exception]:
+    """Project a claimed batch into device_read_model with one upsert.
 
-    async def _call() -> str | None:
-        async with _http_client() as client:
-            res = await client.get(
-                f"{settings.tenancy_service_url}/internal/user-email/{user_id}",
-                headers={"x-internal-token": settings.tenancy_service_token},
-            )
-            if res.status_code != 200:
-                return None
-            return res.json().get("email")
+    Events for the same device collapse into the newest device snapshot
+    carried in their payloads, so projection only touches the database.
+    The upsert is guarded by ``version`` so a stale snapshot never overwrites
+    a newer projection.
 
-    return await tenancy_breaker.call(_call)
+    Owner emails (for ``device.created``) are taken from the email cache
+    only; the upsert writes NULL for the rest, which never overwrites a
+    known email. Once the projection has committed, the missing emails are
+    filled in best-effort (see ``_backfill_owner_emails``), so a tenancy
+    outage delays the owner email but never the projection.
 
+    Events emitted before payloads carried snapshots fall back to reading the
+    current row from ``devices``.
+
+    Writes avoided by the collapsing are counted in
+    ``coalesced_calls_saved_total``.
+
+    Returns the outbox ids whose projection failed, mapped to the error.
+    """
+    groups: dict[UUID, list[OutboxRow]] = {}
+    snapshots: dict[UUID, DeviceSnapshot] = {}
+    owners: dict[UUID, str] = {}
+    for row in sorted(rows, key=lambda r: r.created_at):
+        if row.event_type not in PROJECTED_EVENTS:
+            continue
+        try:
+            device_id = UUID(str(row.payload.get("device_id")))
+            snapshot = DeviceSnapshot.from_payload(row.payload)
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Outbox id=%s has an unusable device payload: %s", row.id, exc)
+            continue
+        groups.setdefault(device_id, []).append(row)
+        if snapshot is not None:
+            latest = snapshots.get(device_id)
+            if latest is None or snapshot.version >= latest.version:
+                snapshots[device_id] = snapshot
+        user_id = row.payload.get("user_id")
+        if row.event_type == "device.created" and user_id:
+            owners[device_id] = user_id
+
+    failures: dict[UUID, Exception] = {}
+    if not groups:
+        return failures
+
+    owner_emails = {d: emails.peek(owners[d]) if d in owners else None for d in groups}
+    from_payload = [d for d in groups if d in snapshots]
+    from_devices = [d for d in groups if d not in snapshots]
+    try:
+        async with engine.begin() as conn:
+            if from_payload:
+                await _upsert_snapshots(
+                    conn,
+                    [snapshots[d] for d in from_payload],
+                    [owner_emails[d] for d in from_payload],
+                )
+            if from_devices:
+                await _upsert_from_devices(conn, from_devices, [owner_emails[d] for d in from_devices])
+    except Exception as exc:
+        logger.warning("Batch projection of %d device(s) failed: %s", len(groups), exc)
+        for group in groups.values():
+            for row in group:
+                failures[row.id] = exc
+        return failures
+
+    collapsed = sum(len(group) for group in groups.values())
+    if collapsed > len(groups):
+        metrics.coalesced_calls_saved.inc(collapsed - len(groups), consumer="projection", call="projection_write")
+    logger.info("Projected %d event(s) onto %d device(s)", collapsed, len(groups))
+
+    missing = {d: u for d, u in owners.items() if owner_emails[d] is None}
+    if missing:
+        await _backfill_owner_emails(engine, emails, missing)
+    return failures
 
-async def project_event(
-    conn: AsyncConnection,
-    event_type: str,
-    payload: dict[str, Any],
-    tenancy_breaker: CircuitBreaker,
-) -> None:
-    """Update the device_read_model based on an outbox event."""
 
-    device_id = payload.get("device_id")
-    if not device_id:
+async def _backfill_owner_emails(engine: AsyncEngine, emails: EmailResolver, owners: dict[UUID, str]) -> None:
+    """Resolve owner emails the cache did not have and set them where still NULL.
+
+    Best-effort: a failed lookup or write is logged and the email stays NULL.
+    """
+    user_ids = sorted(set(owners.values()))
+    lookups = await asyncio.gather(*(emails.resolve(u) for u in user_ids), return_exceptions=True)
+    resolved = dict(zip(user_ids, lookups))
+    found = {d: resolved[u] for d, u in owners.items() if isinstance(resolved[u], str)}
+    errors = [r for r in lookups if isinstance(r, Exception)]
+    if errors:
+        logger.warning("Owner email lookup failed for %d user(s), leaving it unset: %s", len(errors), errors[0])
+    if not found:
         return
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    """
+                    UPDATE device_read_model m
+                    SET owner_email = v.owner_email
+                    FROM unnest(CAST(:device_ids AS uuid[]), CAST(:owner_emails AS text[])) AS v(device_id, owner_email)
+                    WHERE m.id = v.device_id AND m.owner_email IS NULL
+                    """
+                ),
+                {"device_ids": list(found), "owner_emails": list(found.values())},
+            )
+    except Exception as exc:
+        logger.warning("Owner email backfill for %d device(s) failed: %s", len(found), exc)
 
-    if event_type == "device.created":
-        user_id = payload.get("user_id")
-        owner_email = await resolve_user_email(user_id, tenancy_breaker) if user_id else None
-
-        await conn.execute(
-            text(
-                """
-                INSERT INTO device_read_model (id, tenant_id, mac_address, status, owner_email, created_at, updated_at, version)
-                SELECT d.id, d.tenant_id, d.mac_address, d.status, :owner_email, d.created_at, d.updated_at, d.version
-                FROM devices d
-                WHERE d.id = :device_id
-                ON CONFLICT (id) DO UPDATE SET
-                    status = EXCLUDED.status,
-                    owner_email = COALESCE(:owner_email, device_read_model.owner_email),
-                    updated_at = EXCLUDED.updated_at,
-                    version = EXCLUDED.version
-                """
-            ),
-            {"device_id": device_id, "owner_email": owner_email},
-        )
 
-    elif event_type in ("device.retired", "device.activated"):
-        await conn.execute(
-            text(
-                """
-                UPDATE device_read_model
-                SET status = d.status, updated_at = d.updated_at, version = d.version
-                FROM devices d
-                WHERE device_read_model.id = :device_id
-                  AND d.id = :device_id
-                """
-            ),
-            {"device_id": device_id},
-        )
+async def _upsert_snapshots(
+    conn: AsyncConnection,
+    snapshots: list[DeviceSnapshot],
+    owner_emails: list[str | None],
+) -> None:
+    await conn.execute(
+        text(
+            """
+            INSERT INTO device_read_model (id, tenant_id, mac_address, status, owner_email, created_at, updated_at, version)
+            SELECT *
+            FROM unnest(
+                CAST(:ids AS uuid[]),
+                CAST(:tenant_ids AS uuid[]),
+                CAST(:mac_addresses AS text[]),
+                CAST(:statuses AS text[]),
+                CAST(:owner_emails AS text[]),
+                CAST(:created_ats AS timestamptz[]),
+                CAST(:updated_ats AS timestamptz[]),
+                CAST(:versions AS integer[])
+            )
+            ON CONFLICT (id) DO UPDATE SET
+                status = EXCLUDED.status,
+                owner_email = COALESCE(EXCLUDED.owner_email, device_read_model.owner_email),
+                updated_at = EXCLUDED.updated_at,
+                version = EXCLUDED.version
+            WHERE device_read_model.version <= EXCLUDED.version
+            """
+        ),
+        {
+            "ids": [s.id for s in snapshots],
+            "tenant_ids": [s.tenant_id for s in snapshots],
+            "mac_addresses": [s.mac_address for s in snapshots],
+            "statuses": [s.status for s in snapshots],
+            "owner_emails": owner_emails,
+            "created_ats": [s.created_at for s in snapshots],
+            "updated_ats": [s.updated_at for s in snapshots],
+            "versions": [s.version for s in snapshots],
+        },
+    )
+
+
+async def _upsert_from_devices(
+    conn: AsyncConnection,
+    device_ids: list[UUID],
+    owner_emails: list[str | None],
+) -> None:
+    await conn.execute(
+        text(
+            """
+            INSERT INTO device_read_model (id, tenant_id, mac_address, status, owner_email, created_at, updated_at, version)
+            SELECT d.id, d.tenant_id, d.mac_address, d.status, v.owner_email, d.created_at, d.updated_at, d.version
+            FROM unnest(CAST(:device_ids AS uuid[]), CAST(:owner_emails AS text[])) AS v(device_id, owner_email)
+            JOIN devices d ON d.id = v.device_id
+            ON CONFLICT (id) DO UPDATE SET
+                status = EXCLUDED.status,
+                owner_email = COALESCE(EXCLUDED.owner_email, device_read_model.owner_email),
+                updated_at = EXCLUDED.updated_at,
+                version = EXCLUDED.version
+            WHERE device_read_model.version <= EXCLUDED.version
+            """
+        ),
+        {"device_ids": device_ids, "owner_emails": owner_emails},
+    )
@@ -0,0 +1,183 @@
+"""Per-dependency rate limiting and bulkheads.
+
+Draining a backlog used to call Resend and tenancy-service as fast as the
+dispatcher allowed; the resulting 429s counted as breaker failures and the
+open breaker slowed the drain further. Each dependency now gets a
+``DependencyLimiter``:
+
+- a token bucket holding calls to ``rate`` per second (bursts up to ``burst``);
+- a bulkhead capping concurrent calls at ``max_concurrent``.
+
+Callers wait their turn (first come, first served) instead of failing. Use
+the limiter *outside* the circuit breaker, so time spent queueing is not
+mistaken for a slow dependency::
+
+    async with email_limiter:
+        await email_breaker.call(send)
+
+Give the limiter that breaker too: callers then fail fast with
+``CircuitOpenError`` while it is open, both on entry and once their turn
+comes, instead of spending tokens and queue time on calls it will refuse.
+
+Queue depth, in-flight calls and wait time are exported per dependency.
+Neither primitive binds to an event loop, so module-level limiters are safe.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from worker.circuit_breaker import CircuitBreaker
+from worker.metrics import Gauge, Histogram
+
+dependency_queue_depth = Gauge(
+    "dependency_queue_depth",
+    "Calls waiting for a rate-limit token or bulkhead slot.",
+    labelnames=("dependency",),
+)
+dependency_in_flight = Gauge(
+    "dependency_in_flight",
+    "Calls currently holding a bulkhead slot.",
+    labelnames=("dependency",),
+)
+dependency_wait = Histogram(
+    "dependency_wait_seconds",
+    "Time a call waited before being let through to the dependency.",
+    labelnames=("dependency",),
+)
+
+
+class TokenBucket:
+    """Async token bucket; each caller reserves a token and sleeps until it is due.
+
+    Reservations are handed out in call order, so waiters are served FIFO.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._tokens += 1  # give the reservation back
+            raise
+
+    def _reserve(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class Bulkhead:
+    """At most *max_concurrent* holders; further callers queue FIFO."""
+
+    def __init__(self, max_concurrent: int) -> None:
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self._in_use = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    async def acquire(self) -> None:
+        if self._in_use < self.max_concurrent and not self._waiters:
+            self._in_use += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter  # release() hands its slot over
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot arrived as we were cancelled
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_use -= 1
+
+
+class DependencyLimiter:
+    """Rate limit plus bulkhead for one dependency, used as ``async with``.
+
+    Args:
+        name: dependency label for metrics.
+        rate: calls per second; None for no rate limit.
+        burst: calls allowed back to back after an idle period.
+        max_concurrent: concurrent calls; None for no bulkhead.
+        breaker: the dependency's circuit breaker; while it refuses calls,
+            entering the limiter raises ``CircuitOpenError`` instead of queueing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float | None = None,
+        burst: int = 1,
+        max_concurrent: int | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.name = name
+        self.breaker = breaker
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.bulkhead = Bulkhead(max_concurrent) if max_concurrent else None
+        self._queued = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def __aenter__(self) -> "DependencyLimiter":
+        if self.breaker is not None:
+            self.breaker.raise_if_open()
+        started = time.monotonic()
+        self._set_queued(1)
+        try:
+            if self.bulkhead is not None:
+                await self.bulkhead.acquire()
+            try:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+            except BaseException:
+                if self.bulkhead is not None:
+                    self.bulkhead.release()
+                raise
+        finally:
+            self._set_queued(-1)
+        if self.breaker is not None:
+            try:
+                self.breaker.raise_if_open()  # it may have opened while we queued
+            except BaseException:
+                if self.bulkhead is not None:
+                    self.bulkhead.release()
+                raise
+        dependency_wait.observe(time.monotonic() - started, dependency=self.name)
+        dependency_in_flight.inc(dependency=self.name)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.bulkhead is not None:
+            self.bulkhead.release()
+        dependency_in_flight.dec(dependency=self.name)
+
+    def _set_queued(self, delta: int) -> None:
+        self._queued += delta
+        dependency_queue_depth.set(self._queued, dependency=self.name)
@@ -0,0 +1,167 @@
+"""Bulk replay of dead-lettered outbox deliveries — ``worker replay``.
+
+Selected rows are moved from ``outbox_dead_letter`` back into
+``outbox_deliveries`` in chunks. Each chunk is one transaction: it deletes
+the dead letters and inserts fresh deliveries (attempts reset, error history
+kept), then notifies the workers. Between chunks the replay sleeps long
+enough to hold ``rate`` events per second (0 for no limit), so replaying
+after an outage does not flood the dependency that caused it.
+
+    worker replay --event-type device.created --since 2026-03-01T00:00:00Z --rate 20
+    worker replay --tenant <uuid> --consumer notification --dry-run
+"""
+
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from worker.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReplayFilter:
+    tenant_id: UUID | None = None
+    event_type: str | None = None
+    consumer: str | None = None
+    since: datetime | None = None  # on the event's created_at
+    until: datetime | None = None
+
+    def where(self) -> tuple[str, dict[str, Any]]:
+        clauses = ["TRUE"]
+        params: dict[str, Any] = {}
+        if self.tenant_id is not None:
+            clauses.append("tenant_id = :tenant_id")
+            params["tenant_id"] = self.tenant_id
+        if self.event_type is not None:
+            clauses.append("event_type = :event_type")
+            params["event_type"] = self.event_type
+        if self.consumer is not None:
+            clauses.append("consumer = :consumer")
+            params["consumer"] = self.consumer
+        if self.since is not None:
+            clauses.append("created_at >= :since")
+            params["since"] = self.since
+        if self.until is not None:
+            clauses.append("created_at < :until")
+            params["until"] = self.until
+        return " AND ".join(clauses), params
+
+
+async def count_dead_letters(conn: AsyncConnection, selection: ReplayFilter) -> int:
+    where, params = selection.where()
+    result = await conn.execute(text(f"SELECT count(*) FROM outbox_dead_letter WHERE {where}"), params)
+    return int(result.scalar_one())
+
+
+async def replay_chunk(conn: AsyncConnection, selection: ReplayFilter, limit: int) -> int:
+    """Move up to *limit* matching dead letters back to the live queue.
+
+    A dead letter whose delivery row still exists is not dropped: that row is
+    reset to a fresh, due delivery and the error histories are merged.
+    """
+    where, params = selection.where()
+    result = await conn.execute(
+        text(
+            f"""
+            WITH picked AS (
+                SELECT outbox_id, consumer
+                FROM outbox_dead_letter
+                WHERE {where}
+                ORDER BY created_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ),
+            moved AS (
+                DELETE FROM outbox_dead_letter d
+                USING picked p
+                WHERE d.outbox_id = p.outbox_id AND d.consumer = p.consumer
+                RETURNING d.outbox_id, d.consumer, d.tenant_id, d.event_type, d.payload, d.created_at, d.errors
+            )
+            INSERT INTO outbox_deliveries
+                (outbox_id, consumer, tenant_id, event_type, payload, created_at, attempts, errors, next_attempt_at)
+            SELECT outbox_id, consumer, tenant_id, event_type, payload, created_at, 0, errors, now()
+            FROM moved
+            ON CONFLICT (outbox_id, consumer) DO UPDATE SET
+                attempts = 0,
+                next_attempt_at = now(),
+                processed_at = NULL,
+                claimed_by = NULL,
+                lease_until = NULL,
+                errors = outbox_deliveries.errors || EXCLUDED.errors
+            """
+        ),
+        {**params, "limit": limit},
+    )
+    return result.rowcount
+
+
+async def replay(
+    engine: AsyncEngine,
+    selection: ReplayFilter,
+    chunk_size: int = 500,
+    rate: float = 50.0,
+    dry_run: bool = False,
+) -> int:
+    """Replay matching dead letters; returns how many were moved (or would be, on a dry run)."""
+    if dry_run:
+        async with engine.connect() as conn:
+            return await count_dead_letters(conn, selection)
+
+    loop = asyncio.get_running_loop()
+    total = 0
+    while True:
+        started = loop.time()
+        async with engine.begin() as conn:
+            moved = await replay_chunk(conn, selection, chunk_size)
+            if moved:
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": settings.outbox_notify_channel, "payload": "replay"},
+                )
+        total += moved
+        if moved:
+            logger.info("Replayed %d dead letter(s) (%d total)", moved, total)
+        if moved < chunk_size:
+            return total
+        # Hold the configured rate across chunks (0 = unlimited).
+        if rate > 0:
+            await asyncio.sleep(max(0.0, moved / rate - (loop.time() - started)))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tenant", type=UUID, help="only this tenant's events")
+    parser.add_argument("--event-type", help="only this event type, e.g. device.created")
+    parser.add_argument("--consumer", help="only this consumer's dead letters, e.g. notification")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="events created at or after (ISO 8601)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="events created before (ISO 8601)")
+    parser.add_argument("--chunk-size", type=int, default=settings.replay_chunk_size)
+    parser.add_argument(
+        "--rate", type=float, default=settings.replay_rate_per_second, help="events per second, 0 for unlimited (default: %(default)s)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only count matching dead letters")
+
+
+async def run(args: argparse.Namespace) -> int:
+    selection = ReplayFilter(
+        tenant_id=args.tenant,
+        event_type=args.event_type,
+        consumer=args.consumer,
+        since=args.since,
+        until=args.until,
+    )
+    engine = create_async_engine(settings.database_url, pool_pre_ping=True)
+    try:
+        count = await replay(engine, selection, args.chunk_size, args.rate, args.dry_run)
+    finally:
+        await engine.dispose()
+    logger.info("%s %d dead letter(s)", "Would replay" if args.dry_run else "Replayed", count)
+    return count
@@ -0,0 +1,298 @@
+"""Outbox retention — partition upkeep, archival and removal.
+
+``outbox`` is range-partitioned by ``created_at`` into daily partitions named
+``outbox_pYYYYMMDD``, plus ``outbox_history`` (everything before partitioning
+was introduced) and ``outbox_default`` (a safety net that should stay empty).
+Each run:
+
+1. creates the daily partitions for the next ``premake_days`` days, skipping
+   days an existing range already covers (``outbox_history`` reaches up to
+   the day after partitioning was introduced);
+2. checks that ``outbox_default`` is empty: rows there block creating the
+   daily partition for their range, so any are reported (log error and the
+   ``outbox_default_partition_events`` gauge) for an operator to move out;
+3. unless expiry is off (``OUTBOX_RETENTION_ENABLED=false``), for every
+   partition that ends more than ``retention_days`` ago and has no
+   unprocessed delivery left, optionally writes its rows to
+   ``<archive_dir>/<partition>.jsonl.gz``, deletes the matching delivery
+   rows in batches, then detaches and drops the partition.
+
+Dropping a partition is a metadata operation, so old events go away without
+the bloat and vacuum cost of a bulk ``DELETE``. A session advisory lock makes
+sure only one worker process runs the job at a time.
+
+The worker runs it every ``OUTBOX_RETENTION_INTERVAL_SECONDS``, whether or
+not expiry is enabled, so future partitions always exist; for a one-off run
+use ``python -m worker.retention``.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from worker import metrics
+from worker.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows sampled when checking the default partition.
+_DEFAULT_SAMPLE = 1_000
+
+# Arbitrary but fixed key for pg_try_advisory_lock.
+_LOCK_KEY = 0x6F7574626F78  # "outbox"
+
+_DELETE_BATCH = 5_000
+_ARCHIVE_CHUNK = 1_000
+_LOWER_BOUND = re.compile(r"FROM \('([^']+)'\)")
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    upper: datetime | None  # None for the default partition
+    lower: datetime | None = None  # None for MINVALUE and the default partition
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """True if this range overlaps ``[start, end)``."""
+        if self.upper is None:
+            return False
+        return start < self.upper and (self.lower is None or end > self.lower)
+
+
+def partition_name(day: date) -> str:
+    return f"outbox_p{day:%Y%m%d}"
+
+
+def parse_lower_bound(bound: str) -> datetime | None:
+    """Lower bound of a ``pg_get_expr(relpartbound)`` range, None for DEFAULT/MINVALUE."""
+    match = _LOWER_BOUND.search(bound)
+    if match is None:
+        return None
+    return datetime.fromisoformat(match.group(1))
+
+
+def parse_upper_bound(bound: str) -> datetime | None:
+    """Upper bound of a ``pg_get_expr(relpartbound)`` range, None for DEFAULT/MAXVALUE."""
+    match = _UPPER_BOUND.search(bound)
+    if match is None:
+        return None
+    return datetime.fromisoformat(match.group(1))
+
+
+class OutboxRetention:
+    """Maintains outbox partitions.
+
+    Args:
+        engine: database engine.
+        retention_days: fully processed partitions older than this are removed.
+        premake_days: daily partitions created ahead of time.
+        archive_dir: when set, partitions are written there (gzip'd JSON lines)
+            before being dropped.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        retention_days: int = 7,
+        premake_days: int = 7,
+        archive_dir: str | None = None,
+    ) -> None:
+        self.engine = engine
+        self.retention_days = retention_days
+        self.premake_days = premake_days
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+
+    async def run_once(self, now: datetime | None = None, expire: bool = True) -> list[str]:
+        """Run one maintenance pass; returns the names of dropped partitions.
+
+        With *expire* off only future partitions are created and the default
+        partition is checked.
+        """
+        now = now or datetime.now(timezone.utc)
+        async with self.engine.connect() as conn:
+            locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_KEY})).scalar_one()
+            await conn.commit()
+            if not locked:
+                logger.info("Outbox retention already running elsewhere, skipping")
+                return []
+            try:
+                await self._premake(conn, now.date())
+                await self._check_default(conn)
+                if not expire:
+                    return []
+                return await self._expire(conn, now - timedelta(days=self.retention_days))
+            finally:
+                await conn.rollback()
+                await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+                await conn.commit()
+
+    # -- internals --------------------------------------------------
+
+    async def _premake(self, conn: AsyncConnection, today: date) -> None:
+        existing = await self._partitions(conn)
+        for offset in range(self.premake_days + 1):
+            day = today + timedelta(days=offset)
+            name = partition_name(day)
+            start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+            end = start + timedelta(days=1)
+            if any(p.name == name or p.covers(start, end) for p in existing):
+                continue
+            await conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF outbox "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            )
+            await conn.commit()
+            logger.info("Created outbox partition %s", name)
+
+    async def _check_default(self, conn: AsyncConnection) -> int:
+        """Rows (up to a sample) sitting in the default partition."""
+        stray = 0
+        for partition in await self._partitions(conn):
+            if partition.upper is not None:
+                continue
+            result = await conn.execute(
+                text(f"SELECT count(*) FROM (SELECT 1 FROM {partition.name} LIMIT :sample) s"),
+                {"sample": _DEFAULT_SAMPLE},
+            )
+            count = int(result.scalar_one())
+            await conn.commit()
+            if count:
+                logger.error(
+                    "Outbox partition %s holds %s event(s); daily partitions cannot be created for their "
+                    "range until they are moved out",
+                    partition.name, f"{count}+" if count >= _DEFAULT_SAMPLE else count,
+                )
+            stray += count
+        metrics.outbox_default_partition_events.set(stray)
+        return stray
+
+    async def _expire(self, conn: AsyncConnection, cutoff: datetime) -> list[str]:
+        dropped = []
+        for partition in await self._partitions(conn):
+            if partition.upper is None or partition.upper > cutoff:
+                continue
+            if await self._has_pending(conn, partition.upper):
+                logger.info("Outbox partition %s is past retention but still has pending deliveries", partition.name)
+                continue
+            if self.archive_dir is not None:
+                await self._archive(conn, partition.name)
+            await self._delete_deliveries(conn, partition.upper)
+            await conn.execute(text(f"ALTER TABLE outbox DETACH PARTITION {partition.name}"))
+            await conn.execute(text(f"DROP TABLE {partition.name}"))
+            await conn.commit()
+            logger.info("Dropped outbox partition %s", partition.name)
+            dropped.append(partition.name)
+        return dropped
+
+    async def _partitions(self, conn: AsyncConnection) -> list[Partition]:
+        result = await conn.execute(
+            text(
+                """
+                SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'outbox'
+                """
+            )
+        )
+        partitions = [
+            Partition(r.name, parse_upper_bound(r.bound), parse_lower_bound(r.bound)) for r in result.fetchall()
+        ]
+        await conn.commit()
+        return sorted(partitions, key=lambda p: (p.upper is None, p.upper or datetime.min))
+
+    async def _has_pending(self, conn: AsyncConnection, upper: datetime) -> bool:
+        # Ranges are contiguous and expired oldest first, so everything below
+        # *upper* belongs to this partition or one already dropped.
+        result = await conn.execute(
+            text(
+                """
+                SELECT EXISTS (
+                    SELECT 1 FROM outbox_deliveries
+                    WHERE processed_at IS NULL AND created_at < :upper
+                )
+                """
+            ),
+            {"upper": upper},
+        )
+        pending = bool(result.scalar_one())
+        await conn.commit()
+        return pending
+
+    async def _delete_deliveries(self, conn: AsyncConnection, upper: datetime) -> None:
+        while True:
+            result = await conn.execute(
+                text(
+                    """
+                    DELETE FROM outbox_deliveries
+                    WHERE ctid = ANY(ARRAY(
+                        SELECT ctid FROM outbox_deliveries
+                        WHERE created_at < :upper
+                        LIMIT :batch
+                    ))
+                    """
+                ),
+                {"upper": upper, "batch": _DELETE_BATCH},
+            )
+            await conn.commit()
+            if result.rowcount < _DELETE_BATCH:
+                return
+
+    async def _archive(self, conn: AsyncConnection, name: str) -> None:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{name}.jsonl.gz"
+        partial = path.with_suffix(".gz.partial")
+        count = 0
+        with gzip.open(partial, "wt", encoding="utf-8") as fh:
+            result = await conn.stream(
+                text(f"SELECT id, tenant_id, event_type, payload, created_at FROM {name} ORDER BY created_at")
+            )
+            async for chunk in result.partitions(_ARCHIVE_CHUNK):
+                lines = "".join(
+                    json.dumps(
+                        {
+                            "id": str(r.id),
+                            "tenant_id": str(r.tenant_id),
+                            "event_type": r.event_type,
+                            "payload": r.payload,
+                            "created_at": r.created_at.isoformat(),
+                        }
+                    )
+                    + "\n"
+                    for r in chunk
+                )
+                await asyncio.to_thread(fh.write, lines)
+                count += len(chunk)
+        await conn.commit()
+        partial.replace(path)
+        logger.info("Archived %d event(s) from %s to %s", count, name, path)
+
+
+async def _main() -> None:
+    engine = create_async_engine(settings.database_url, pool_pre_ping=True)
+    try:
+        await OutboxRetention(
+            engine,
+            retention_days=settings.outbox_retention_days,
+            premake_days=settings.outbox_partition_premake_days,
+            archive_dir=settings.outbox_archive_dir,
+        ).run_once(expire=settings.outbox_retention_enabled)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    asyncio.run(_main())
@@ -0,0 +1,352 @@
+"""Resumable, step-based sagas persisted in ``saga_state``.
+
+A saga is an ordered list of ``Step``s, each with an optional action and an
+optional compensation. The runner records progress in the saga's row after
+every completed action, so a saga interrupted by a crash resumes at
+``current_step`` instead of starting over:
+
+- ``running``: ``current_step`` is the next step to run; ``completed`` once
+  all have run.
+- an action is attempted as often as its step's ``RetryPolicy`` allows (once
+  by default); when the policy gives up the saga switches to
+  ``compensating`` with ``current_step`` set to the failed step; the
+  compensations of the steps *before* it then run in reverse order, moving
+  ``current_step`` back one step at a time, and the saga ends ``compensated``.
+- a compensation that still fails after its retries ends the saga ``failed``
+  at that step, for an operator to look at.
+
+Saga ids are derived from the triggering outbox event (``saga_id_for``), so a
+redelivered event finds its saga instead of creating a second one; finished
+sagas are not run again.
+
+``SagaRecovery`` periodically claims sagas left ``running`` or
+``compensating`` for longer than ``stale_after`` (found through
+``ix_saga_state_status_updated``) and resumes them. Claiming bumps
+``updated_at``, which doubles as the lease: steps must finish well within
+``stale_after``.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID, uuid4, uuid5
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+COMPENSATING = "compensating"
+COMPLETED = "completed"
+COMPENSATED = "compensated"
+FAILED = "failed"
+ACTIVE = (RUNNING, COMPENSATING)
+DONE = "done"
+
+_SAGA_NAMESPACE = UUID("5d6c8a57-3f5e-4c55-9a57-1c5a9f0e2b44")
+
+
+@dataclass
+class SagaState:
+    id: UUID
+    tenant_id: UUID
+    saga_type: str
+    status: str
+    current_step: str
+    payload: dict[str, Any]
+    error: str | None = None
+
+
+StepFn = Callable[[SagaState], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often a step is attempted before its failure counts.
+
+    Args:
+        max_attempts: attempts in total, including the first.
+        base_delay: backoff base; attempt *n* waits up to ``base_delay * 2**n``
+            (full jitter), capped at ``max_delay``.
+        deadline: seconds after the first attempt past which no retry starts.
+        retryable: which errors are worth another attempt; others fail at once.
+    """
+
+    max_attempts: int = 1
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: float | None = None
+    retryable: Callable[[Exception], bool] = lambda exc: True
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.base_delay * (2 ** attempt), self.max_delay))
+
+
+NO_RETRY = RetryPolicy()
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    action: StepFn | None = None
+    compensate: StepFn | None = None
+    retry: RetryPolicy = NO_RETRY
+
+
+class SagaInProgressError(Exception):
+    """The saga is being run by another worker; try again later."""
+
+
+def saga_id_for(saga_type: str, event_id: UUID | None) -> UUID:
+    """Stable saga id for the saga an outbox event starts."""
+    return uuid5(_SAGA_NAMESPACE, f"{saga_type}:{event_id}") if event_id else uuid4()
+
+
+class Saga:
+    """Base class: subclasses set ``SAGA_TYPE`` and implement ``steps``.
+
+    Args:
+        engine: database engine holding ``saga_state``.
+        stale_after: seconds without progress after which an active saga may
+            be taken over.
+    """
+
+    SAGA_TYPE = ""
+
+    def __init__(self, engine: AsyncEngine, stale_after: float = 300.0) -> None:
+        self._engine = engine
+        self.stale_after = stale_after
+
+    def steps(self) -> list[Step]:
+        raise NotImplementedError
+
+    async def run(self, saga_id: UUID, tenant_id: UUID, payload: dict[str, Any]) -> str:
+        """Create the saga (or find it) and drive it as far as it goes; returns its status.
+
+        Raises ``SagaInProgressError`` while another worker holds it.
+        """
+        state = await self._create(saga_id, tenant_id, payload)
+        if state is None:
+            state = await self._take_over(saga_id)
+        if state.status not in ACTIVE:
+            logger.info("Saga %s already %s", saga_id, state.status)
+            return state.status
+        return await self.resume(state)
+
+    async def resume(self, state: SagaState) -> str:
+        """Continue *state* from its ``current_step``; returns the final status."""
+        if state.status not in ACTIVE:
+            return state.status
+        steps = self.steps()
+        names = [step.name for step in steps]
+        position = names.index(state.current_step) if state.current_step in names else len(steps)
+
+        if state.status == RUNNING:
+            for index in range(position, len(steps)):
+                step = steps[index]
+                if step.action is None:
+                    continue
+                try:
+                    logger.info("Saga %s running step %s", state.id, step.name)
+                    await self._attempt(state, step, step.action)
+                except Exception as exc:
+                    logger.warning("Saga %s step %s failed: %s", state.id, step.name, exc)
+                    await self._save(state, COMPENSATING, step.name, str(exc))
+                    position = index
+                    break
+                following = names[index + 1] if index + 1 < len(steps) else DONE
+                await self._save(state, RUNNING if following != DONE else COMPLETED, following)
+            else:
+                if state.status != COMPLETED:
+                    await self._save(state, COMPLETED, DONE)
+                logger.info("Saga %s completed", state.id)
+                return COMPLETED
+
+        for index in range(position - 1, -1, -1):
+            step = steps[index]
+            if step.compensate is None:
+                continue
+            try:
+                logger.info("Saga %s compensating step %s", state.id, step.name)
+                await self._attempt(state, step, step.compensate)
+            except Exception as exc:
+                logger.error("Saga %s compensation of %s failed: %s", state.id, step.name, exc)
+                await self._save(state, FAILED, step.name, str(exc))
+                return FAILED
+            await self._save(state, COMPENSATING, step.name, state.error)
+        await self._save(state, COMPENSATED, DONE, state.error)
+        logger.info("Saga %s compensated", state.id)
+        return COMPENSATED
+
+    # -- internals --------------------------------------------------
+
+    async def _attempt(self, state: SagaState, step: Step, fn: StepFn) -> None:
+        policy = step.retry
+        started = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                await fn(state)
+                return
+            except Exception as exc:
+                if attempt >= policy.max_attempts or not policy.retryable(exc):
+                    raise
+                delay = policy.delay(attempt)
+                if policy.deadline is not None and time.monotonic() - started + delay > policy.deadline:
+                    raise
+                logger.warning(
+                    "Saga %s step %s attempt %d/%d failed, retrying in %.1fs: %s",
+                    state.id, step.name, attempt, policy.max_attempts, delay, exc,
+                )
+                # Keeps the saga's lease fresh and the latest error visible.
+                await self._touch(state, str(exc))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _touch(self, state: SagaState, error: str) -> None:
+        async with self._engine.begin() as conn:
+            await conn.execute(
+                text("UPDATE saga_state SET error = :error, updated_at = now() WHERE id = :id"),
+                {"id": state.id, "error": error[:512]},
+            )
+
+    async def _create(self, saga_id: UUID, tenant_id: UUID, payload: dict[str, Any]) -> SagaState | None:
+        first = self.steps()[0].name
+        async with self._engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    """
+                    INSERT INTO saga_state (id, tenant_id, saga_type, status, current_step, payload, created_at, updated_at)
+                    VALUES (:id, :tenant_id, :saga_type, 'running', :step, :payload, now(), now())
+                    ON CONFLICT (id) DO NOTHING
+                    RETURNING id
+                    """
+                ),
+                {
+                    "id": saga_id,
+                    "tenant_id": tenant_id,
+                    "saga_type": self.SAGA_TYPE,
+                    "step": first,
+                    "payload": json.dumps(payload),
+                },
+            )
+            if result.scalar_one_or_none() is None:
+                return None
+        return SagaState(saga_id, tenant_id, self.SAGA_TYPE, RUNNING, first, payload)
+
+    async def _take_over(self, saga_id: UUID) -> SagaState:
+        """An existing saga: claim it if stalled, report it if finished."""
+        async with self._engine.begin() as conn:
+            state = await claim_stale(conn, self.stale_after, saga_id=saga_id)
+            if state:
+                logger.info("Saga %s resuming at %s (%s)", saga_id, state[0].current_step, state[0].status)
+                return state[0]
+            result = await conn.execute(
+                text(f"SELECT {_COLUMNS} FROM saga_state WHERE id = :id"),
+                {"id": saga_id},
+            )
+            current = _state(result.one())
+        if current.status in ACTIVE:
+            raise SagaInProgressError(f"Saga {saga_id} is {current.status} at {current.current_step} elsewhere")
+        return current
+
+    async def _save(self, state: SagaState, status: str, step: str, error: str | None = None) -> None:
+        async with self._engine.begin() as conn:
+            await conn.execute(
+                text(
+                    """
+                    UPDATE saga_state
+                    SET status = :status, current_step = :step, error = :error, updated_at = now()
+                    WHERE id = :id
+                    """
+                ),
+                {"id": state.id, "status": status, "step": step, "error": error[:512] if error else None},
+            )
+        state.status, state.current_step, state.error = status, step, error
+
+
+_COLUMNS = "id, tenant_id, saga_type, status, current_step, payload, error"
+
+
+def _state(row) -> SagaState:
+    payload = row.payload if isinstance(row.payload, dict) else json.loads(row.payload)
+    return SagaState(row.id, row.tenant_id, row.saga_type, row.status, row.current_step, payload, row.error)
+
+
+async def claim_stale(
+    conn: AsyncConnection,
+    stale_after: float,
+    limit: int = 1,
+    saga_id: UUID | None = None,
+) -> list[SagaState]:
+    """Claim active sagas without progress for *stale_after* seconds by bumping ``updated_at``."""
+    only = "AND id = :saga_id" if saga_id is not None else ""
+    result = await conn.execute(
+        text(
+            f"""
+            UPDATE saga_state s
+            SET updated_at = now()
+            FROM (
+                SELECT id FROM saga_state
+                WHERE status IN ('running', 'compensating')
+                  AND updated_at < now() - make_interval(secs => :stale_after)
+                  {only}
+                ORDER BY updated_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) stuck
+            WHERE s.id = stuck.id
+            RETURNING s.id, s.tenant_id, s.saga_type, s.status, s.current_step, s.payload, s.error
+            """
+        ),
+        {"stale_after": stale_after, "limit": limit, "saga_id": saga_id},
+    )
+    return [_state(row) for row in result.fetchall()]
+
+
+class SagaRecovery:
+    """Resumes sagas whose worker went away.
+
+    Args:
+        engine: database engine holding ``saga_state``.
+        sagas: saga implementations, matched by ``SAGA_TYPE``.
+        stale_after: seconds without progress before a saga counts as stuck.
+        batch_size: sagas claimed per pass.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        sagas: Iterable[Saga],
+        stale_after: float = 300.0,
+        batch_size: int = 50,
+    ) -> None:
+        self.engine = engine
+        self.sagas = {saga.SAGA_TYPE: saga for saga in sagas}
+        self.stale_after = stale_after
+        self.batch_size = batch_size
+
+    async def run_once(self) -> int:
+        """Claim and resume one batch of stuck sagas; returns how many were resumed."""
+        async with self.engine.begin() as conn:
+            stuck = await claim_stale(conn, self.stale_after, limit=self.batch_size)
+        resumed = 0
+        for state in stuck:
+            saga = self.sagas.get(state.saga_type)
+            if saga is None:
+                logger.warning("Saga %s has unknown type %r, leaving it", state.id, state.saga_type)
+                continue
+            logger.info("Recovering saga %s at %s (%s)", state.id, state.current_step, state.status)
+            try:
+                await saga.resume(state)
+            except Exception as exc:
+                logger.warning("Recovering saga %s failed: %s", state.id, exc)
+                continue
+            resumed += 1
+        return resumed
@@ -1,45 +1,81 @@
-import json
 import logging
-from datetime import datetime, timezone
+from contextlib import nullcontext
 from html import escape as html_escape
 from typing import Any
 from urllib.parse import quote as url_quote
-from uuid import UUID, uuid4
+from uuid import UUID
 
 import httpx
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncConnection
-
-from worker.circuit_breaker import CircuitBreaker
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from worker.circuit_breaker import CircuitBreaker, CircuitOpenError
+from worker.devices import DeviceCommandError, activate_device
+from worker.email_batch import EmailBatcher
+from worker.email_cache import EmailLookupError, EmailResolver
+from worker.http_clients import HttpClients
+from worker.outbox import ORIGIN_SYSTEM
+from worker.ratelimit import DependencyLimiter
+from worker.saga_engine import NO_RETRY, RetryPolicy, Saga, SagaState, Step, saga_id_for
 from worker.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
-def _http_client() -> httpx.AsyncClient:
-    """Create an httpx client with configured timeouts."""
-    return httpx.AsyncClient(
-        timeout=httpx.Timeout(
-            settings.http_timeout,
-            connect=settings.http_connect_timeout,
-        )
-    )
+def is_transient(exc: Exception) -> bool:
+    """Errors a later attempt may not hit: network trouble, 5xx/429, an open breaker.
+
+    A missing address or a message the provider rejected will fail the same
+    way every time, so those are not retried.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, (httpx.TransportError, CircuitOpenError, EmailLookupError))
 
 
-class DeviceRetirementSaga:
-    """Orchestrates post-retirement side effects with compensation."""
+class DeviceRetirementSaga(Saga):
+    """Orchestrates post-retirement side effects with compensation.
+
+    Steps: ``retire`` (already done by device-service when the event was
+    written; compensated by reactivating the device), then ``notify``, which
+    is retried per *notify_retry* before its failure triggers compensation.
+    With *db_compensation* the device is reactivated directly on the worker's
+    connection (``worker.devices``); device-service's HTTP endpoint is used
+    otherwise, and as the fallback when the direct write cannot be made.
+    Saga state is written in short transactions of its own; no connection is
+    held while the notify/compensate HTTP calls are in flight.
+    """
 
     SAGA_TYPE = "device.retirement"
 
     def __init__(
         self,
-        conn: AsyncConnection,
-        tenancy_breaker: CircuitBreaker,
+        engine: AsyncEngine,
+        http: HttpClients,
+        emails: EmailResolver,
         email_breaker: CircuitBreaker,
+        email_limiter: DependencyLimiter | None = None,
+        device_service_limiter: DependencyLimiter | None = None,
+        mailer: EmailBatcher | None = None,
+        stale_after: float = 300.0,
+        notify_retry: RetryPolicy = NO_RETRY,
+        db_compensation: bool = False,
     ) -> None:
-        self._conn = conn
-        self._tenancy_breaker = tenancy_breaker
+        super().__init__(engine, stale_after=stale_after)
+        self._notify_retry = notify_retry
+        self._db_compensation = db_compensation
+        self._http = http
+        self._emails = emails
         self._email_breaker = email_breaker
+        self._email_limiter = email_limiter
+        self._device_service_limiter = device_service_limiter
+        self._mailer = mailer
+
+    def steps(self) -> list[Step]:
+        return [
+            Step("retire", compensate=self._compensate_retire),
+            Step("notify", action=self._notify, retry=self._notify_retry),
+        ]
 
     async def start(
         self,
@@ -47,123 +83,108 @@ class DeviceRetirementSaga:
         device_id: str,
         user_id: str,
         reason: str,
-    ) -> None:
-        saga_id = uuid4()
-        now = datetime.now(timezone.utc)
+        event_id: UUID | None = None,
+        version: int | None = None,
+    ) -> str:
+        """Run (or resume) the saga for the retirement event *event_id*.
+
+        *version* is the device version the retirement produced; compensation
+        only reactivates the device if it has not changed since.
+        """
         payload = {
             "device_id": device_id,
             "user_id": user_id,
             "reason": reason,
+            "version": version,
+            "event_id": str(event_id) if event_id else None,
         }
-
-        # Persist saga state
-        await self._conn.execute(
-            text(
-                """
-                INSERT INTO saga_state (id, tenant_id, saga_type, status, current_step, payload, created_at, updated_at)
-                VALUES (:id, :tenant_id, :saga_type, 'running', 'notify', :payload, :now, :now)
-                """
-            ),
-            {
-                "id": saga_id,
-                "tenant_id": tenant_id,
-                "saga_type": self.SAGA_TYPE,
-                "payload": json.dumps(payload),
-                "now": now,
-            },
+        return await self.run(saga_id_for(self.SAGA_TYPE, event_id), tenant_id, payload)
+
+    async def _notify(self, state: SagaState) -> None:
+        await self._step_notify(state.payload)
+
+    async def _compensate_retire(self, state: SagaState) -> None:
+        payload = state.payload
+        await self._step_compensate(
+            state.tenant_id,
+            payload["device_id"],
+            payload.get("reason", ""),
+            user_id=payload.get("user_id"),
+            expected_version=payload.get("version"),
+            causation_id=UUID(payload["event_id"]) if payload.get("event_id") else None,
         )
 
-        # Execute steps
-        try:
-            logger.info("Saga %s starting notify step", saga_id)
-            await self._step_notify(payload)
-            await self._update_status(saga_id, "completed", "done")
-            logger.info("Saga %s completed", saga_id)
-        except Exception as exc:
-            logger.warning("Saga %s notify failed: %s", saga_id, exc)
-            await self._update_status(saga_id, "compensating", "reactivate", str(exc))
-            try:
-                logger.info("Saga %s compensating — reactivating device", saga_id)
-                await self._step_compensate(tenant_id, device_id, reason)
-                await self._update_status(saga_id, "compensated", "done")
-                logger.info("Saga %s compensated", saga_id)
-            except Exception as comp_exc:
-                logger.error("Saga %s compensation failed: %s", saga_id, comp_exc)
-                await self._update_status(saga_id, "failed", "reactivate", str(comp_exc))
-
     async def _step_notify(self, payload: dict[str, Any]) -> None:
         """Send retirement notification email. Raises on failure."""
         user_id = payload["user_id"]
         device_id = payload["device_id"]
         reason = payload.get("reason", "No reason provided")
 
-        # Resolve email via circuit breaker
-        async def _resolve() -> str:
-            async with _http_client() as client:
-                res = await client.get(
-                    f"{settings.tenancy_service_url}/internal/user-email/{user_id}",
-                    headers={"x-internal-token": settings.tenancy_service_token},
-                )
-                if res.status_code != 200:
-                    raise RuntimeError(f"Could not resolve email for user {user_id}")
-                email = res.json().get("email")
-                if not email:
-                    raise RuntimeError(f"No email found for user {user_id}")
-                return email
-
-        email = await self._tenancy_breaker.call(_resolve)
+        # Resolve email via the shared cache (misses go through the tenancy breaker)
+        email = await self._emails.resolve(user_id)
+        if not email:
+            raise RuntimeError(f"No email found for user {user_id}")
+
+        subject = "Device retired"
+        html = f"<p>Device <code>{html_escape(device_id)}</code> was retired.</p><p>Reason: {html_escape(reason)}</p>"
+        if self._mailer is not None:
+            await self._mailer.send(email, subject, html)
+            return
 
         # Send email via circuit breaker
         async def _send() -> None:
-            async with _http_client() as client:
-                res = await client.post(
-                    "https://api.resend.com/emails",
-                    headers={"Authorization": f"Bearer {settings.resend_api_key}"},
-                    json={
-                        "from": settings.resend_from,
-                        "to": [email],
-                        "subject": "Device retired",
-                        "html": f"<p>Device <code>{html_escape(device_id)}</code> was retired.</p><p>Reason: {html_escape(reason)}</p>",
-                    },
-                )
-                res.raise_for_status()
-
-        await self._email_breaker.call(_send)
-
-    async def _step_compensate(
-        self, tenant_id: UUID, device_id: str, reason: str
-    ) -> None:
-        """Reactivate the device to undo the retirement."""
-        async with _http_client() as client:
-            res = await client.post(
-                f"{settings.device_service_url}/api/v1/devices/{url_quote(device_id, safe='')}/activate",
-                headers={
-                    "x-user-id": "system",
-                    "x-tenant-id": str(tenant_id),
-                    "x-internal-token": settings.device_service_token,
-                },
+            res = await self._http.email.post(
+                "/emails",
                 json={
-                    "reason": f"Saga compensation: notification failed after retirement (original reason: {reason})",
+                    "from": settings.resend_from,
+                    "to": [email],
+                    "subject": subject,
+                    "html": html,
                 },
             )
             res.raise_for_status()
 
-    async def _update_status(
-        self, saga_id: UUID, status: str, step: str, error: str | None = None
+        async with self._email_limiter or nullcontext():
+            await self._email_breaker.call(_send)
+
+    async def _step_compensate(
+        self,
+        tenant_id: UUID,
+        device_id: str,
+        reason: str,
+        user_id: str | None = None,
+        expected_version: int | None = None,
+        causation_id: UUID | None = None,
     ) -> None:
-        await self._conn.execute(
-            text(
-                """
-                UPDATE saga_state
-                SET status = :status, current_step = :step, error = :error, updated_at = :now
-                WHERE id = :id
-                """
-            ),
-            {
-                "id": saga_id,
-                "status": status,
-                "step": step,
-                "error": error[:512] if error else None,
-                "now": datetime.now(timezone.utc),
-            },
-        )
+        """Reactivate the device to undo the retirement.
+
+        The reactivation is marked as system-originated (caused by
+        *causation_id*), so it does not notify anyone.
+        """
+        reason = f"Saga compensation: notification failed after retirement (original reason: {reason})"
+        actor = user_id or "system"
+        if self._db_compensation:
+            try:
+                async with self._engine.begin() as conn:
+                    await activate_device(
+                        conn, tenant_id, UUID(device_id), reason, actor, expected_version, causation_id,
+                    )
+                return
+            except DeviceCommandError:
+                raise
+            except Exception as exc:
+                logger.warning("Direct reactivation of %s failed, falling back to HTTP: %s", device_id, exc)
+
+        body: dict[str, Any] = {"reason": reason}
+        if expected_version is not None:
+            body["expected_version"] = expected_version
+        headers = {"x-user-id": actor, "x-tenant-id": str(tenant_id), "x-origin": ORIGIN_SYSTEM}
+        if causation_id is not None:
+            headers["x-causation-id"] = str(causation_id)
+        async with self._device_service_limiter or nullcontext():
+            res = await self._http.device_service.post(
+                f"/api/v1/devices/{url_quote(device_id, safe='')}/activate",
+                headers=headers,
+                json=body,
+            )
+        res.raise_for_status()
@@ -1,3 +1,7 @@
+import os
+import socket
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,24 +11,149 @@ class Settings(BaseSettings):
     database_url: str
     resend_api_key: str
     resend_from: str
+    resend_base_url: str = "https://api.resend.com"
     tenancy_service_url: str
     tenancy_service_token: str
     poll_interval_seconds: int = 5
     device_service_url: str
     device_service_token: str
 
+    # Outbox wake-ups — LISTEN/NOTIFY, with a slow poll as safety net
+    outbox_listen_enabled: bool = True
+    outbox_notify_channel: str = "outbox_events"
+    fallback_poll_interval_seconds: int = 30
+
+    # Multi-process mode — `worker --processes N` overrides; every process has
+    # its own DB pool and HTTP clients, so size connection limits accordingly
+    worker_processes: int = 1
+    supervisor_drain_timeout_seconds: float = 60.0
+    supervisor_restart_max_delay_seconds: float = 30.0
+
+    # Outbox consumers this process runs (comma-separated); each advances
+    # through its own deliveries, so they can be deployed and scaled apart
+    outbox_consumers: str = "projection,notification"
+
+    # Notification consumer throughput — events processed concurrently within a batch
+    worker_concurrency: int = 10
+    # Merge consecutive notified events for one device and user within a
+    # batch into one combined email
+    notification_coalescing_enabled: bool = True
+
+    # Outbox claiming — leases instead of long-lived row locks
+    worker_id: str = Field(default_factory=lambda: f"{socket.gethostname()}-{os.getpid()}")
+    outbox_lease_seconds: float = 120.0
+
+    # Tenant-hash sharding — each worker claims only its share of partitions,
+    # rebalanced through heartbeats in outbox_workers. The member TTL must
+    # exceed outbox_lease_seconds (checked at startup).
+    outbox_sharding_enabled: bool = False
+    shard_heartbeat_interval_seconds: float = 5.0
+    shard_member_ttl_seconds: float = 150.0
+
+    # Outbox retention — daily created_at partitions, dropped once fully
+    # processed. Disabling retention stops dropping only; partitions are
+    # still pre-made every interval.
+    outbox_retention_enabled: bool = True
+    outbox_retention_days: int = 7
+    outbox_partition_premake_days: int = 7
+    outbox_retention_interval_seconds: float = 3600.0
+    outbox_archive_dir: str | None = None  # gzip'd JSON lines written here before dropping
+
+    # Dead-letter replay (`worker replay`) — chunked and rate limited
+    replay_chunk_size: int = 500
+    replay_rate_per_second: float = 50.0
+
+    # Adaptive batching — grow while batches are full, shrink on latency/errors
+    # (outbox_batch_* bound the notification consumer, projection_batch_* the projector)
+    outbox_batch_min: int = 10
+    outbox_batch_max: int = 500
+    projection_concurrency: int = 10
+    projection_batch_min: int = 50
+    projection_batch_max: int = 500
+    batch_latency_threshold_seconds: float = 2.0
+    batch_error_rate_threshold: float = 0.2
+    backlog_sample_interval_seconds: float = 10.0
+
+    # Prometheus endpoint (GET /metrics); 0 disables it. Under the supervisor
+    # only the parent listens and serves the merged metrics of all children.
+    # (Not 9100, which node_exporter usually holds.)
+    metrics_port: int = 9464
+
+    # user_id → email cache
+    email_cache_ttl_seconds: float = 300.0
+    email_cache_negative_ttl_seconds: float = 60.0
+    email_cache_max_size: int = 10_000
+
     # Resilience — timeouts (seconds)
     http_timeout: float = 10.0
     http_connect_timeout: float = 5.0
 
+    # HTTP connection pooling — one long-lived client per dependency
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = False  # requires the h2 package (httpx[http2])
+
     # Resilience — retry backoff
     retry_base_delay: float = 1.0
     retry_max_delay: float = 60.0
     retry_max_attempts: int = 5
 
-    # Resilience — circuit breaker
+    # Sagas — active sagas without progress for saga_stale_after_seconds are
+    # taken over and resumed by the recovery sweeper
+    saga_stale_after_seconds: float = 300.0
+    saga_recovery_interval_seconds: float = 60.0
+    saga_recovery_batch_size: int = 50
+    # Transient notify failures are retried with jittered backoff, within the
+    # deadline (0 = none), before the saga compensates. Keep the deadline well
+    # below saga_stale_after_seconds.
+    saga_notify_max_attempts: int = 4
+    saga_notify_base_delay_seconds: float = 1.0
+    saga_notify_max_delay_seconds: float = 10.0
+    saga_notify_deadline_seconds: float = 60.0
+    # Compensate by writing devices/outbox directly on the worker's connection;
+    # device-service's HTTP endpoint is the fallback (and the only path if off)
+    saga_db_compensation_enabled: bool = True
+
+    # Batched email: buffer notifications for up to the window, then send them
+    # through POST /emails/batch in chunks of at most email_batch_max (<= 100)
+    email_batch_enabled: bool = True
+    email_batch_window_seconds: float = 0.05
+    email_batch_max: int = 100
+
+    # Resilience — per-dependency rate limit (calls/s, 0 = none) and bulkhead
+    # (max concurrent calls, 0 = none). Callers queue rather than fail, unless
+    # the dependency's breaker is open; the Resend rate also caps notification
+    # batches so they drain within the lease.
+    resend_rate_per_second: float = 2.0  # Resend's default team limit
+    resend_burst: int = 2
+    resend_max_concurrency: int = 4
+    tenancy_rate_per_second: float = 50.0
+    tenancy_burst: int = 20
+    tenancy_max_concurrency: int = 10
+    device_service_rate_per_second: float = 0.0
+    device_service_burst: int = 1
+    device_service_max_concurrency: int = 5
+
+    # Resilience — circuit breaker. With cb_window_seconds > 0 the breaker
+    # trips on failure rate over that window, otherwise on cb_failure_threshold
+    # consecutive failures. Calls slower than cb_slow_call_seconds count as
+    # failures (0 disables).
     cb_failure_threshold: int = 5
     cb_recovery_timeout: float = 30.0
+    cb_window_seconds: float = 60.0
+    cb_failure_rate_threshold: float = 0.5
+    cb_minimum_calls: int = 20
+    cb_half_open_max_calls: int = 3
+    cb_slow_call_seconds: float = 5.0
+    # Share breaker state between replicas through the circuit_breakers table
+    cb_shared_state_enabled: bool = False
+    cb_shared_sync_interval_seconds: float = 1.0
+    cb_probe_lease_seconds: float = 30.0
+
+    @property
+    def consumer_names(self) -> list[str]:
+        return [name.strip() for name in self.outbox_consumers.split(",") if name.strip()]
 
 
 settings = Settings()
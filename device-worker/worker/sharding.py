@@ -0,0 +1,160 @@
+"""Tenant-hash sharding of outbox consumption.
+
+Every delivery row has a stored ``partition`` column, computed as
+``hashtext(tenant_id::text) & (OUTBOX_PARTITIONS - 1)``. In sharding mode each
+worker claims only the partitions assigned to it, so replicas stop competing
+for the same oldest rows and all of a tenant's events are handled by one
+worker in order.
+
+Assignment is derived from the ``outbox_workers`` membership table: every
+worker heartbeats its row, and live members (sorted by id) split the
+partitions into contiguous ranges. When a worker joins, leaves, or misses
+heartbeats for ``member_ttl`` seconds, every worker recomputes its range on
+its next refresh. While views disagree, two workers may briefly claim from
+the same partition. Leases keep that safe; only ordering across the handover
+is best-effort.
+
+Heartbeats run in a background task (``start``/``stop``), independent of
+batch progress: a batch may legitimately take up to the outbox lease, and a
+busy worker must not be expired by its peers mid-batch. ``member_ttl`` must
+exceed the outbox lease, so a worker that really stopped heartbeating has
+lost its in-flight rows' leases too before anyone takes over its partitions.
+A worker whose own heartbeats keep failing for ``member_ttl`` stops claiming
+(``alive``), since its peers will already have dropped it.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Must match the generated ``partition`` column on outbox_deliveries.
+OUTBOX_PARTITIONS = 64
+
+
+def assign_partitions(members: list[str], worker_id: str, partitions: int = OUTBOX_PARTITIONS) -> list[int]:
+    """Contiguous partition range owned by *worker_id* among *members*."""
+    ordered = sorted(set(members) | {worker_id})
+    index = ordered.index(worker_id)
+    count = len(ordered)
+    start = index * partitions // count
+    end = (index + 1) * partitions // count
+    return list(range(start, end))
+
+
+class ShardMembership:
+    """Heartbeats one worker's membership for a consumer and tracks its partitions.
+
+    Args:
+        engine: shared database engine.
+        consumer: consumer name; membership and assignment are per consumer.
+        worker_id: this worker's id.
+        heartbeat_interval: seconds between heartbeats (and rebalances).
+        member_ttl: seconds without a heartbeat after which a member is dropped.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        consumer: str,
+        worker_id: str,
+        heartbeat_interval: float = 5.0,
+        member_ttl: float = 150.0,
+    ) -> None:
+        self.engine = engine
+        self.consumer = consumer
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+        self.member_ttl = member_ttl
+        self.partitions: list[int] = []
+        self._last_heartbeat: float | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def due(self) -> bool:
+        return self._last_heartbeat is None or time.monotonic() - self._last_heartbeat >= self.heartbeat_interval
+
+    def alive(self) -> bool:
+        """False once heartbeats have failed for long enough that peers dropped us."""
+        return self._last_heartbeat is not None and time.monotonic() - self._last_heartbeat < self.member_ttl
+
+    def start(self) -> None:
+        """Heartbeat every ``heartbeat_interval`` in the background until ``stop``."""
+        if not self.running:
+            self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def refresh(self) -> list[int]:
+        """Heartbeat, expire dead members and recompute this worker's partitions."""
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    """
+                    INSERT INTO outbox_workers (consumer, worker_id, started_at, heartbeat_at)
+                    VALUES (:consumer, :worker_id, now(), now())
+                    ON CONFLICT (consumer, worker_id) DO UPDATE SET heartbeat_at = now()
+                    """
+                ),
+                {"consumer": self.consumer, "worker_id": self.worker_id},
+            )
+            await conn.execute(
+                text(
+                    """
+                    DELETE FROM outbox_workers
+                    WHERE consumer = :consumer
+                      AND heartbeat_at < now() - make_interval(secs => :ttl)
+                    """
+                ),
+                {"consumer": self.consumer, "ttl": self.member_ttl},
+            )
+            result = await conn.execute(
+                text("SELECT worker_id FROM outbox_workers WHERE consumer = :consumer"),
+                {"consumer": self.consumer},
+            )
+            members = [r.worker_id for r in result.fetchall()]
+
+        self._last_heartbeat = time.monotonic()
+        partitions = assign_partitions(members, self.worker_id)
+        if partitions != self.partitions:
+            logger.info(
+                "[%s] Shard rebalance: %d live worker(s), now owning partitions %s",
+                self.consumer, len(set(members) | {self.worker_id}), _ranges(partitions),
+            )
+        self.partitions = partitions
+        return partitions
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("[%s] Shard heartbeat failed, keeping current partitions: %s", self.consumer, exc)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def leave(self) -> None:
+        """Drop this worker's membership so the others take over its partitions now."""
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM outbox_workers WHERE consumer = :consumer AND worker_id = :worker_id"),
+                {"consumer": self.consumer, "worker_id": self.worker_id},
+            )
+
+
+def _ranges(partitions: list[int]) -> str:
+    if not partitions:
+        return "none"
+    return f"{partitions[0]}-{partitions[-1]}"
@@ -0,0 +1,215 @@
+"""Multi-process supervisor — ``worker --processes N``.
+
+One event loop tops out on a single core (JSON decoding, logging and
+SQLAlchemy overhead) long before Postgres does. The supervisor starts N
+independent worker processes that share the outbox claim protocol (leases,
+``SKIP LOCKED`` and, when enabled, tenant-hash sharding), and:
+
+- forwards SIGTERM/SIGINT so every child drains its in-flight batch, then
+  kills stragglers after ``drain_timeout``;
+- restarts children that exit unexpectedly, with exponential backoff per slot;
+- collects each child's metric samples over a queue and merges them, serving
+  the result on ``METRICS_PORT`` (children do not listen themselves).
+
+Children are started with the ``spawn`` method so none of them inherits the
+parent's event loop, sockets or connection-pool state.
+
+Each child gets a stable id ``<worker_id>-<slot>``. A restarted child keeps
+its slot's id, and with it the slot's shard range.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+
+from worker.metrics import REGISTRY, Sample
+from worker.metrics_server import MetricsServer
+from worker.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# A child that stays up this long resets its slot's restart backoff.
+_HEALTHY_UPTIME_SECONDS = 60.0
+
+
+@dataclass
+class _Slot:
+    index: int
+    process: BaseProcess | None = None
+    started_at: float = 0.0
+    restarts: int = 0
+    restart_at: float = 0.0
+    samples: list[Sample] = field(default_factory=list)
+
+
+def _child_main(index: int, worker_id: str, samples: multiprocessing.Queue, interval: float) -> None:
+    """Entry point of a child process."""
+    settings.worker_id = worker_id
+    settings.metrics_port = 0  # the supervisor serves the merged metrics
+
+    def _report() -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                samples.put_nowait((index, REGISTRY.dump()))
+            except queue.Full:
+                pass
+
+    threading.Thread(target=_report, name="metrics-reporter", daemon=True).start()
+
+    from worker.main import run_worker
+
+    run_worker()
+
+
+class Supervisor:
+    """Runs and babysits *processes* worker children.
+
+    Args:
+        processes: number of children.
+        drain_timeout: seconds children get to drain after SIGTERM before
+            being killed.
+        restart_max_delay: ceiling of the per-slot restart backoff.
+        metrics_interval: seconds between metric reports from each child.
+        metrics_port: port for the merged ``/metrics`` endpoint; 0 disables it.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        drain_timeout: float = 60.0,
+        restart_max_delay: float = 30.0,
+        metrics_interval: float = 10.0,
+        metrics_port: int = 0,
+    ) -> None:
+        self.processes = processes
+        self.drain_timeout = drain_timeout
+        self.restart_max_delay = restart_max_delay
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._samples: multiprocessing.Queue = self._ctx.Queue(maxsize=processes * 4)
+        self._slots = [_Slot(index=i) for i in range(processes)]
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        """Start the children and supervise them until a shutdown signal."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_signal)
+
+        logger.info("Supervisor pid=%d starting %d worker process(es)", os.getpid(), self.processes)
+        for slot in self._slots:
+            self._start(slot)
+
+        server = None
+        if self.metrics_port:
+            server = MetricsServer(self.metrics_port, self.exposition)
+            server.start()
+
+        last_metrics_log = time.monotonic()
+        while not self._stopping.wait(timeout=1.0):
+            self._collect_samples()
+            self._reap_and_restart()
+            if time.monotonic() - last_metrics_log >= self.metrics_interval:
+                last_metrics_log = time.monotonic()
+                self._log_metrics()
+
+        self._drain()
+        if server is not None:
+            server.stop()
+
+    def metrics(self) -> dict[str, float]:
+        """Latest metrics of all children, merged."""
+        return REGISTRY.combine(self._dumps())
+
+    def exposition(self) -> str:
+        """Merged metrics of all children in the Prometheus text format."""
+        return REGISTRY.exposition(REGISTRY.combine_samples(self._dumps()))
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    # -- internals --------------------------------------------------
+
+    def _dumps(self) -> dict[str, list[Sample]]:
+        return {str(s.index): s.samples for s in self._slots if s.samples}
+
+    def _handle_signal(self, signum: int, _frame) -> None:
+        logger.info("Supervisor received %s, draining workers...", signal.Signals(signum).name)
+        self.stop()
+
+    def _start(self, slot: _Slot) -> None:
+        worker_id = f"{settings.worker_id}-{slot.index}"
+        process = self._ctx.Process(
+            target=_child_main,
+            args=(slot.index, worker_id, self._samples, self.metrics_interval),
+            name=f"worker-{slot.index}",
+        )
+        process.start()
+        slot.process = process
+        slot.started_at = time.monotonic()
+        logger.info("Started worker process %s pid=%d as %s", process.name, process.pid, worker_id)
+
+    def _reap_and_restart(self) -> None:
+        now = time.monotonic()
+        for slot in self._slots:
+            process = slot.process
+            if process is None:
+                if now >= slot.restart_at:
+                    self._start(slot)
+                continue
+            if process.is_alive():
+                continue
+
+            uptime = now - slot.started_at
+            slot.restarts = 0 if uptime >= _HEALTHY_UPTIME_SECONDS else slot.restarts + 1
+            delay = min(self.restart_max_delay, 2 ** slot.restarts - 1)
+            logger.error(
+                "Worker process %s pid=%s exited with code %s after %.0fs; restarting in %.0fs",
+                process.name, process.pid, process.exitcode, uptime, delay,
+            )
+            process.close()
+            slot.process = None
+            slot.samples = []
+            slot.restart_at = now + delay
+
+    def _drain(self) -> None:
+        alive = [s.process for s in self._slots if s.process is not None and s.process.is_alive()]
+        for process in alive:
+            os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.drain_timeout
+        for process in alive:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+        for process in alive:
+            if process.is_alive():
+                logger.warning("Worker process %s pid=%d did not drain in time, killing", process.name, process.pid)
+                process.kill()
+                process.join()
+
+        self._collect_samples()
+        self._log_metrics()
+        logger.info("Supervisor stopped")
+
+    def _collect_samples(self) -> None:
+        while True:
+            try:
+                index, samples = self._samples.get_nowait()
+            except queue.Empty:
+                return
+            self._slots[index].samples = samples
+
+    def _log_metrics(self) -> None:
+        combined = self.metrics()
+        if combined:
+            logger.info(
+                "Combined worker metrics: %s",
+                ", ".join(f"{k}={v:g}" for k, v in sorted(combined.items())),
+            )